@@ -0,0 +1,235 @@
+"""Backup online do banco pela API de backup do SQLite, comprimido e verificado.
+
+A cópia é feita página a página (sqlite3.Connection.backup) a partir de uma
+conexão de leitura, então sai consistente mesmo com o banco em uso e com o
+conteúdo do -wal. O resultado é gravado em .db.gz e conferido depois de
+escrito; a pasta de backups mantém um por dia e um por semana.
+"""
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+PAGINAS_POR_PASSO = 1024     # Páginas copiadas por passo (~4 MB com página de 4 KB)
+NIVEL_COMPRESSAO = 6
+BLOCO_LEITURA = 1024 * 1024
+MANTER_DIARIOS = 7           # Último backup de cada um dos últimos N dias
+MANTER_SEMANAIS = 4          # Último backup de cada uma das últimas N semanas
+PREFIXO = "backup_totalpharma_"
+PADRAO_ARQUIVO = re.compile(re.escape(PREFIXO) + r"(\d{4}-\d{2}-\d{2})_(\d{4})\.db\.gz$")
+
+
+class ErroBackup(Exception):
+    pass
+
+
+def nome_backup(momento=None):
+    return f"{PREFIXO}{(momento or datetime.now()).strftime('%Y-%m-%d_%H%M')}.db.gz"
+
+
+def _sha256_arquivo(abrir, caminho):
+    h = hashlib.sha256()
+    with abrir(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(BLOCO_LEITURA), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def fazer_backup(origem, destino, progresso=None, paginas_por_passo=PAGINAS_POR_PASSO):
+    """Copia `origem` para `destino` (.db.gz) e confere o arquivo gravado.
+
+    `progresso(etapa, feito, total)` é chamado da thread que executa o backup,
+    com etapa "copiando" (páginas), "comprimindo" (bytes) ou "verificando".
+    Retorna um dicionário com tamanho, páginas e duração.
+    """
+    inicio = time.perf_counter()
+    temporario = destino + ".copia.db"
+    parcial = destino + ".parcial"
+    try:
+        # 1) Cópia online, em passos, para um arquivo local temporário
+        conn_origem = sqlite3.connect(origem, timeout=30)
+        conn_copia = sqlite3.connect(temporario)
+        try:
+            def passo(status, restantes, total):
+                if progresso:
+                    progresso("copiando", total - restantes, total)
+            # Transação de leitura aberta durante toda a cópia: em WAL os outros
+            # terminais continuam gravando, e a cópia não recomeça a cada
+            # gravação deles (ela vê sempre o mesmo instante do banco)
+            conn_origem.execute("BEGIN")
+            conn_origem.execute("SELECT count(*) FROM sqlite_master").fetchone()
+            conn_origem.backup(conn_copia, pages=paginas_por_passo, progress=passo)
+            conn_origem.rollback()
+            paginas = conn_copia.execute("PRAGMA page_count").fetchone()[0]
+            # 2) A cópia precisa abrir e passar no quick_check
+            if progresso:
+                progresso("verificando", 0, 1)
+            resultado = conn_copia.execute("PRAGMA quick_check").fetchone()[0]
+            if resultado != "ok":
+                raise ErroBackup(f"Cópia falhou no quick_check: {resultado}")
+        finally:
+            conn_copia.close()
+            conn_origem.close()
+
+        # 3) Comprime calculando o hash do conteúdo original
+        total = os.path.getsize(temporario)
+        h = hashlib.sha256()
+        feito = 0
+        with open(temporario, "rb") as f_in, gzip.open(parcial, "wb", compresslevel=NIVEL_COMPRESSAO) as f_out:
+            for bloco in iter(lambda: f_in.read(BLOCO_LEITURA), b""):
+                h.update(bloco)
+                f_out.write(bloco)
+                feito += len(bloco)
+                if progresso:
+                    progresso("comprimindo", feito, total)
+        with open(parcial, "rb+") as f:
+            os.fsync(f.fileno())
+
+        # 4) Relê o .gz gravado e compara com o hash da cópia
+        if progresso:
+            progresso("verificando", 1, 1)
+        if _sha256_arquivo(gzip.open, parcial) != h.hexdigest():
+            raise ErroBackup("Arquivo comprimido não confere com a cópia")
+        os.replace(parcial, destino)
+    finally:
+        for caminho in (temporario, parcial):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+    return {
+        "arquivo": destino,
+        "paginas": paginas,
+        "tamanho_original": total,
+        "tamanho_comprimido": os.path.getsize(destino),
+        "duracao": time.perf_counter() - inicio,
+    }
+
+
+def verificar_backup(caminho):
+    """Descomprime num arquivo temporário e roda quick_check; retorna True se ok"""
+    temporario = caminho + ".verificacao.db"
+    try:
+        with gzip.open(caminho, "rb") as f_in, open(temporario, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, BLOCO_LEITURA)
+        conn = sqlite3.connect(temporario)
+        try:
+            return conn.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+        finally:
+            conn.close()
+    except (OSError, EOFError, sqlite3.DatabaseError):
+        return False
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+# ================== ROTAÇÃO ==================
+def listar_backups(pasta):
+    """[(datetime, caminho)] dos backups da pasta, do mais novo para o mais velho"""
+    if not os.path.isdir(pasta):
+        return []
+    backups = []
+    for nome in os.listdir(pasta):
+        m = PADRAO_ARQUIVO.match(nome)
+        if m:
+            momento = datetime.strptime(f"{m.group(1)} {m.group(2)}", "%Y-%m-%d %H%M")
+            backups.append((momento, os.path.join(pasta, nome)))
+    return sorted(backups, reverse=True)
+
+
+def rotacionar(pasta, diarios=MANTER_DIARIOS, semanais=MANTER_SEMANAIS, hoje=None):
+    """Mantém o último backup de cada dia recente e de cada semana recente; apaga o resto"""
+    hoje = hoje or date.today()
+    limite_dia = hoje - timedelta(days=diarios - 1)
+    limite_semana = hoje - timedelta(weeks=semanais)
+    dias_vistos, semanas_vistas = set(), set()
+    apagados = []
+    for momento, caminho in listar_backups(pasta):
+        dia = momento.date()
+        semana = dia.isocalendar()[:2]
+        manter = False
+        if dia >= limite_dia and dia not in dias_vistos:
+            manter = True
+        if dia > limite_semana and semana not in semanas_vistas:
+            manter = True
+        dias_vistos.add(dia)
+        semanas_vistas.add(semana)
+        if not manter:
+            os.remove(caminho)
+            apagados.append(caminho)
+    return apagados
+
+
+def backup_do_dia_existe(pasta, dia=None):
+    dia = dia or date.today()
+    return any(momento.date() == dia for momento, _ in listar_backups(pasta))
+
+
+def backup_agendado(origem, pasta, progresso=None):
+    """Backup automático do fechamento: grava na pasta e aplica a rotação"""
+    os.makedirs(pasta, exist_ok=True)
+    resultado = fazer_backup(origem, os.path.join(pasta, nome_backup()), progresso)
+    resultado["apagados"] = rotacionar(pasta)
+    return resultado
+
+
+# ================== EXECUÇÃO EM SEGUNDO PLANO ==================
+class TarefaBackup:
+    """Roda um backup numa thread própria; a interface consulta o progresso com after()"""
+
+    def __init__(self, funcao, *args):
+        self.etapa = "iniciando"
+        self.feito = 0
+        self.total = 0
+        self.resultado = None
+        self.erro = None
+        self._thread = threading.Thread(target=self._executar, args=(funcao, args), daemon=True, name="backup")
+
+    def iniciar(self):
+        self._thread.start()
+        return self
+
+    @property
+    def concluida(self):
+        return not self._thread.is_alive() and (self.resultado is not None or self.erro is not None)
+
+    @property
+    def fracao(self):
+        return self.feito / self.total if self.total else 0.0
+
+    def _progresso(self, etapa, feito, total):
+        self.etapa, self.feito, self.total = etapa, feito, total
+
+    def _executar(self, funcao, args):
+        try:
+            self.resultado = funcao(*args, progresso=self._progresso)
+        except Exception as e:
+            self.erro = e
+
+
+# ================== LINHA DE COMANDO ==================
+# Para o Agendador de Tarefas do Windows (ex.: todo dia às 22h):
+#   python backup.py <caminho_do_banco> <pasta_de_backups>
+#   python backup.py verificar <arquivo.db.gz>
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Uso: python backup.py <caminho_do_banco> <pasta_de_backups>")
+        print("     python backup.py verificar <arquivo.db.gz>")
+        sys.exit(1)
+    if sys.argv[1] == "verificar":
+        ok = verificar_backup(sys.argv[2])
+        print(f"[BACKUP] {sys.argv[2]}: {'OK' if ok else 'COM DEFEITO'}")
+        sys.exit(0 if ok else 2)
+    try:
+        r = backup_agendado(sys.argv[1], sys.argv[2])
+    except Exception as e:
+        print(f"[BACKUP] Falhou: {type(e).__name__}: {e}")
+        sys.exit(2)
+    print(f"[BACKUP] {r['arquivo']} ({r['tamanho_comprimido'] / 1048576:.1f} MB, {r['duracao']:.1f}s); "
+          f"{len(r['apagados'])} antigos removidos")
@@ -0,0 +1,1141 @@
+"""Camada de acesso ao banco SQLite do PDV (conexões, PRAGMAs e reconexão)."""
+import sqlite3
+import threading
+import time
+import os
+import random
+import sys
+import re
+import unicodedata
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import instrumentacao
+from desempenho import CONTENCAO
+from instrumentacao import ConexaoMedida
+
+# -------------- PERFIS DE PRAGMA --------------
+# cache_size negativo = tamanho em KiB. Em rede o mmap fica desligado:
+# mapear arquivo via SMB não é seguro e não traz ganho.
+# recursive_triggers faz o INSERT OR REPLACE disparar os triggers de DELETE.
+# journal_size_limit encolhe o -wal quando ele recomeça depois de um checkpoint.
+PERFIS_PRAGMA = {
+    "local": {
+        "cache_size": -16000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+        "synchronous": "NORMAL",
+        "recursive_triggers": "ON",
+        "journal_size_limit": 16 * 1024 * 1024,
+    },
+    "rede": {
+        "cache_size": -64000,
+        "mmap_size": 0,
+        "temp_store": "MEMORY",
+        "busy_timeout": 15000,
+        "synchronous": "NORMAL",
+        "recursive_triggers": "ON",
+        "journal_size_limit": 16 * 1024 * 1024,
+    },
+}
+
+TAMANHO_CACHE_SQL = 256          # Statements preparados mantidos por conexão
+INTERVALO_VERIFICACAO = 30       # Segundos ociosos antes de testar a conexão
+ERROS_RECONEXAO = ("disk i/o error", "unable to open database", "database disk image is malformed",
+                   "not a database", "cannot operate on a closed database",
+                   "servidor indisponível")   # servidor_banco fora do ar
+ERROS_LOCK = ("database is locked", "database table is locked")
+
+# -------------- LOCK DE ESCRITA --------------
+# transacao() pega o lock de escrita já no BEGIN (IMMEDIATE): sem isso a
+# transação começa lendo e só pede o lock na primeira gravação, e dois
+# terminais nessa situação podem ficar presos (SQLITE_BUSY na promoção).
+# Cada tentativa espera pouco dentro do SQLite; entre tentativas, backoff
+# exponencial com jitter até o busy_timeout do perfil.
+ESPERA_SQLITE_TENTATIVA_MS = 20   # busy_timeout durante o BEGIN IMMEDIATE
+ESPERA_LOCK_INICIAL = 0.005       # Segundos antes da 2ª tentativa (dobra a cada uma)
+ESPERA_LOCK_MAXIMA = 0.25         # Teto da espera entre tentativas
+TRANSACAO_LONGA = 0.5             # Segundos com o lock que já viram evento no log
+
+
+def caminho_eh_rede(caminho):
+    """Indica se o caminho aponta para um compartilhamento de rede (UNC ou unidade mapeada)"""
+    if not caminho:
+        return False
+    if caminho.startswith("\\\\") or caminho.startswith("//"):
+        return True
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            unidade = os.path.splitdrive(os.path.abspath(caminho))[0]
+            if unidade:
+                # DRIVE_REMOTE = 4
+                return ctypes.windll.kernel32.GetDriveTypeW(unidade + "\\") == 4
+        except Exception:
+            pass
+    return False
+
+
+def modo_do_caminho(caminho):
+    return "rede" if caminho_eh_rede(caminho) else "local"
+
+
+def aplicar_pragmas(conn, modo):
+    """Aplica o perfil de PRAGMAs do modo (local/rede) na conexão"""
+    for nome, valor in PERFIS_PRAGMA[modo].items():
+        conn.execute(f"PRAGMA {nome}={valor}")
+
+
+def erro_exige_reconexao(erro):
+    msg = str(erro).lower()
+    return any(trecho in msg for trecho in ERROS_RECONEXAO)
+
+
+def erro_de_lock(erro):
+    """Banco ocupado por outro terminal (SQLITE_BUSY/SQLITE_LOCKED)"""
+    msg = str(erro).lower()
+    return isinstance(erro, sqlite3.OperationalError) and any(trecho in msg for trecho in ERROS_LOCK)
+
+
+def espera_lock(tentativa):
+    """Espera antes da próxima tentativa: metade fixa, metade sorteada, para os terminais não voltarem juntos"""
+    teto = min(ESPERA_LOCK_MAXIMA, ESPERA_LOCK_INICIAL * 2 ** tentativa)
+    return teto / 2 + random.uniform(0, teto / 2)
+
+
+class GerenciadorConexoes:
+    """Mantém uma conexão longa por thread, com verificação de saúde e reconexão.
+
+    O cache de statements do sqlite3 é por conexão; como as conexões não são
+    mais fechadas a cada chamada, os statements preparados passam a ser
+    reaproveitados entre os handlers da mesma thread.
+    """
+
+    def __init__(self, db_path, modo=None):
+        self.db_path = db_path
+        self.modo = modo or modo_do_caminho(db_path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._todas = []
+        self.reconexoes = 0
+
+    def _abrir(self):
+        perfil = PERFIS_PRAGMA[self.modo]
+        conn = sqlite3.connect(self.db_path, timeout=perfil["busy_timeout"] / 1000,
+                               cached_statements=TAMANHO_CACHE_SQL, check_same_thread=False,
+                               factory=ConexaoMedida)
+        aplicar_pragmas(conn, self.modo)
+        with self._lock:
+            self._todas.append(conn)
+        return conn
+
+    def _descartar(self, conn):
+        # Fecha com o lock: com_conexoes não pode ver uma conexão já fechada
+        with self._lock:
+            if conn in self._todas:
+                self._todas.remove(conn)
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _saudavel(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def conexao(self):
+        """Retorna a conexão da thread atual, abrindo ou reabrindo se preciso"""
+        conn = getattr(self._local, "conn", None)
+        agora = time.monotonic()
+        if conn is not None and agora - self._local.ultimo_uso > INTERVALO_VERIFICACAO:
+            if not self._saudavel(conn):
+                print("[BANCO] Conexão inválida, reconectando...")
+                self._descartar(conn)
+                self.reconexoes += 1
+                conn = None
+        if conn is None:
+            conn = self._abrir()
+            self._local.conn = conn
+        self._local.ultimo_uso = agora
+        return conn
+
+    def reconectar(self):
+        """Descarta a conexão da thread atual; a próxima chamada abre outra"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._descartar(conn)
+            self._local.conn = None
+            self.reconexoes += 1
+
+    def executar(self, sql, parametros=()):
+        """Executa uma leitura, reconectando uma vez se a conexão caiu"""
+        try:
+            return self.conexao().execute(sql, parametros)
+        except sqlite3.DatabaseError as e:
+            if not erro_exige_reconexao(e):
+                raise
+            self.reconectar()
+            return self.conexao().execute(sql, parametros)
+
+    def _prazo_lock(self):
+        """Segundos tentando o lock de escrita antes de desistir (busy_timeout do perfil)"""
+        return PERFIS_PRAGMA[self.modo]["busy_timeout"] / 1000
+
+    def _comecar_escrita(self, conn, operacao):
+        """BEGIN IMMEDIATE, tentando de novo enquanto outro terminal grava; retorna (espera, tentativas).
+
+        Passado o prazo, registra a desistência e levanta o "database is locked".
+        """
+        inicio = time.perf_counter()
+        prazo = inicio + self._prazo_lock()
+        tentativas = 0
+        # Pelo cursor: no servidor_banco os PRAGMAs seguem no mesmo lote do BEGIN
+        conn.cursor().execute(f"PRAGMA busy_timeout = {ESPERA_SQLITE_TENTATIVA_MS}")
+        try:
+            while True:
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    return time.perf_counter() - inicio, tentativas
+                except sqlite3.OperationalError as e:
+                    espera = espera_lock(tentativas)
+                    if not erro_de_lock(e) or time.perf_counter() + espera > prazo:
+                        if erro_de_lock(e):
+                            CONTENCAO.registrar(operacao, time.perf_counter() - inicio, tentativas)
+                            instrumentacao.evento("contencao", operacao=operacao, tentativas=tentativas,
+                                                  desistiu=True, espera_ms=round((time.perf_counter() - inicio) * 1000, 2))
+                        raise
+                    tentativas += 1
+                    time.sleep(espera)
+        finally:
+            conn.cursor().execute(f"PRAGMA busy_timeout = {int(self._prazo_lock() * 1000)}")
+
+    @contextmanager
+    def transacao(self, operacao="outras"):
+        """Abre uma transação de escrita: commit no sucesso, rollback no erro.
+
+        O lock de escrita é pego no começo (BEGIN IMMEDIATE, com novas
+        tentativas se outro terminal estiver gravando); espera, tentativas e
+        tempo com o lock ficam em desempenho.CONTENCAO sob `operacao`.
+        Mantenha o bloco curto: enquanto ele roda, nenhum outro terminal grava.
+        Dentro de uma transação já aberta, o bloco só participa dela: commit,
+        rollback e métricas ficam com quem a abriu.
+        """
+        conn = self.conexao()
+        try:
+            aninhada = conn.in_transaction
+            if not aninhada:
+                espera, tentativas = self._comecar_escrita(conn, operacao)
+        except sqlite3.DatabaseError as e:
+            if erro_exige_reconexao(e):
+                self.reconectar()
+            raise
+        if aninhada:
+            yield conn.cursor()
+            return
+        inicio = time.perf_counter()
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except BaseException as e:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            if isinstance(e, sqlite3.DatabaseError) and erro_exige_reconexao(e):
+                self.reconectar()
+            raise
+        finally:
+            duracao = time.perf_counter() - inicio
+            CONTENCAO.registrar(operacao, espera, tentativas, duracao)
+            if tentativas or duracao >= TRANSACAO_LONGA:
+                instrumentacao.evento("contencao", operacao=operacao, tentativas=tentativas,
+                                      espera_ms=round(espera * 1000, 2), duracao_ms=round(duracao * 1000, 2))
+
+    def com_conexoes(self, funcao):
+        """funcao(conexões abertas, de todas as threads) com o lock: nenhuma é fechada enquanto ela roda"""
+        with self._lock:
+            return funcao(list(self._todas))
+
+    def fechar_todas(self):
+        with self._lock:
+            conexoes, self._todas = self._todas, []
+            for conn in conexoes:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        self._local = threading.local()
+
+
+# ================== MIGRAÇÕES DE SCHEMA ==================
+# Cada migração roda uma única vez, numa transação própria, e grava seu número
+# em PRAGMA user_version. Com o banco já na versão atual, a abertura custa só
+# a leitura do user_version.
+
+def _colunas(conn, tabela):
+    return {linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+
+
+def _adicionar_colunas(conn, tabela, colunas):
+    existentes = _colunas(conn, tabela)
+    for nome, tipo in colunas:
+        if nome not in existentes:
+            conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {nome} {tipo}")
+
+
+def _migracao_1_schema_base(conn):
+    """Tabelas originais + colunas que bancos antigos podem não ter"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS clientes (
+            telefone TEXT PRIMARY KEY,
+            nome TEXT,
+            rua TEXT,
+            numero TEXT,
+            bairro TEXT,
+            referencia TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS historico_enderecos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telefone_cliente TEXT,
+            rua TEXT,
+            numero TEXT,
+            bairro TEXT,
+            referencia TEXT,
+            ultimo_uso DATE,
+            FOREIGN KEY(telefone_cliente) REFERENCES clientes(telefone)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pedidos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT,
+            cliente_tel TEXT,
+            entregador TEXT,
+            valor_total REAL,
+            metodo_pagamento TEXT,
+            detalhes_pagamento TEXT,
+            FOREIGN KEY(cliente_tel) REFERENCES clientes(telefone)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS lembretes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cliente_tel TEXT,
+            medicamento TEXT,
+            data_aviso TEXT,
+            status TEXT,
+            FOREIGN KEY(cliente_tel) REFERENCES clientes(telefone)
+        )
+    """)
+    _adicionar_colunas(conn, "clientes", [("rua", "TEXT"), ("numero", "TEXT"), ("bairro", "TEXT"), ("referencia", "TEXT")])
+    _adicionar_colunas(conn, "pedidos", [("metodo_pagamento", "TEXT"), ("detalhes_pagamento", "TEXT")])
+
+
+def _migracao_2_indices(conn):
+    """Índices compostos para as consultas das telas"""
+    # Painel do dia: WHERE data = ? GROUP BY entregador com SUM(valor_total)
+    # Histórico: WHERE data BETWEEN ? AND ? ORDER BY data DESC (cobre o resumo)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pedidos_data_entregador ON pedidos(data, entregador, valor_total)")
+    # Histórico filtrado por entregador
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pedidos_entregador_data ON pedidos(entregador, data)")
+    # Exclusão de cliente e consultas por cliente
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pedidos_cliente ON pedidos(cliente_tel)")
+    # Avisos de hoje / agendamentos: WHERE status = 'PENDENTE' AND data_aviso <= ?
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lembretes_status_data ON lembretes(status, data_aviso)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lembretes_cliente ON lembretes(cliente_tel)")
+    # Histórico de endereços: WHERE telefone_cliente = ? ORDER BY ultimo_uso DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_historico_tel_uso ON historico_enderecos(telefone_cliente, ultimo_uso)")
+    conn.execute("ANALYZE")
+
+
+def fts5_disponivel(conn):
+    return bool(conn.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()[0])
+
+
+# Telefone indexado completo e sem DDD, para achar "99999..." e "8399999..."
+SQL_TELEFONE_BUSCA = "{0}.telefone || ' ' || substr({0}.telefone, 3)"
+
+
+def _migracao_3_busca_clientes(conn):
+    """Índice FTS5 de clientes (nome, telefone, rua, bairro) sem acentos"""
+    if not fts5_disponivel(conn):
+        print("[AVISO] SQLite sem FTS5: busca de clientes usará LIKE")
+        return
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS clientes_busca USING fts5(
+            nome, telefone, rua, bairro,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    # rowid do índice = rowid do cliente. OR REPLACE cobre terminais antigos
+    # sem recursive_triggers, em que o REPLACE não dispara o trigger de DELETE.
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_busca_ins AFTER INSERT ON clientes BEGIN
+            INSERT OR REPLACE INTO clientes_busca(rowid, nome, telefone, rua, bairro)
+            VALUES (new.rowid, new.nome, {SQL_TELEFONE_BUSCA.format('new')}, new.rua, new.bairro);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_busca_del AFTER DELETE ON clientes BEGIN
+            DELETE FROM clientes_busca WHERE rowid = old.rowid;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_busca_upd AFTER UPDATE ON clientes BEGIN
+            DELETE FROM clientes_busca WHERE rowid = old.rowid;
+            INSERT OR REPLACE INTO clientes_busca(rowid, nome, telefone, rua, bairro)
+            VALUES (new.rowid, new.nome, {SQL_TELEFONE_BUSCA.format('new')}, new.rua, new.bairro);
+        END
+    """)
+    reconstruir_busca_clientes(conn)
+
+
+# Chave do resumo: NULL vira '' porque colunas de PK em WITHOUT ROWID não aceitam NULL
+_CHAVE_RESUMO_NEW = "COALESCE(new.data, ''), COALESCE(new.entregador, ''), COALESCE(new.metodo_pagamento, '')"
+_FILTRO_RESUMO_OLD = ("data = COALESCE(old.data, '') AND entregador = COALESCE(old.entregador, '') "
+                      "AND metodo = COALESCE(old.metodo_pagamento, '')")
+_SOMAR_RESUMO = f"""
+    INSERT INTO resumo_diario (data, entregador, metodo, qtd, total)
+    VALUES ({_CHAVE_RESUMO_NEW}, 1, COALESCE(new.valor_total, 0))
+    ON CONFLICT(data, entregador, metodo) DO UPDATE SET qtd = qtd + 1, total = total + excluded.total;
+"""
+_SUBTRAIR_RESUMO = f"""
+    UPDATE resumo_diario SET qtd = qtd - 1, total = total - COALESCE(old.valor_total, 0)
+    WHERE {_FILTRO_RESUMO_OLD};
+    DELETE FROM resumo_diario WHERE {_FILTRO_RESUMO_OLD} AND qtd <= 0;
+"""
+
+
+def _migracao_4_resumo_diario(conn):
+    """Tabela resumo_diario mantida por triggers em pedidos"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS resumo_diario (
+            data TEXT NOT NULL,
+            entregador TEXT NOT NULL,
+            metodo TEXT NOT NULL,
+            qtd INTEGER NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (data, entregador, metodo)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_resumo_ins AFTER INSERT ON pedidos BEGIN {_SOMAR_RESUMO} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_resumo_del AFTER DELETE ON pedidos BEGIN {_SUBTRAIR_RESUMO} END")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_upd
+        AFTER UPDATE OF data, entregador, metodo_pagamento, valor_total ON pedidos
+        BEGIN {_SUBTRAIR_RESUMO} {_SOMAR_RESUMO} END
+    """)
+    conn.execute("""
+        INSERT INTO resumo_diario (data, entregador, metodo, qtd, total)
+        SELECT COALESCE(data, ''), COALESCE(entregador, ''), COALESCE(metodo_pagamento, ''),
+               COUNT(*), COALESCE(SUM(valor_total), 0)
+        FROM pedidos
+        GROUP BY 1, 2, 3
+    """)
+
+
+# Dia = número de dias desde 1970-01-01; dinheiro = centavos inteiros.
+# Terminais com versão anterior continuam gravando só data/valor_total:
+# o trigger abaixo completa as colunas que faltarem, nos dois sentidos.
+SQL_DIA = "CAST(julianday({0}) - 2440587.5 AS INTEGER)"
+SQL_CENTAVOS = "CAST(ROUND({0} * 100) AS INTEGER)"
+_DIA_NEW = f"COALESCE(new.dia, {SQL_DIA.format('new.data')}, 0)"
+_DIA_OLD = f"COALESCE(old.dia, {SQL_DIA.format('old.data')}, 0)"
+_CENTAVOS_NEW = f"COALESCE(new.valor_centavos, {SQL_CENTAVOS.format('new.valor_total')}, 0)"
+_CENTAVOS_OLD = f"COALESCE(old.valor_centavos, {SQL_CENTAVOS.format('old.valor_total')}, 0)"
+_FILTRO_RESUMO_V5 = (f"dia = {_DIA_OLD} AND entregador = COALESCE(old.entregador, '') "
+                     "AND metodo = COALESCE(old.metodo_pagamento, '')")
+_SOMAR_RESUMO_V5 = f"""
+    INSERT INTO resumo_diario (dia, entregador, metodo, qtd, total_centavos)
+    VALUES ({_DIA_NEW}, COALESCE(new.entregador, ''), COALESCE(new.metodo_pagamento, ''), 1, {_CENTAVOS_NEW})
+    ON CONFLICT(dia, entregador, metodo) DO UPDATE
+    SET qtd = qtd + 1, total_centavos = total_centavos + excluded.total_centavos;
+"""
+_SUBTRAIR_RESUMO_V5 = f"""
+    UPDATE resumo_diario SET qtd = qtd - 1, total_centavos = total_centavos - {_CENTAVOS_OLD}
+    WHERE {_FILTRO_RESUMO_V5};
+    DELETE FROM resumo_diario WHERE {_FILTRO_RESUMO_V5} AND qtd <= 0;
+"""
+
+
+def _migracao_5_centavos_e_dias(conn):
+    """Pedidos com valor em centavos e data como número do dia"""
+    _adicionar_colunas(conn, "pedidos", [("dia", "INTEGER"), ("valor_centavos", "INTEGER")])
+    conn.execute(f"""
+        UPDATE pedidos SET dia = {SQL_DIA.format('data')}, valor_centavos = {SQL_CENTAVOS.format('valor_total')}
+        WHERE dia IS NULL OR valor_centavos IS NULL
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_pedidos_completar AFTER INSERT ON pedidos
+        WHEN new.dia IS NULL OR new.valor_centavos IS NULL OR new.data IS NULL OR new.valor_total IS NULL
+        BEGIN
+            UPDATE pedidos SET
+                dia = COALESCE(dia, CAST(julianday(data) - 2440587.5 AS INTEGER)),
+                valor_centavos = COALESCE(valor_centavos, CAST(ROUND(valor_total * 100) AS INTEGER)),
+                data = COALESCE(data, date(dia * 86400, 'unixepoch')),
+                valor_total = COALESCE(valor_total, valor_centavos / 100.0)
+            WHERE id = new.id;
+        END
+    """)
+
+    # Índices passam a usar as colunas inteiras
+    conn.execute("DROP INDEX IF EXISTS idx_pedidos_data_entregador")
+    conn.execute("DROP INDEX IF EXISTS idx_pedidos_entregador_data")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pedidos_dia_entregador ON pedidos(dia, entregador, valor_centavos)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pedidos_entregador_dia ON pedidos(entregador, dia)")
+
+    # Resumo diário recriado com dia/centavos
+    for trigger in ("trg_resumo_ins", "trg_resumo_del", "trg_resumo_upd"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS resumo_diario")
+    conn.execute("""
+        CREATE TABLE resumo_diario (
+            dia INTEGER NOT NULL,
+            entregador TEXT NOT NULL,
+            metodo TEXT NOT NULL,
+            qtd INTEGER NOT NULL DEFAULT 0,
+            total_centavos INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, entregador, metodo)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"CREATE TRIGGER trg_resumo_ins AFTER INSERT ON pedidos BEGIN {_SOMAR_RESUMO_V5} END")
+    conn.execute(f"CREATE TRIGGER trg_resumo_del AFTER DELETE ON pedidos BEGIN {_SUBTRAIR_RESUMO_V5} END")
+    conn.execute(f"""
+        CREATE TRIGGER trg_resumo_upd
+        AFTER UPDATE OF dia, data, entregador, metodo_pagamento, valor_centavos, valor_total ON pedidos
+        BEGIN {_SUBTRAIR_RESUMO_V5} {_SOMAR_RESUMO_V5} END
+    """)
+    reconstruir_resumo_diario(conn)
+
+
+def _migracao_6_uuid_pedidos(conn):
+    """Identificador único do pedido, para regravar a fila sem duplicar"""
+    _adicionar_colunas(conn, "pedidos", [("uuid", "TEXT")])
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_pedidos_uuid ON pedidos(uuid)")
+
+
+# Tabelas copiadas para a réplica local de cada terminal, com a coluna-chave
+TABELAS_REPLICADAS = {
+    "clientes": "telefone",
+    "historico_enderecos": "id",
+    "lembretes": "id",
+}
+LOG_REPLICACAO_MANTER = 100000
+SQL_AGORA = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _migracao_7_replicacao(conn):
+    """Log de alterações para réplicas locais e clientes.atualizado_em"""
+    _adicionar_colunas(conn, "clientes", [("atualizado_em", "TEXT")])
+    conn.execute(f"UPDATE clientes SET atualizado_em = {SQL_AGORA} WHERE atualizado_em IS NULL")
+    # Terminais antigos não preenchem atualizado_em: o banco preenche
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_carimbo_ins AFTER INSERT ON clientes
+        WHEN new.atualizado_em IS NULL
+        BEGIN
+            UPDATE clientes SET atualizado_em = {SQL_AGORA} WHERE rowid = new.rowid;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_carimbo_upd
+        AFTER UPDATE OF nome, rua, numero, bairro, referencia ON clientes
+        WHEN new.atualizado_em IS old.atualizado_em
+        BEGIN
+            UPDATE clientes SET atualizado_em = {SQL_AGORA} WHERE rowid = new.rowid;
+        END
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS log_replicacao (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabela TEXT NOT NULL,
+            chave NOT NULL
+        )
+    """)
+    for tabela, chave in TABELAS_REPLICADAS.items():
+        for evento, linha in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_log_{tabela}_{evento.lower()} AFTER {evento} ON {tabela}
+                BEGIN
+                    INSERT INTO log_replicacao (tabela, chave) VALUES ('{tabela}', {linha}.{chave});
+                END
+            """)
+
+
+def _migracao_8_manutencao(conn):
+    """Registro das tarefas de manutenção (última execução, duração, progresso)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS manutencao (
+            tarefa TEXT PRIMARY KEY,
+            ultima_execucao TEXT,
+            duracao REAL,
+            resultado TEXT,
+            progresso TEXT
+        )
+    """)
+
+
+def _migracao_9_busca_so_se_mudar(conn):
+    """Índice de busca só é refeito quando nome, telefone, rua ou bairro mudam"""
+    existe = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_clientes_busca_upd'").fetchone()
+    if not existe:
+        return   # SQLite sem FTS5 (migração 3 não criou o índice)
+    # Alterar só referência, número ou o carimbo (atualizado_em) não mexe no FTS5,
+    # cuja troca (apagar + inserir) é o que mais pesa numa importação que atualiza clientes
+    conn.execute("DROP TRIGGER trg_clientes_busca_upd")
+    conn.execute(f"""
+        CREATE TRIGGER trg_clientes_busca_upd AFTER UPDATE ON clientes
+        WHEN old.rowid IS NOT new.rowid OR old.nome IS NOT new.nome OR old.telefone IS NOT new.telefone
+             OR old.rua IS NOT new.rua OR old.bairro IS NOT new.bairro
+        BEGIN
+            DELETE FROM clientes_busca WHERE rowid = old.rowid;
+            INSERT OR REPLACE INTO clientes_busca(rowid, nome, telefone, rua, bairro)
+            VALUES (new.rowid, new.nome, {SQL_TELEFONE_BUSCA.format('new')}, new.rua, new.bairro);
+        END
+    """)
+
+
+def _migracao_10_busca_por_nome(conn):
+    """Índice de clientes por nome e prefixos curtos no índice de busca (busca enquanto digita)"""
+    # Páginas da busca em ordem de nome, continuando do último (nome, telefone) mostrado
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_clientes_nome ON clientes(nome, telefone)")
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'clientes_busca'").fetchone():
+        return   # SQLite sem FTS5
+    # Com prefix, "a"* / "ma"* leem uma lista pronta em vez de juntar a de cada
+    # palavra que começa assim (em 200 mil clientes, contar os que casam com
+    # "a"* caiu de ~60 ms para menos de 1 ms).
+    # Os triggers da migração 3/9 continuam valendo: só a tabela é recriada.
+    conn.execute("DROP TABLE clientes_busca")
+    conn.execute("""
+        CREATE VIRTUAL TABLE clientes_busca USING fts5(
+            nome, telefone, rua, bairro,
+            prefix = '1 2 3',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    reconstruir_busca_clientes(conn)
+
+
+_FILTRO_RESUMO_NEW = (f"dia = {_DIA_NEW} AND entregador = COALESCE(new.entregador, '') "
+                      "AND metodo = COALESCE(new.metodo_pagamento, '')")
+# Subtrai mesmo sem a linha (que fica negativa) e só apaga a que zerou qtd e total: o
+# resultado não depende da ordem em que os triggers de pedidos disparam
+_MOVER_RESUMO_V11 = f"""
+    INSERT INTO resumo_diario (dia, entregador, metodo, qtd, total_centavos)
+    VALUES ({_DIA_OLD}, COALESCE(old.entregador, ''), COALESCE(old.metodo_pagamento, ''), -1, -{_CENTAVOS_OLD})
+    ON CONFLICT(dia, entregador, metodo) DO UPDATE
+    SET qtd = qtd - 1, total_centavos = total_centavos + excluded.total_centavos;
+    {_SOMAR_RESUMO_V5}
+    DELETE FROM resumo_diario WHERE {_FILTRO_RESUMO_V5} AND qtd = 0 AND total_centavos = 0;
+    DELETE FROM resumo_diario WHERE {_FILTRO_RESUMO_NEW} AND qtd = 0 AND total_centavos = 0;
+"""
+
+
+def _migracao_11_completar_ao_alterar(conn):
+    """dia e valor_centavos refeitos quando um terminal antigo altera data ou valor_total"""
+    # Terminal de versão anterior à 5 só conhece data/valor_total: ao corrigir um
+    # pedido, dia e valor_centavos ficavam com o valor antigo (e o resumo_diario,
+    # que soma valor_centavos, também). O UPDATE do trigger abaixo dispara de novo
+    # trg_resumo_upd, que leva o pedido do valor antigo para o novo no resumo.
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_pedidos_completar_upd AFTER UPDATE OF valor_total, data ON pedidos
+        WHEN (new.valor_total IS NOT old.valor_total AND new.valor_centavos IS old.valor_centavos)
+             OR (new.data IS NOT old.data AND new.dia IS old.dia)
+        BEGIN
+            UPDATE pedidos SET
+                valor_centavos = CASE WHEN new.valor_centavos IS old.valor_centavos
+                    THEN COALESCE({SQL_CENTAVOS.format('new.valor_total')}, valor_centavos) ELSE valor_centavos END,
+                dia = CASE WHEN new.dia IS old.dia
+                    THEN COALESCE({SQL_DIA.format('new.data')}, dia) ELSE dia END
+            WHERE id = new.id;
+        END
+    """)
+    conn.execute("DROP TRIGGER IF EXISTS trg_resumo_upd")
+    conn.execute(f"""
+        CREATE TRIGGER trg_resumo_upd
+        AFTER UPDATE OF dia, data, entregador, metodo_pagamento, valor_centavos, valor_total ON pedidos
+        BEGIN {_MOVER_RESUMO_V11} END
+    """)
+    # Pedidos já alterados assim: valem data/valor_total (o que o terminal antigo gravou),
+    # e o resumo é refeito a partir deles
+    conn.execute(f"""
+        UPDATE pedidos SET
+            valor_centavos = COALESCE({SQL_CENTAVOS.format('valor_total')}, valor_centavos),
+            dia = COALESCE({SQL_DIA.format('data')}, dia)
+        WHERE valor_centavos IS NOT COALESCE({SQL_CENTAVOS.format('valor_total')}, valor_centavos)
+           OR dia IS NOT COALESCE({SQL_DIA.format('data')}, dia)
+    """)
+    reconstruir_resumo_diario(conn)
+
+
+MIGRACOES = [
+    (1, _migracao_1_schema_base),
+    (2, _migracao_2_indices),
+    (3, _migracao_3_busca_clientes),
+    (4, _migracao_4_resumo_diario),
+    (5, _migracao_5_centavos_e_dias),
+    (6, _migracao_6_uuid_pedidos),
+    (7, _migracao_7_replicacao),
+    (8, _migracao_8_manutencao),
+    (9, _migracao_9_busca_so_se_mudar),
+    (10, _migracao_10_busca_por_nome),
+    (11, _migracao_11_completar_ao_alterar),
+]
+VERSAO_SCHEMA = MIGRACOES[-1][0]
+
+
+def versao_schema(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(conn):
+    """Aplica as migrações pendentes e retorna a versão final do schema"""
+    versao = versao_schema(conn)
+    if versao >= VERSAO_SCHEMA:
+        return versao
+
+    if versao == 0:
+        # Banco novo: espaço de linhas apagadas devolvido aos poucos (incremental_vacuum).
+        # Só vale antes da primeira tabela; bancos antigos são convertidos pela manutenção
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # journal_mode não pode mudar dentro de transação; é persistente no arquivo
+        conn.execute("PRAGMA journal_mode=WAL")
+
+    for numero, migracao in MIGRACOES:
+        if numero <= versao:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Outro terminal pode ter migrado enquanto esperávamos o lock
+            if versao_schema(conn) >= numero:
+                conn.rollback()
+                continue
+            migracao(conn)
+            conn.execute(f"PRAGMA user_version = {numero}")
+            conn.commit()
+            print(f"[BANCO] Migração {numero} aplicada ({migracao.__doc__})")
+        except Exception:
+            conn.rollback()
+            raise
+    return versao_schema(conn)
+
+
+# ================== BUSCA DE CLIENTES ==================
+COLUNAS_CLIENTE = "c.telefone, c.nome, c.rua, c.numero, c.bairro, c.referencia"
+LIMITE_BUSCA = 50       # Clientes por página da busca
+MAX_CANDIDATOS = 2000   # Acima disso a busca segue o índice por nome em vez de ordenar os candidatos
+
+
+def normalizar_texto(texto):
+    """Remove acentos e coloca em minúsculas ("João" -> "joao")"""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(ch for ch in decomposto if not unicodedata.combining(ch)).lower()
+
+
+def consulta_fts(termo):
+    """Monta a expressão MATCH com prefixo em cada palavra; None se não houver palavras"""
+    texto = normalizar_texto(termo)
+    if not re.search(r"[a-z]", texto):
+        # Só números/pontuação: trata como telefone, "(83) 9999-" -> "839999"
+        digitos = "".join(filter(str.isdigit, texto))
+        return f'"{digitos}"*' if digitos else None
+    palavras = re.findall(r"\w+", texto)
+    if not palavras:
+        return None
+    return " ".join(f'"{p}"*' for p in palavras)
+
+
+def tem_busca_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'clientes_busca'").fetchone() is not None
+
+
+def reconstruir_busca_clientes(conn):
+    """Recria o índice de busca a partir da tabela clientes"""
+    conn.execute("DELETE FROM clientes_busca")
+    conn.execute(f"""
+        INSERT INTO clientes_busca(rowid, nome, telefone, rua, bairro)
+        SELECT rowid, nome, {SQL_TELEFONE_BUSCA.format('clientes')}, rua, bairro FROM clientes
+    """)
+
+
+def buscar_clientes(conn, termo, limite=LIMITE_BUSCA, apos=None):
+    """Clientes cujo nome, telefone, rua ou bairro começam com as palavras de `termo`, em ordem de nome.
+
+    Paginação por chave: `apos` é (nome, telefone) do último cliente da
+    página anterior, e a próxima começa logo depois dele (sem OFFSET).
+    """
+    chave, parametros = "", ()
+    if apos is not None:
+        chave, parametros = "AND (c.nome, c.telefone) > (?, ?)", tuple(apos)
+    consulta = consulta_fts(termo) if termo else None
+    if consulta is None:
+        return conn.execute(f"SELECT {COLUNAS_CLIENTE} FROM clientes c WHERE true {chave} "
+                            "ORDER BY c.nome, c.telefone LIMIT ?", parametros + (limite,)).fetchall()
+    if not tem_busca_fts(conn):
+        t = f"%{termo}%"
+        return conn.execute(f"SELECT {COLUNAS_CLIENTE} FROM clientes c WHERE (c.nome LIKE ? OR c.telefone LIKE ?) "
+                            f"{chave} ORDER BY c.nome, c.telefone LIMIT ?", (t, t) + parametros + (limite,)).fetchall()
+    # Poucos candidatos: lê todos e ordena por nome. Termo genérico ("a" casa
+    # com boa parte da base): percorre o índice por nome e para ao encher a
+    # página, em vez de ordenar dezenas de milhares de clientes.
+    candidatos = conn.execute("SELECT count(*) FROM (SELECT 1 FROM clientes_busca WHERE clientes_busca MATCH ? "
+                              "LIMIT ?)", (consulta, MAX_CANDIDATOS + 1)).fetchone()[0]
+    indice = "INDEXED BY idx_clientes_nome" if candidatos > MAX_CANDIDATOS else ""
+    return conn.execute(f"""
+        SELECT {COLUNAS_CLIENTE}
+        FROM clientes c {indice}
+        WHERE c.rowid IN (SELECT rowid FROM clientes_busca WHERE clientes_busca MATCH ?) {chave}
+        ORDER BY c.nome, c.telefone
+        LIMIT ?
+    """, (consulta,) + parametros + (limite,)).fetchall()
+
+
+@contextmanager
+def interrompivel(conn, cancelar):
+    """Consultas do bloco abortam (OperationalError "interrupted") assim que o Event `cancelar` for setado"""
+    if cancelar is None:
+        yield
+        return
+    conn.set_progress_handler(cancelar.is_set, 1000)
+    try:
+        yield
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+# ================== RESUMO DIÁRIO ==================
+def reconstruir_resumo_diario(conn):
+    """Recalcula resumo_diario a partir de todos os pedidos"""
+    conn.execute("DELETE FROM resumo_diario")
+    conn.execute("""
+        INSERT INTO resumo_diario (dia, entregador, metodo, qtd, total_centavos)
+        SELECT COALESCE(dia, 0), COALESCE(entregador, ''), COALESCE(metodo_pagamento, ''),
+               COUNT(*), COALESCE(SUM(valor_centavos), 0)
+        FROM pedidos
+        GROUP BY 1, 2, 3
+    """)
+
+
+# ================== DIAS E CENTAVOS ==================
+_EPOCA = date(1970, 1, 1)
+
+
+def dia_de(data):
+    """date/datetime ou texto 'aaaa-mm-dd' -> número do dia (dias desde 1970-01-01)"""
+    if isinstance(data, str):
+        data = datetime.strptime(data, "%Y-%m-%d").date()
+    elif isinstance(data, datetime):
+        data = data.date()
+    return (data - _EPOCA).days
+
+
+def data_do_dia(dia):
+    return _EPOCA + timedelta(days=dia)
+
+
+def texto_para_centavos(valor_str):
+    """'12,50' / '12.5' -> 1250. Texto inválido vale 0, como em formatar_float"""
+    try:
+        valor = Decimal((valor_str or "").replace(",", ".").strip())
+        return int(valor.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * 100)
+    except (InvalidOperation, ValueError):
+        return 0
+
+
+def formatar_centavos(centavos):
+    """1250 -> '12.50' (mesmo formato que f'{valor:.2f}')"""
+    centavos = centavos or 0
+    sinal = "-" if centavos < 0 else ""
+    return f"{sinal}{abs(centavos) // 100}.{abs(centavos) % 100:02d}"
+
+
+# ================== CONSULTAS DAS TELAS ==================
+# SQL de cada tela num só lugar: a interface e o benchmark.py rodam os mesmos comandos.
+def buscar_cliente_por_telefone(conn, telefone):
+    """(nome, rua, numero, bairro, referencia) ou None"""
+    return conn.execute("SELECT nome, rua, numero, bairro, referencia FROM clientes WHERE telefone = ?",
+                        (telefone,)).fetchone()
+
+
+def enderecos_do_cliente(conn, telefone):
+    return conn.execute("SELECT rua, numero, bairro, referencia, ultimo_uso FROM historico_enderecos "
+                        "WHERE telefone_cliente = ? ORDER BY ultimo_uso DESC", (telefone,)).fetchall()
+
+
+def painel_do_dia(conn, dia):
+    """(entregas, faturamento em centavos, [(entregador, qtd)]) do dia, pelo resumo_diario"""
+    total_entregas, faturamento = conn.execute(
+        "SELECT COALESCE(SUM(qtd), 0), COALESCE(SUM(total_centavos), 0) FROM resumo_diario WHERE dia = ?",
+        (dia,)).fetchone()
+    por_entregador = conn.execute("""
+        SELECT NULLIF(entregador, ''), SUM(qtd) 
+        FROM resumo_diario 
+        WHERE dia = ? 
+        GROUP BY entregador 
+        ORDER BY SUM(qtd) DESC
+    """, (dia,)).fetchall()
+    return total_entregas, faturamento, por_entregador
+
+
+def cursor_entregas_do_periodo(conn, dia_ini, dia_fim, entregador=None, limite=-1, deslocamento=0):
+    """Cursor (id, dia, nome, telefone, entregador, centavos, metodo) do período, mais recentes primeiro"""
+    filtro, parametros = "", (dia_ini, dia_fim)
+    if entregador is not None:
+        filtro, parametros = " AND p.entregador = ?", (dia_ini, dia_fim, entregador)
+    return conn.execute(f"""
+        SELECT p.id, p.dia, c.nome, c.telefone, p.entregador, 
+               p.valor_centavos, p.metodo_pagamento
+        FROM pedidos p
+        LEFT JOIN clientes c ON p.cliente_tel = c.telefone
+        WHERE p.dia BETWEEN ? AND ?{filtro}
+        ORDER BY p.dia DESC, p.id DESC
+        LIMIT ? OFFSET ?
+    """, parametros + (limite, deslocamento))
+
+
+def resumo_do_periodo(conn, dia_ini, dia_fim, entregador=None):
+    """[(entregador, qtd, centavos)] pelo resumo_diario (uma linha por dia/entregador/pagamento)"""
+    if entregador is None:
+        return conn.execute("""
+            SELECT NULLIF(entregador, ''), SUM(qtd), SUM(total_centavos)
+            FROM resumo_diario
+            WHERE dia BETWEEN ? AND ?
+            GROUP BY entregador
+        """, (dia_ini, dia_fim)).fetchall()
+    return conn.execute("""
+        SELECT entregador, SUM(qtd), SUM(total_centavos)
+        FROM resumo_diario
+        WHERE dia BETWEEN ? AND ? AND entregador = ?
+        GROUP BY entregador
+    """, (dia_ini, dia_fim, entregador)).fetchall()
+
+
+def entregas_do_periodo(conn, dia_ini, dia_fim, entregador=None):
+    """(pedidos, resumo por entregador) entre dois números de dia; entregador None = todos"""
+    pedidos = cursor_entregas_do_periodo(conn, dia_ini, dia_fim, entregador).fetchall()
+    return pedidos, resumo_do_periodo(conn, dia_ini, dia_fim, entregador)
+
+
+def pagina_entregas_do_periodo(conn, dia_ini, dia_fim, entregador=None, inicio=0, quantidade=100):
+    """Pedidos [inicio, inicio + quantidade) de entregas_do_periodo, sem ler os anteriores.
+
+    Um OFFSET grande percorre todos os pedidos pulados (segundos no fim de um
+    ano). Com as quantidades por dia do resumo_diario, a consulta já começa
+    no dia onde está `inicio` e só pula os pedidos desse dia.
+    """
+    if entregador is None:
+        dias = conn.execute("SELECT dia, SUM(qtd) FROM resumo_diario WHERE dia BETWEEN ? AND ? "
+                            "GROUP BY dia ORDER BY dia DESC", (dia_ini, dia_fim))
+    else:
+        dias = conn.execute("SELECT dia, SUM(qtd) FROM resumo_diario WHERE dia BETWEEN ? AND ? AND entregador = ? "
+                            "GROUP BY dia ORDER BY dia DESC", (dia_ini, dia_fim, entregador))
+    antes = 0
+    for dia, qtd in dias:
+        if antes + qtd > inicio:
+            return cursor_entregas_do_periodo(conn, dia_ini, dia, entregador, quantidade, inicio - antes).fetchall()
+        antes += qtd
+    return []
+
+
+def contar_lembretes_vencidos(conn, data):
+    """Lembretes pendentes com aviso até `data` ('aaaa-mm-dd')"""
+    return conn.execute("SELECT count(*) FROM lembretes WHERE data_aviso <= ? AND status = 'PENDENTE'",
+                        (data,)).fetchone()[0]
+
+
+def lembretes_vencidos(conn, data, limite=-1, deslocamento=0):
+    """[(id, nome, telefone, medicamento, data_aviso)] pendentes com aviso até `data`"""
+    return conn.execute("SELECT l.id, c.nome, c.telefone, l.medicamento, l.data_aviso FROM lembretes l "
+                        "JOIN clientes c ON l.cliente_tel = c.telefone "
+                        "WHERE l.data_aviso <= ? AND l.status = 'PENDENTE' "
+                        "ORDER BY l.data_aviso, l.id LIMIT ? OFFSET ?", (data, limite, deslocamento)).fetchall()
+
+
+def contar_lembretes_pendentes(conn):
+    """Lembretes pendentes, de qualquer data"""
+    return conn.execute("SELECT count(*) FROM lembretes WHERE status = 'PENDENTE'").fetchone()[0]
+
+
+def lembretes_pendentes(conn, limite=-1, deslocamento=0):
+    """Todos os lembretes pendentes, do aviso mais próximo ao mais distante"""
+    return conn.execute("""
+        SELECT l.id, c.nome, c.telefone, l.medicamento, l.data_aviso 
+        FROM lembretes l
+        JOIN clientes c ON l.cliente_tel = c.telefone
+        WHERE l.status = 'PENDENTE'
+        ORDER BY l.data_aviso ASC, l.id
+        LIMIT ? OFFSET ?
+    """, (limite, deslocamento)).fetchall()
+
+
+# ================== GRAVAÇÃO DE PEDIDOS ==================
+def agora_utc():
+    """Carimbo no mesmo formato de strftime('%Y-%m-%d %H:%M:%f', 'now') do SQLite"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def gravar_cliente(cursor, cliente):
+    """Insere ou atualiza o cliente; a alteração mais recente (atualizado_em) vence.
+
+    Uma gravação vinda da fila (ex.: feita com o servidor fora do ar) mais
+    antiga que a versão do banco é descartada; empate mantém a do banco.
+    Sem carimbo, a gravação sempre vale.
+    """
+    carimbo = cliente.get("atualizado_em")
+    if carimbo:
+        cursor.execute("SELECT atualizado_em FROM clientes WHERE telefone = ?", (cliente["telefone"],))
+        atual = cursor.fetchone()
+        if atual and atual[0] and atual[0] >= carimbo:
+            return False
+    cursor.execute("""
+        INSERT OR REPLACE INTO clientes (telefone, nome, rua, numero, bairro, referencia, atualizado_em)
+        VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, strftime('%Y-%m-%d %H:%M:%f', 'now')))
+    """, (cliente["telefone"], cliente["nome"], cliente["rua"], cliente["numero"], cliente["bairro"],
+          cliente["referencia"], carimbo))
+    return True
+
+
+def _id_provisorio(cursor, tabela, provisorio):
+    """Na réplica local, linhas ainda não gravadas no servidor ganham id negativo"""
+    if not provisorio:
+        return None
+    cursor.execute(f"SELECT MIN(COALESCE(MIN(id), 0), 0) - 1 FROM {tabela}")
+    return cursor.fetchone()[0]
+
+
+def gravar_cadastro_do_pedido(cursor, pedido, provisorio=False):
+    """Grava o que o pedido muda no cadastro: cliente, histórico de endereço e lembrete.
+
+    Com provisorio=True (réplica local) os ids novos são negativos, para não
+    colidirem com os do servidor; somem quando a réplica se reconcilia.
+    """
+    tel = pedido["telefone"]
+    gravar_cliente(cursor, {
+        "telefone": tel, "nome": pedido["nome"], "rua": pedido["rua"], "numero": pedido["numero"],
+        "bairro": pedido["bairro"], "referencia": pedido["referencia"],
+        "atualizado_em": pedido.get("registrado_em"),
+    })
+
+    cursor.execute("SELECT rua, numero FROM historico_enderecos WHERE telefone_cliente = ? ORDER BY id < 0 DESC, abs(id) DESC LIMIT 1", (tel,))
+    ultimo = cursor.fetchone()
+    if not ultimo or (ultimo[0] != pedido["rua"] or ultimo[1] != pedido["numero"]):
+        cursor.execute("INSERT INTO historico_enderecos (id, telefone_cliente, rua, numero, bairro, referencia, ultimo_uso) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (_id_provisorio(cursor, "historico_enderecos", provisorio), tel, pedido["rua"], pedido["numero"],
+                        pedido["bairro"], pedido["referencia"], pedido["data"]))
+
+    lembrete = pedido.get("lembrete")
+    if lembrete:
+        cursor.execute("INSERT INTO lembretes (id, cliente_tel, medicamento, data_aviso, status) VALUES (?, ?, ?, ?, 'PENDENTE')",
+                       (_id_provisorio(cursor, "lembretes", provisorio), tel, lembrete["medicamento"], lembrete["data_aviso"]))
+
+
+def gravar_pedido(cursor, pedido):
+    """Grava cliente, histórico de endereço, pedido e lembrete de um pedido.
+
+    `pedido` é o dicionário montado em App.finalizar (e guardado na fila).
+    Pedido com uuid já gravado é ignorado, o que torna a regravação segura.
+    """
+    if pedido.get("uuid"):
+        cursor.execute("SELECT 1 FROM pedidos WHERE uuid = ?", (pedido["uuid"],))
+        if cursor.fetchone():
+            return False
+
+    tel = pedido["telefone"]
+    gravar_cadastro_do_pedido(cursor, pedido)
+
+    cursor.execute("INSERT INTO pedidos (uuid, data, dia, cliente_tel, entregador, valor_total, valor_centavos, metodo_pagamento, detalhes_pagamento) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                   (pedido.get("uuid"), pedido["data"], dia_de(pedido["data"]), tel, pedido["entregador"],
+                    pedido["valor_centavos"] / 100, pedido["valor_centavos"], pedido["metodo_pagamento"],
+                    pedido["detalhes_pagamento"]))
+    return True
+
+
+def gravar_endereco(cursor, endereco, provisorio=False):
+    """Acrescenta um endereço ao histórico do cliente; um endereço igual já gravado não se repete"""
+    cursor.execute("SELECT 1 FROM historico_enderecos WHERE telefone_cliente = ? AND rua = ? AND numero IS ? "
+                   "AND bairro = ? AND referencia IS ?",
+                   (endereco["telefone"], endereco["rua"], endereco["numero"], endereco["bairro"], endereco["referencia"]))
+    if cursor.fetchone():
+        return False
+    cursor.execute("INSERT INTO historico_enderecos (id, telefone_cliente, rua, numero, bairro, referencia, ultimo_uso) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                   (_id_provisorio(cursor, "historico_enderecos", provisorio), endereco["telefone"], endereco["rua"],
+                    endereco["numero"], endereco["bairro"], endereco["referencia"], endereco["ultimo_uso"]))
+    return True
+
+
+def gravar_lembrete(cursor, lembrete, provisorio=False):
+    """Agenda o lembrete; o mesmo lembrete já pendente não se repete"""
+    cursor.execute("SELECT 1 FROM lembretes WHERE cliente_tel = ? AND medicamento = ? AND data_aviso = ? AND status = 'PENDENTE'",
+                   (lembrete["telefone"], lembrete["medicamento"], lembrete["data_aviso"]))
+    if cursor.fetchone():
+        return False
+    cursor.execute("INSERT INTO lembretes (id, cliente_tel, medicamento, data_aviso, status) VALUES (?, ?, ?, ?, 'PENDENTE')",
+                   (_id_provisorio(cursor, "lembretes", provisorio), lembrete["telefone"], lembrete["medicamento"],
+                    lembrete["data_aviso"]))
+    return True
+
+
+def excluir_cliente(cursor, telefone):
+    """Apaga o cliente com pedidos, lembretes e endereços"""
+    cursor.execute("DELETE FROM clientes WHERE telefone = ?", (telefone,))
+    cursor.execute("DELETE FROM pedidos WHERE cliente_tel = ?", (telefone,))
+    cursor.execute("DELETE FROM lembretes WHERE cliente_tel = ?", (telefone,))
+    cursor.execute("DELETE FROM historico_enderecos WHERE telefone_cliente = ?", (telefone,))
+
+
+def gravar_da_fila(cursor, dados, provisorio=False):
+    """Grava um registro da fila de gravação conforme o "tipo" (sem tipo, é um pedido).
+
+    Como a fila reenvia o que não foi confirmado, toda gravação aqui pode
+    rodar duas vezes sem efeito a mais. provisorio=True é a réplica local.
+    """
+    tipo = dados.get("tipo")
+    if tipo is None:
+        return gravar_pedido(cursor, dados)
+    if tipo == "cliente":
+        return gravar_cliente(cursor, dados)
+    if tipo == "endereco":
+        return gravar_endereco(cursor, dados, provisorio)
+    if tipo == "lembrete":
+        return gravar_lembrete(cursor, dados, provisorio)
+    if tipo == "baixa_lembrete":
+        cursor.execute("UPDATE lembretes SET status = 'CONCLUIDO' WHERE id = ?", (dados["id"],))
+    elif tipo == "apagar_lembrete":
+        cursor.execute("DELETE FROM lembretes WHERE id = ?", (dados["id"],))
+    elif tipo == "excluir_cliente":
+        excluir_cliente(cursor, dados["telefone"])
+    else:
+        raise ValueError(f"tipo de registro desconhecido: {tipo}")
+    return True
+
+
+def podar_log_replicacao(conn, manter=LOG_REPLICACAO_MANTER):
+    """Apaga o começo do log; réplicas que ficaram para trás fazem carga completa"""
+    conn.execute("DELETE FROM log_replicacao WHERE seq <= (SELECT MAX(seq) FROM log_replicacao) - ?", (manter,))
+
+
+# ================== LINHA DE COMANDO ==================
+# Uso: python banco.py reconstruir-resumo [caminho_do_banco]
+#      python banco.py reconstruir-busca [caminho_do_banco]
+if __name__ == "__main__":
+    comandos = {
+        "reconstruir-resumo": reconstruir_resumo_diario,
+        "reconstruir-busca": reconstruir_busca_clientes,
+    }
+    if len(sys.argv) < 2 or sys.argv[1] not in comandos:
+        print("Uso: python banco.py [" + " | ".join(comandos) + "] [caminho_do_banco]")
+        sys.exit(1)
+    caminho = sys.argv[2] if len(sys.argv) > 2 else "dados_farmacia.db"
+    conn = sqlite3.connect(caminho, timeout=30)
+    migrar(conn)
+    with conn:
+        comandos[sys.argv[1]](conn)
+    conn.close()
+    print(f"[BANCO] {sys.argv[1]} concluído em {caminho}")
@@ -0,0 +1,210 @@
+"""Benchmark das consultas de cada tela, sem interface.
+
+Roda as mesmas funções de banco.py que a interface usa (buscar_cliente,
+carregar_clientes, painel, histórico de entregas, alertas de recompra e
+agendamentos) e grava os tempos em JSON, para comparar versões e tamanhos
+de banco.
+
+    python benchmark.py banco_teste.db --saida v11_200k.json
+    python benchmark.py banco_teste.db --comparar v10_200k.json
+    python benchmark.py tcp://127.0.0.1:5917 --terminais 30   (servidor_banco.py)
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, datetime
+
+from banco import (GerenciadorConexoes, buscar_cliente_por_telefone, buscar_clientes, contar_lembretes_pendentes,
+                   contar_lembretes_vencidos, dia_de, lembretes_pendentes, lembretes_vencidos,
+                   pagina_entregas_do_periodo, painel_do_dia, resumo_do_periodo)
+from desempenho import percentil
+from servidor_banco import ConexoesServidor, eh_endereco_servidor
+
+REPETICOES = 30
+TAMANHO_PAGINA = 100   # Mesma página da ListaVirtual (lista_virtual.py)
+
+
+def _casos(conn, rnd, hoje):
+    """[(tela, caso, funcao(conn, parametro), [parametros])] com parâmetros tirados do próprio banco"""
+    maior = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM clientes").fetchone()[0]
+    sorteados = rnd.sample(range(1, maior + 1), min(200, maior))
+    amostra = conn.execute(f"SELECT telefone, nome FROM clientes WHERE rowid IN ({', '.join('?' * len(sorteados))})",
+                           sorteados).fetchall() or [("83999990000", "Maria")]
+    telefones = [tel for tel, _ in amostra]
+    nomes = [nome for _, nome in amostra[:20]]
+    bairros = [linha[0] for linha in conn.execute("SELECT DISTINCT bairro FROM clientes LIMIT 20")] or ["Centro"]
+    inexistentes = [f"8390000{rnd.randrange(10 ** 4):04d}" for _ in range(20)]
+    dia = dia_de(hoje)
+    data = hoje.isoformat()
+
+    primeira_a = buscar_clientes(conn, "a")
+    apos_a = (primeira_a[-1][1], primeira_a[-1][0]) if primeira_a else None   # Rolou até o fim da 1ª página
+
+    ano = sum(qtd for _, qtd, _ in resumo_do_periodo(conn, dia - 365, dia))
+    ultima_pagina = max(0, ano - TAMANHO_PAGINA)
+
+    def historico(c, dias, entregador):
+        # O que a tela busca: o resumo e a primeira página (as outras vêm ao rolar)
+        return (pagina_entregas_do_periodo(c, dia - dias, dia, entregador, 0, TAMANHO_PAGINA),
+                resumo_do_periodo(c, dia - dias, dia, entregador))
+
+    return [
+        ("buscar_cliente", "telefone cadastrado", buscar_cliente_por_telefone, telefones),
+        ("buscar_cliente", "telefone novo", buscar_cliente_por_telefone, inexistentes),
+        ("carregar_clientes", "lista inicial", buscar_clientes, [""]),
+        ("carregar_clientes", "uma letra (digitando)", buscar_clientes, ["a", "m", "j"]),
+        ("carregar_clientes", "prefixo do nome", buscar_clientes, [n.split()[0][:3] for n in nomes]),
+        ("carregar_clientes", "uma letra, próxima página",
+         lambda c, apos: buscar_clientes(c, "a", apos=apos), [apos_a]),
+        ("carregar_clientes", "nome completo", buscar_clientes, nomes),
+        ("carregar_clientes", "parte do telefone", buscar_clientes, [t[2:7] for t in telefones[:20]]),
+        ("carregar_clientes", "bairro", buscar_clientes, bairros),
+        ("atualizar_painel_status", "hoje", painel_do_dia, [dia]),
+        ("consultar_historico_entregas", "7 dias", lambda c, e: historico(c, 7, e), [None]),
+        ("consultar_historico_entregas", "30 dias", lambda c, e: historico(c, 30, e), [None]),
+        ("consultar_historico_entregas", "60 dias", lambda c, e: historico(c, 60, e), [None]),
+        ("consultar_historico_entregas", "30 dias, um entregador", lambda c, e: historico(c, 30, e), ["Entregador A"]),
+        ("consultar_historico_entregas", "365 dias, rolado até o fim",
+         lambda c, inicio: pagina_entregas_do_periodo(c, dia - 365, dia, None, inicio, TAMANHO_PAGINA),
+         [ultima_pagina]),
+        ("ver_alertas_recompra", "contar avisos de hoje", contar_lembretes_vencidos, [data]),
+        ("ver_alertas_recompra", "primeira página", lambda c, d: lembretes_vencidos(c, d, TAMANHO_PAGINA), [data]),
+        ("listar_todos_agendamentos", "contar pendentes", lambda c, _: contar_lembretes_pendentes(c), [None]),
+        ("listar_todos_agendamentos", "primeira página", lambda c, _: lembretes_pendentes(c, TAMANHO_PAGINA), [None]),
+    ]
+
+
+def _linhas(resultado):
+    if isinstance(resultado, list):
+        return len(resultado)
+    if isinstance(resultado, tuple) and resultado and isinstance(resultado[0], list):
+        return len(resultado[0])   # (pedidos, resumo)
+    return 1 if resultado is not None else 0
+
+
+def _versao_codigo():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _medir(banco, casos, repeticoes, terminais):
+    """[(tempos, linhas)] de cada caso; com vários terminais, todos rodam o mesmo caso ao mesmo tempo"""
+    tempos = [[] for _ in casos]
+    linhas = [0] * len(casos)
+    largada = threading.Barrier(terminais)
+    lock = threading.Lock()
+
+    def terminal():
+        conn = banco.conexao()   # Uma conexão (ou sessão no servidor) por thread
+        for indice, (_, _, funcao, parametros) in enumerate(casos):
+            largada.wait()
+            medidos = []
+            for i in range(repeticoes):
+                parametro = parametros[i % len(parametros)]
+                inicio = time.perf_counter()
+                resultado = funcao(conn, parametro)
+                medidos.append(time.perf_counter() - inicio)
+            with lock:
+                tempos[indice].extend(medidos)
+                linhas[indice] = _linhas(resultado)
+
+    if terminais == 1:
+        terminal()
+    else:
+        threads = [threading.Thread(target=terminal, name=f"terminal-{n}") for n in range(terminais)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return list(zip(tempos, linhas))
+
+
+def executar(caminho, repeticoes=REPETICOES, modo="local", semente=42, terminais=1):
+    """Roda todos os casos e retorna o dicionário que vai para o JSON.
+
+    `caminho` pode ser o endereço de um servidor_banco (tcp://...).
+    """
+    servidor = eh_endereco_servidor(caminho)
+    banco = ConexoesServidor(caminho) if servidor else GerenciadorConexoes(caminho, modo=modo)
+    conn = banco.conexao()
+    rnd = random.Random(semente)
+    hoje = date.today()
+
+    casos = _casos(conn, rnd, hoje)
+    resultados = []
+    for (tela, caso, _, _), (tempos, linhas) in zip(casos, _medir(banco, casos, repeticoes, terminais)):
+        ordenados = sorted(tempos)
+        resultados.append({
+            "tela": tela, "caso": caso, "repeticoes": len(tempos), "linhas": linhas,
+            "primeira_ms": round(tempos[0] * 1000, 3),
+            "min_ms": round(ordenados[0] * 1000, 3),
+            "p50_ms": round(percentil(ordenados, 50) * 1000, 3),
+            "p95_ms": round(percentil(ordenados, 95) * 1000, 3),
+            "max_ms": round(ordenados[-1] * 1000, 3),
+            "media_ms": round(sum(tempos) / len(tempos) * 1000, 3),
+        })
+
+    contagens = {tabela: conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+                 for tabela in ("clientes", "pedidos", "historico_enderecos", "lembretes")}
+    tamanho = banco.estado()["tamanho"] if servidor else os.path.getsize(caminho)
+    banco.fechar_todas()
+    return {
+        "executado_em": datetime.now().isoformat(timespec="seconds"),
+        "versao_codigo": _versao_codigo(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "sistema": platform.platform(),
+        "banco": {"caminho": caminho if servidor else os.path.abspath(caminho), "tamanho_mb": round(tamanho / 1048576, 1),
+                  "modo": banco.modo, "terminais": terminais, **contagens},
+        "resultados": resultados,
+    }
+
+
+def imprimir(relatorio, anterior=None):
+    base = {}
+    if anterior:
+        base = {(r["tela"], r["caso"]): r for r in anterior["resultados"]}
+    print(f"{'tela':<30} {'caso':<26} {'linhas':>7} {'p50':>9} {'p95':>9}" + ("   p50 antes" if base else ""))
+    for r in relatorio["resultados"]:
+        linha = f"{r['tela']:<30} {r['caso']:<26} {r['linhas']:>7} {r['p50_ms']:>7.2f}ms {r['p95_ms']:>7.2f}ms"
+        antes = base.get((r["tela"], r["caso"]))
+        if antes:
+            variacao = (r["p50_ms"] / antes["p50_ms"] - 1) if antes["p50_ms"] else 0.0
+            linha += f"   {antes['p50_ms']:.2f}ms ({variacao:+.0%})"
+        print(linha)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tempos das consultas de cada tela")
+    parser.add_argument("banco", help="arquivo .db (ex.: gerado por gerar_dados.py) ou tcp://[senha@]host:porta")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES)
+    parser.add_argument("--modo", choices=("local", "rede"), default="local", help="perfil de PRAGMAs")
+    parser.add_argument("--terminais", type=int, default=1, help="terminais simultâneos (uma thread cada)")
+    parser.add_argument("--saida", help="arquivo JSON (padrão: benchmark_<data>.json)")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior, para mostrar a variação")
+    args = parser.parse_args()
+    if not eh_endereco_servidor(args.banco) and not os.path.exists(args.banco):
+        print(f"[BENCHMARK] {args.banco} não existe")
+        sys.exit(1)
+
+    relatorio = executar(args.banco, args.repeticoes, args.modo, terminais=args.terminais)
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)
+    imprimir(relatorio, anterior)
+
+    saida = args.saida or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M')}.json"
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"[BENCHMARK] Resultados em {saida}")
@@ -0,0 +1,343 @@
+"""Cupom e etiqueta desenhados como imagem de 1 bit (Pillow).
+
+O cupom em texto depende do TextOut do GDI (só Windows) ou da fonte interna
+da térmica, sem tamanhos de letra. Aqui o cupom vira uma imagem com a
+largura em pontos da cabeça de impressão e sai como comando raster ESC/POS
+(GS v 0, qualquer térmica) ou como PNG para pré-visualizar.
+
+Para desenhar um cupom em poucos milissegundos:
+- o layout é compilado uma vez (Layout): fontes resolvidas e as linhas
+  fixas (cabeçalho, separadores, rodapé) já desenhadas;
+- as fontes e a largura de cada caractere ficam em cache;
+- linhas e palavras que se repetem entre cupons (entregador, "Sem Troco",
+  "Bairro:") vêm de caches de imagens já desenhadas; o FreeType só desenha
+  as palavras novas.
+
+Na imagem, 1 é ponto impresso (o contrário do branco do Pillow): assim os
+bytes da imagem já são os do comando raster.
+
+    python cupom_raster.py --quantidade 500 --png exemplo.png
+"""
+import argparse
+import functools
+import string
+import sys
+import time
+from datetime import datetime
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+LARGURA_PONTOS = 576   # 80 mm a 203 dpi (58 mm: 384)
+MARGEM = 8
+ESPACO_LINHA = 4       # Pontos entre uma linha e outra
+LINHAS_POR_FAIXA = 256 # Altura de cada GS v 0 (várias térmicas não aceitam imagens altas num comando só)
+
+# Fonte TrueType: a primeira encontrada (Courier New no Windows, DejaVu/Liberation no Linux)
+FONTES = {
+    False: ("cour.ttf", "DejaVuSansMono.ttf", "LiberationMono-Regular.ttf"),
+    True: ("courbd.ttf", "DejaVuSansMono-Bold.ttf", "LiberationMono-Bold.ttf"),
+}
+ESTILOS = {   # nome -> (tamanho em pontos, negrito)
+    "normal": (24, False),
+    "negrito": (24, True),
+    "grande": (30, True),
+    "titulo": (38, True),
+}
+
+
+# ================== FONTES ==================
+@functools.lru_cache(maxsize=None)
+def carregar_fonte(tamanho, negrito=False):
+    for nome in FONTES[negrito]:
+        try:
+            return ImageFont.truetype(nome, tamanho)
+        except OSError:
+            continue
+    print(f"[RASTER] Nenhuma fonte de {FONTES[negrito]} encontrada, usando a padrão do Pillow")
+    return ImageFont.load_default(tamanho)
+
+
+class Fonte:
+    """Fonte de um estilo com as larguras dos caracteres em cache"""
+
+    def __init__(self, estilo):
+        tamanho, negrito = ESTILOS[estilo]
+        self.estilo = estilo
+        self.fonte = carregar_fonte(tamanho, negrito)
+        subida, descida = self.fonte.getmetrics()
+        self.altura = subida + descida
+        self._larguras = {}
+
+    def largura(self, texto):
+        larguras = self._larguras
+        total = 0
+        for caractere in texto:
+            largura = larguras.get(caractere)
+            if largura is None:
+                largura = larguras[caractere] = self.fonte.getlength(caractere)
+            total += largura
+        return total
+
+    def quebrar(self, texto, largura):
+        """Linhas de `texto` que cabem em `largura` pontos (quebra nas palavras)"""
+        linhas = []
+        for paragrafo in texto.split("\n"):
+            atual = None   # Espaços do começo da linha são mantidos (cupom em texto puro)
+            for palavra in paragrafo.split(" "):
+                candidata = palavra if atual is None else f"{atual} {palavra}"
+                if atual and self.largura(candidata) > largura:
+                    linhas.append(atual)
+                    atual = palavra
+                else:
+                    atual = candidata
+                while self.largura(atual) > largura and len(atual) > 1:
+                    # Palavra maior que a linha: corta no caractere
+                    corte = len(atual)
+                    while corte > 1 and self.largura(atual[:corte]) > largura:
+                        corte -= 1
+                    linhas.append(atual[:corte])
+                    atual = atual[corte:]
+            linhas.append(atual)
+        return linhas
+
+
+@functools.lru_cache(maxsize=None)
+def fonte(estilo):
+    return Fonte(estilo)
+
+
+@functools.lru_cache(maxsize=4096)
+def desenhar_palavra(estilo, palavra):
+    """Imagem 1 bit de uma palavra (1 = ponto impresso)"""
+    f = fonte(estilo)
+    esquerda, topo, direita, base = f.fonte.getbbox(palavra)
+    imagem = Image.new("1", (max(1, direita), f.altura), 0)
+    ImageDraw.Draw(imagem).text((0, 0), palavra, font=f.fonte, fill=1)
+    return imagem
+
+
+@functools.lru_cache(maxsize=1024)
+def desenhar_linha(estilo, texto):
+    """Imagem 1 bit de uma linha, do tamanho do texto.
+
+    O FreeType leva dezenas de microssegundos por caractere; a linha é
+    montada com as palavras já desenhadas (nome de rua, "R$", "Bairro:"
+    se repetem de um cupom para outro) e só palavras novas passam por ele.
+    """
+    f = fonte(estilo)
+    imagem = Image.new("1", (max(1, round(f.largura(texto))), f.altura), 0)
+    x = 0
+    espaco = f.largura(" ")
+    for palavra in texto.split(" "):
+        if palavra:
+            # Com máscara: só os pontos da palavra, sem apagar a vizinha
+            imagem.paste(1, (round(x), 0), desenhar_palavra(estilo, palavra))
+            x += f.largura(palavra)
+        x += espaco
+    return imagem
+
+
+# ================== LAYOUT ==================
+class Layout:
+    """Lista de elementos compilada para uma largura de papel.
+
+    Elementos:
+    - ("texto", estilo, modelo[, campo]) alinhado à esquerda, com quebra;
+    - ("centro", estilo, modelo[, campo]) centralizado, com quebra;
+    - ("colunas", estilo, esquerda, direita) numa linha só, nas duas margens;
+    - ("separador",) e ("espaco", pontos).
+    Modelos usam {campo} de renderizar(campos); com `campo`, o elemento só
+    aparece se campos[campo] não estiver vazio.
+    """
+
+    def __init__(self, elementos, largura=LARGURA_PONTOS):
+        self.largura = largura
+        self.util = largura - 2 * MARGEM
+        self._passos = [self._compilar(elemento) for elemento in elementos]
+
+    def _compilar(self, elemento):
+        tipo = elemento[0]
+        if tipo == "separador":
+            imagem = Image.new("1", (self.util, 2 + ESPACO_LINHA * 2), 0)
+            ImageDraw.Draw(imagem).line((0, ESPACO_LINHA, self.util, ESPACO_LINHA), fill=1, width=2)
+            return ("pronto", None, [(imagem, MARGEM)])
+        if tipo == "espaco":
+            return ("pronto", None, [(Image.new("1", (1, elemento[1]), 0), MARGEM)])
+        estilo, modelos, campo = elemento[1], elemento[2:], None
+        if tipo != "colunas" and len(modelos) == 2:
+            modelos, campo = modelos[:1], modelos[1]
+        if campo is None and not any(_nomes_campos(modelo) for modelo in modelos):
+            # Sem campos: desenhado agora, uma vez
+            return ("pronto", None, self._linhas(tipo, estilo, [modelo for modelo in modelos]))
+        return (tipo, campo, (estilo, modelos))
+
+    def _linhas(self, tipo, estilo, textos):
+        """[(imagem, x)] de um elemento já com os textos preenchidos"""
+        f = fonte(estilo)
+        if tipo == "colunas":
+            esquerda, direita = textos
+            imagem = Image.new("1", (self.util, f.altura), 0)
+            imagem.paste(desenhar_linha(estilo, esquerda), (0, 0))
+            imagem_direita = desenhar_linha(estilo, direita)
+            imagem.paste(imagem_direita, (self.util - imagem_direita.width, 0))
+            return [(imagem, MARGEM)]
+        linhas = []
+        for texto in f.quebrar(textos[0], self.util):
+            imagem = desenhar_linha(estilo, texto)
+            x = MARGEM + (self.util - imagem.width) // 2 if tipo == "centro" else MARGEM
+            linhas.append((imagem, x))
+        return linhas
+
+    def renderizar(self, campos):
+        """Imagem 1 bit do layout preenchido com `campos` (dicionário de textos)"""
+        linhas = []
+        for tipo, campo, dados in self._passos:
+            if tipo == "pronto":
+                linhas.extend(dados)
+            elif campo is None or campos.get(campo):
+                estilo, modelos = dados
+                linhas.extend(self._linhas(tipo, estilo, [modelo.format_map(campos) for modelo in modelos]))
+        altura = MARGEM + sum(imagem.height + ESPACO_LINHA for imagem, _ in linhas) + MARGEM
+        pagina = Image.new("1", (self.largura, altura), 0)
+        y = MARGEM
+        for imagem, x in linhas:
+            pagina.paste(imagem, (x, y))
+            y += imagem.height + ESPACO_LINHA
+        return pagina
+
+
+def _nomes_campos(modelo):
+    return [nome for _, nome, _, _ in string.Formatter().parse(modelo) if nome]
+
+
+LAYOUT_CUPOM = (
+    ("centro", "titulo", "FARMÁCIA TOTALPHARMA"),
+    ("centro", "normal", "{data_hora}"),
+    ("separador",),
+    ("texto", "negrito", "CLIENTE: {nome}"),
+    ("texto", "normal", "TEL: {telefone}"),
+    ("separador",),
+    ("texto", "negrito", "ENTREGA:"),
+    ("texto", "grande", "{endereco}"),
+    ("texto", "grande", "Bairro: {bairro}"),
+    ("texto", "normal", "Obs: {referencia}", "referencia"),
+    ("separador",),
+    ("texto", "normal", "MOTOBOY: {entregador}"),
+    ("separador",),
+    ("colunas", "normal", "Produtos:", "R$ {produtos}"),
+    ("colunas", "normal", "Taxa:", "R$ {taxa}"),
+    ("colunas", "grande", "TOTAL:", "R$ {total}"),
+    ("separador",),
+    ("texto", "normal", "{pagamento}"),
+    ("separador",),
+    ("espaco", 10),
+    ("centro", "normal", "Obrigado pela preferência!"),
+    ("espaco", 40),
+)
+
+LAYOUT_ETIQUETA = (
+    ("centro", "titulo", "ENTREGA RÁPIDA"),
+    ("separador",),
+    ("texto", "negrito", "CLI: {nome}"),
+    ("texto", "normal", "TEL: {telefone}"),
+    ("separador",),
+    ("texto", "titulo", "{endereco}"),
+    ("texto", "grande", "Bairro: {bairro}"),
+    ("texto", "normal", "Obs: {referencia}", "referencia"),
+    ("separador",),
+    ("texto", "negrito", "MOTO: {entregador}"),
+    ("espaco", 40),
+)
+
+LAYOUTS = {"cupom": LAYOUT_CUPOM, "etiqueta": LAYOUT_ETIQUETA}
+
+
+@functools.lru_cache(maxsize=None)
+def layout(tipo, largura=LARGURA_PONTOS):
+    """Layout compilado (uma vez por tipo e largura); tipos sem layout saem como texto"""
+    return Layout(LAYOUTS.get(tipo, ()), largura)
+
+
+def renderizar(tipo, campos, largura=LARGURA_PONTOS):
+    return layout(tipo, largura).renderizar(campos)
+
+
+def renderizar_texto(texto, largura=LARGURA_PONTOS):
+    """Cupom em texto puro (trabalhos sem campos) desenhado linha a linha em fonte fixa"""
+    return Layout((("texto", "normal", "{texto}"),), largura).renderizar({"texto": texto})
+
+
+# ================== SAÍDA ==================
+def escpos_raster(imagem):
+    """Comandos GS v 0 da imagem, em faixas de LINHAS_POR_FAIXA"""
+    largura_bytes = (imagem.width + 7) // 8
+    pontos = imagem.tobytes()   # Modo "1": 8 pontos por byte, bit mais alto à esquerda, linha a linha
+    comandos = bytearray()
+    for topo in range(0, imagem.height, LINHAS_POR_FAIXA):
+        altura = min(LINHAS_POR_FAIXA, imagem.height - topo)
+        comandos += b"\x1dv0\x00" + largura_bytes.to_bytes(2, "little") + altura.to_bytes(2, "little")
+        comandos += pontos[topo * largura_bytes:(topo + altura) * largura_bytes]
+    return bytes(comandos)
+
+
+def salvar_png(imagem, caminho):
+    """Pré-visualização: papel branco, ponto impresso preto"""
+    ImageOps.invert(imagem.convert("L")).convert("1").save(caminho, optimize=True)
+
+
+# ================== BENCHMARK ==================
+def _campos_exemplo(n):
+    return {
+        "data_hora": datetime.now().strftime("%d/%m/%Y %H:%M"),
+        "nome": f"Cliente de Teste Número {n}",
+        "telefone": f"(83) 9{n % 10000:04d}-{n % 7919:04d}",
+        "endereco": f"Rua Desembargador Souto Maior, {n % 2000}",
+        "bairro": ("Centro", "Manaíra", "Tambaú", "Bancários")[n % 4],
+        "referencia": "Em frente à padaria, portão azul" if n % 3 else "",
+        "entregador": ("Entregador A", "Entregador B")[n % 2],
+        "produtos": f"{n % 300},90",
+        "taxa": "5,00",
+        "total": f"{n % 300 + 5},90",
+        "pagamento": "PAGAMENTO: DINHEIRO\nDinheiro: R$ 100.00 | Troco: R$ 12.10" if n % 2 else "PAGAMENTO: PIX",
+    }
+
+
+def benchmark(quantidade, largura=LARGURA_PONTOS, png=None):
+    """Cupons por segundo: compilação, desenho e conversão para ESC/POS"""
+    inicio = time.perf_counter()
+    layout("cupom", largura)
+    compilacao = time.perf_counter() - inicio
+    tempos = {"desenho": 0.0, "escpos": 0.0}
+    tamanho = 0
+    for n in range(quantidade):
+        inicio = time.perf_counter()
+        imagem = renderizar("cupom", _campos_exemplo(n), largura)
+        meio = time.perf_counter()
+        tamanho += len(escpos_raster(imagem))
+        tempos["desenho"] += meio - inicio
+        tempos["escpos"] += time.perf_counter() - meio
+    total = tempos["desenho"] + tempos["escpos"]
+    print(f"Compilação do layout (fontes e linhas fixas): {compilacao * 1000:.1f} ms")
+    print(f"{quantidade} cupons de {largura} pontos: {quantidade / total:.0f} cupons/s "
+          f"({total / quantidade * 1000:.2f} ms cada: desenho {tempos['desenho'] / quantidade * 1000:.2f} ms, "
+          f"ESC/POS {tempos['escpos'] / quantidade * 1000:.2f} ms; {tamanho / quantidade / 1024:.1f} KB cada)")
+    for nome, cache in (("linhas", desenhar_linha), ("palavras", desenhar_palavra)):
+        info = cache.cache_info()
+        print(f"Cache de {nome}: {info.hits} acertos, {info.misses} desenhadas")
+    if png:
+        salvar_png(renderizar("cupom", _campos_exemplo(1), largura), png)
+        print(f"Exemplo salvo em {png}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do cupom em imagem (cupons por segundo)")
+    parser.add_argument("--quantidade", type=int, default=500)
+    parser.add_argument("--largura", type=int, default=LARGURA_PONTOS, help="pontos por linha (80 mm: 576, 58 mm: 384)")
+    parser.add_argument("--png", help="salva um cupom de exemplo neste arquivo")
+    args = parser.parse_args()
+    benchmark(args.quantidade, args.largura, args.png)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""Métricas de desempenho para o diagnóstico: latência das consultas, das ações
+da interface, tempo de ida e volta até o banco, WAL, cache e tamanho das tabelas.
+
+Serve para separar "rede lenta" de "banco inchado" quando a loja liga dizendo
+que o PDV está lento.
+"""
+import ctypes
+import math
+import os
+import sqlite3
+import statistics
+import sys
+import sysconfig
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+JANELA = 200              # Últimas N execuções guardadas por consulta
+ACOES_GUARDADAS = 500     # Últimas N ações da interface
+AMOSTRAS_RTT = 5
+
+SQLITE_DBSTATUS_CACHE_HIT = 7
+SQLITE_DBSTATUS_CACHE_MISS = 8
+
+
+# ================== LATÊNCIAS ==================
+def percentil(ordenados, p):
+    """Percentil por posição mais próxima (lista já ordenada)"""
+    if not ordenados:
+        return 0.0
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+class Latencias:
+    """Últimas JANELA durações (segundos) de cada consulta nomeada"""
+
+    def __init__(self, janela=JANELA):
+        self.janela = janela
+        self._dados = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nome, segundos):
+        with self._lock:
+            fila = self._dados.get(nome)
+            if fila is None:
+                fila = self._dados[nome] = deque(maxlen=self.janela)
+            fila.append(segundos)
+
+    def resumo(self):
+        """[(nome, qtd, p50, p95, p99)] do p95 mais alto para o mais baixo"""
+        with self._lock:
+            copias = {nome: sorted(fila) for nome, fila in self._dados.items()}
+        linhas = [(nome, len(v), percentil(v, 50), percentil(v, 95), percentil(v, 99)) for nome, v in copias.items()]
+        return sorted(linhas, key=lambda linha: linha[3], reverse=True)
+
+
+class AcoesInterface:
+    """Últimas ações da interface (do clique até a tela atualizada)"""
+
+    def __init__(self, guardadas=ACOES_GUARDADAS):
+        self._acoes = deque(maxlen=guardadas)
+        self._lock = threading.Lock()
+
+    def registrar(self, nome, segundos):
+        with self._lock:
+            self._acoes.append((segundos, nome, datetime.now()))
+
+    def mais_lentas(self, qtd=10):
+        with self._lock:
+            return sorted(self._acoes, key=lambda acao: acao[0], reverse=True)[:qtd]
+
+
+class ContencaoEscrita:
+    """Disputa pelo lock de escrita entre terminais, por operação (transacao() de banco.py)"""
+
+    def __init__(self, janela=JANELA):
+        self.janela = janela
+        self._dados = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, operacao, espera, tentativas, duracao=None):
+        """`espera` até o BEGIN IMMEDIATE passar, `tentativas` extras e `duracao` com o lock (None: desistiu)"""
+        with self._lock:
+            dados = self._dados.get(operacao)
+            if dados is None:
+                dados = self._dados[operacao] = {"transacoes": 0, "disputadas": 0, "tentativas": 0, "desistencias": 0,
+                                                 "esperas": deque(maxlen=self.janela),
+                                                 "duracoes": deque(maxlen=self.janela)}
+            dados["transacoes"] += 1
+            dados["tentativas"] += tentativas
+            if tentativas:
+                dados["disputadas"] += 1
+            dados["esperas"].append(espera)
+            if duracao is None:
+                dados["desistencias"] += 1
+            else:
+                dados["duracoes"].append(duracao)
+
+    def resumo(self):
+        """[(operacao, transacoes, disputadas, tentativas, desistencias, espera p95, espera máx, duração p95)]
+        da maior espera para a menor"""
+        with self._lock:
+            copias = [(operacao, dict(dados, esperas=sorted(dados["esperas"]), duracoes=sorted(dados["duracoes"])))
+                      for operacao, dados in self._dados.items()]
+        linhas = [(operacao, d["transacoes"], d["disputadas"], d["tentativas"], d["desistencias"],
+                   percentil(d["esperas"], 95), d["esperas"][-1] if d["esperas"] else 0.0, percentil(d["duracoes"], 95))
+                  for operacao, d in copias]
+        return sorted(linhas, key=lambda linha: linha[6], reverse=True)
+
+
+CONSULTAS = Latencias()
+ACOES = AcoesInterface()
+CONTENCAO = ContencaoEscrita()
+
+
+# ================== BANCO E REDE ==================
+def medir_rtt(db_path, amostras=AMOSTRAS_RTT):
+    """Abre o arquivo e lê o cabeçalho: no compartilhamento, uma ida e volta ao servidor.
+
+    Retorna (mínimo, mediana) em segundos.
+    """
+    tempos = []
+    for _ in range(amostras):
+        inicio = time.perf_counter()
+        with open(db_path, "rb") as f:
+            f.read(100)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), statistics.median(tempos)
+
+
+def estado_wal(conn, db_path):
+    """(bytes do -wal, páginas no log, páginas que o checkpoint não conseguiu transferir)
+
+    Usa um checkpoint PASSIVE, que não espera ninguém: o que sobra é o atraso
+    causado por leitores ainda presos em versões antigas.
+    """
+    wal = db_path + "-wal"
+    tamanho = os.path.getsize(wal) if os.path.exists(wal) else 0
+    _, paginas_log, transferidas = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    return tamanho, max(paginas_log, 0), max(paginas_log - transferidas, 0)
+
+
+def tamanho_tabelas(conn):
+    """[(tabela ou índice, bytes)] pelo dbstat; None se o SQLite não tiver dbstat"""
+    try:
+        linhas = conn.execute("SELECT name, pgsize FROM dbstat WHERE aggregate = TRUE").fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return sorted(linhas, key=lambda linha: linha[1], reverse=True)
+
+
+# ---------- Acerto do cache de páginas (sqlite3_db_status via ctypes) ----------
+_biblioteca = None
+# O sqlite3* é lido da memória do objeto Connection: só nas versões do CPython
+# em que o campo `db` vem logo após o cabeçalho (3.8 a 3.13, com GIL). Fora
+# delas o diagnóstico mostra "indisponível" em vez de arriscar ler lixo.
+LAYOUT_CONEXAO_CONHECIDO = (sys.implementation.name == "cpython" and (3, 8) <= sys.version_info[:2] <= (3, 13)
+                            and not sysconfig.get_config_var("Py_GIL_DISABLED"))
+
+
+def _sqlite_nativo():
+    """A mesma biblioteca SQLite usada pelo módulo sqlite3 (ou None)"""
+    global _biblioteca
+    if not LAYOUT_CONEXAO_CONHECIDO:
+        return None
+    if _biblioteca is None:
+        import _sqlite3
+        _biblioteca = False
+        # Linux: os símbolos vêm pelo próprio _sqlite3; Windows: sqlite3.dll já carregada
+        for nome in (_sqlite3.__file__, os.path.join(os.path.dirname(_sqlite3.__file__), "sqlite3.dll"), "sqlite3.dll"):
+            try:
+                lib = ctypes.CDLL(nome)
+                funcao = lib.sqlite3_db_status
+            except (OSError, AttributeError):
+                continue
+            funcao.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.POINTER(ctypes.c_int),
+                               ctypes.POINTER(ctypes.c_int), ctypes.c_int]
+            lib.sqlite3_db_filename.restype = ctypes.c_char_p
+            lib.sqlite3_db_filename.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+            _biblioteca = lib
+            break
+    return _biblioteca or None
+
+
+def _ponteiro_sqlite(conn, lib, db_path):
+    """sqlite3* da conexão (primeiro campo do objeto, logo após o cabeçalho Python)"""
+    ponteiro = ctypes.c_void_p.from_address(id(conn) + object.__basicsize__).value
+    # Confere pelo nome do arquivo antes de confiar no ponteiro
+    nome = lib.sqlite3_db_filename(ponteiro, b"main") if ponteiro else None
+    if not nome:
+        return None
+    mesmo = os.path.normcase(os.path.realpath(os.fsdecode(nome))) == os.path.normcase(os.path.realpath(db_path))
+    return ponteiro if mesmo else None
+
+
+def acertos_cache(conexoes, db_path):
+    """(acertos, faltas) do cache de páginas somados nas conexões; None se indisponível.
+
+    Lê conexões de outras threads: chamar com o lock do gerenciador, para
+    nenhuma ser fechada no meio (GerenciadorConexoes.com_conexoes).
+    """
+    lib = _sqlite_nativo()
+    if lib is None:
+        return None
+    acertos = faltas = 0
+    for conn in conexoes:
+        ponteiro = _ponteiro_sqlite(conn, lib, db_path)
+        if ponteiro is None:
+            return None
+        atual, maximo = ctypes.c_int(), ctypes.c_int()
+        lib.sqlite3_db_status(ponteiro, SQLITE_DBSTATUS_CACHE_HIT, ctypes.byref(atual), ctypes.byref(maximo), 0)
+        acertos += atual.value
+        lib.sqlite3_db_status(ponteiro, SQLITE_DBSTATUS_CACHE_MISS, ctypes.byref(atual), ctypes.byref(maximo), 0)
+        faltas += atual.value
+    return acertos, faltas
@@ -0,0 +1,132 @@
+"""Executor das operações de banco fora da thread da interface (Tk)."""
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from desempenho import ACOES, CONSULTAS
+
+
+class ExecutorBanco:
+    """Roda funções de banco em threads de trabalho e devolve o resultado ao Tk.
+
+    enviar() retorna um Future; ao_concluir/ao_falhar rodam sempre na thread
+    da interface (os resultados prontos são recolhidos com `after`). Com
+    `chave`, um envio novo torna o anterior da mesma chave obsoleto: se ainda
+    não começou é cancelado, se já está rodando o resultado é descartado.
+    Envios `silenciosos` (manutenção) não acendem o indicador de ocupado.
+    Cada envio é medido pela `descricao`: tempo na thread de banco (CONSULTAS)
+    e do envio até o retorno terminar de atualizar a tela (ACOES).
+    Deve ser chamado só da thread da interface.
+    """
+
+    INTERVALO_MS = 20          # Intervalo para recolher resultados prontos
+    ATRASO_OCUPADO = 0.15      # Segundos até mostrar o indicador (evita piscar)
+
+    def __init__(self, raiz, trabalhadores=2, ao_mudar_ocupado=None):
+        self.raiz = raiz
+        self.ao_mudar_ocupado = ao_mudar_ocupado
+        self._pool = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="banco")
+        self._prontos = queue.Queue()
+        self._atuais = {}          # chave -> Future mais recente
+        self._em_andamento = {}    # Future -> (inicio, descricao, silenciosa)
+        self._agendado = False
+        self._ocupado = False
+
+    # ---------- Envio ----------
+    def enviar(self, funcao, *args, ao_concluir=None, ao_falhar=None, chave=None, descricao=None,
+               silenciosa=False):
+        if chave is not None:
+            self.cancelar(chave)
+        descricao = descricao or getattr(funcao, "__name__", "banco")
+        futuro = self._pool.submit(self._medir, descricao, funcao, *args)
+        if chave is not None:
+            self._atuais[chave] = futuro
+        self._em_andamento[futuro] = (time.monotonic(), descricao, silenciosa)
+        futuro.add_done_callback(lambda f: self._prontos.put((f, chave, ao_concluir, ao_falhar)))
+        self._agendar()
+        return futuro
+
+    @staticmethod
+    def _medir(descricao, funcao, *args):
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args)
+        finally:
+            CONSULTAS.registrar(descricao, time.perf_counter() - inicio)
+
+    def cancelar(self, chave):
+        """Torna obsoleto o pedido pendente da chave (o retorno não será chamado)"""
+        futuro = self._atuais.pop(chave, None)
+        if futuro is not None:
+            futuro.cancel()
+
+    def gravacoes_pendentes(self):
+        """Envios sem `chave` ainda não terminados: podem ser gravações (as leituras vão com chave)"""
+        atuais = set(self._atuais.values())
+        return [futuro for futuro in self._em_andamento if futuro not in atuais and not futuro.done()]
+
+    def aguardar_gravacoes(self, timeout):
+        """Cancela as leituras e espera (até `timeout` segundos) o resto; retorna quantos não terminaram"""
+        for chave in list(self._atuais):
+            self.cancelar(chave)
+        pendentes = self.gravacoes_pendentes()
+        if pendentes:
+            wait(pendentes, timeout=timeout)
+        return len(self.gravacoes_pendentes())
+
+    def encerrar(self):
+        """Descarta o que ainda não começou: chamar depois de aguardar_gravacoes"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- Retorno na thread da interface ----------
+    def _agendar(self):
+        if not self._agendado:
+            self._agendado = True
+            self.raiz.after(self.INTERVALO_MS, self._processar)
+
+    def _processar(self):
+        self._agendado = False
+        while True:
+            try:
+                futuro, chave, ao_concluir, ao_falhar = self._prontos.get_nowait()
+            except queue.Empty:
+                break
+            enviado, descricao, silenciosa = self._em_andamento.pop(futuro, (None, "banco", True))
+            if futuro.cancelled():
+                continue
+            if chave is not None:
+                if self._atuais.get(chave) is not futuro:
+                    continue   # Obsoleto: já existe um pedido mais novo
+                del self._atuais[chave]
+            erro = futuro.exception()
+            try:
+                if erro is not None:
+                    if ao_falhar:
+                        ao_falhar(erro)
+                    else:
+                        print(f"[ERRO] {descricao}: {erro}")
+                elif ao_concluir:
+                    ao_concluir(futuro.result())
+            except Exception as e:
+                # Ex.: janela fechada antes do resultado chegar
+                print(f"[EXECUTOR] Falha no retorno de {descricao}: {type(e).__name__}: {e}")
+            if not silenciosa:
+                ACOES.registrar(descricao, time.monotonic() - enviado)
+        self._atualizar_ocupado()
+        if self._em_andamento:
+            self._agendar()
+
+    # ---------- Indicador de ocupado ----------
+    @property
+    def pendentes(self):
+        return len(self._em_andamento)
+
+    def _atualizar_ocupado(self):
+        agora = time.monotonic()
+        lentas = [descricao for inicio, descricao, silenciosa in self._em_andamento.values()
+                  if not silenciosa and agora - inicio >= self.ATRASO_OCUPADO]
+        ocupado = bool(lentas)
+        if ocupado != self._ocupado:
+            self._ocupado = ocupado
+            if self.ao_mudar_ocupado:
+                self.ao_mudar_ocupado(ocupado)
@@ -1,35 +1,65 @@
+import time
+import instrumentacao
+# Primeira coisa do programa: o relatório da abertura conta também os imports
+ABERTURA = instrumentacao.TemposAbertura(
+    finais=("janela visível", "painel do dia", "avisos de recompra", "índice de telefones"))
+
 import customtkinter as ctk
+import importlib.util
 import sqlite3
 from tkinter import messagebox, filedialog
 from datetime import datetime, timedelta
 import os
 import sys
-import textwrap
-import csv 
 import webbrowser 
 import urllib.parse 
-import shutil
-import unicodedata
-
-# Bibliotecas de impressão do Windows
-try:
-    import win32print
-    import win32ui 
-    import win32con
-    import ctypes
-    WINDOWS_PRINT_AVAILABLE = True
-except ImportError:
-    WINDOWS_PRINT_AVAILABLE = False
+import threading
+from backup import TarefaBackup, backup_agendado, backup_do_dia_existe, fazer_backup, nome_backup
+from banco import (LIMITE_BUSCA, GerenciadorConexoes, aplicar_pragmas, data_do_dia, dia_de, erro_de_lock,
+                   formatar_centavos, gravar_da_fila, migrar, modo_do_caminho, texto_para_centavos)
+from desempenho import ACOES, CONSULTAS, CONTENCAO, JANELA, acertos_cache, estado_wal, medir_rtt, tamanho_tabelas
+from executor_banco import ExecutorBanco
+from fila_gravacao import FilaGravacao
+from impressao import FilaImpressao, criar_impressora
+from importacao_clientes import exportar_clientes, gravar_erros_csv, importar_clientes
+from indice_telefones import IndiceTelefones
+from janelas import Janelas, MonitorWidgets
+from lista_virtual import TAMANHO_PAGINA, ListaVirtual
+from manutencao import TAREFAS, Manutencao
+from replica import ReplicaLocal
+from servidor_banco import ConexoesServidor, eh_endereco_servidor
+from servico_pedidos import (DDD_PADRAO, DadosInvalidos, ServicoPedidos, campos_cupom, campos_etiqueta,
+                             cliente_de, formatar_telefone, lembrete_de, limpar_telefone, montar_pedido,
+                             texto_cupom, texto_etiqueta, texto_para_reais, validar_cliente)
+
+# Bibliotecas de impressão do Windows: só confere se existem; win32ui (MFC) é
+# importado na primeira impressão, não na abertura
+WINDOWS_PRINT_AVAILABLE = importlib.util.find_spec("win32ui") is not None
+if not WINDOWS_PRINT_AVAILABLE:
     print("AVISO: Bibliotecas de impressão Windows não disponíveis")
+ABERTURA.seguinte("imports")
 
 # -------------- CONFIGURAÇÕES --------------
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
-DDD_PADRAO = "83" 
-LARGURA_PAPEL = 42 
+INTERVALO_SYNC_INDICE = 20000   # ms entre atualizações do índice de telefones
+INTERVALO_MONITOR_FILA = 1000   # ms entre verificações da fila de gravação
+HORARIO_BACKUP = "22:00"        # Backup automático no fechamento (None desliga)
+INTERVALO_AGENDA_BACKUP = 60000 # ms entre verificações do horário de backup
+INTERVALO_MANUTENCAO = 30000    # ms entre verificações de janela ociosa
+OCIOSO_MANUTENCAO = 60          # Segundos sem teclado/mouse para rodar manutenção
+ORCAMENTO_MANUTENCAO = 2.0      # Segundos de manutenção por janela ociosa
+ESPERA_GRAVACOES_FECHAR = 10    # Segundos esperando gravações em andamento ao fechar
+LIMITE_CONSULTA_LENTA_MS = 200  # Comandos SQL acima disso vão para o log com o SQL
+ATRASO_BUSCA = 300              # ms sem digitar antes de buscar clientes
+DEBUG_WIDGETS = "--debug-widgets" in sys.argv  # Conta widgets e janelas vivos (vazamentos)
+INTERVALO_DEBUG_WIDGETS = 60000 # ms entre contagens do --debug-widgets
+MENSAGEM_BANCO_OCUPADO = ("Outro terminal está gravando no banco há mais tempo que o normal.\n"
+                          "Nada foi gravado: tente de novo em alguns segundos.")
 
 def configurar_identidade_windows():
     try:
+        import ctypes
         myappid = 'totalpharma.delivery.pdv.v10' 
         ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
     except: 
@@ -38,126 +68,147 @@ def configurar_identidade_windows():
 if WINDOWS_PRINT_AVAILABLE:
     configurar_identidade_windows()
 
-def get_app_path():
-    """Retorna o caminho do banco - verifica se há config de rede"""
-    # Verifica se existe arquivo de configuração apontando para rede
+def ler_config(nome_arquivo):
+    """Conteúdo de um arquivo de configuração ao lado do programa, ou None"""
     try:
         if getattr(sys, 'frozen', False):
             app_dir = os.path.dirname(sys.executable)
         else:
             app_dir = os.path.dirname(os.path.abspath(__file__))
         
-        config_file = os.path.join(app_dir, "config_rede.txt")
+        config_file = os.path.join(app_dir, nome_arquivo)
         
         if os.path.exists(config_file):
             with open(config_file, 'r', encoding='utf-8') as f:
-                caminho_rede = f.read().strip()
-                if caminho_rede and os.path.exists(caminho_rede):
-                    print(f"[REDE] Usando banco em: {caminho_rede}")
-                    return caminho_rede
-                else:
-                    print(f"[AVISO] Caminho de rede não acessível: {caminho_rede}")
+                return f.read().strip() or None
     except Exception as e:
-        print(f"[ERRO] Ao ler config de rede: {e}")
-    
-    # Fallback: usa pasta local
-    app_data = os.getenv('APPDATA')
+        print(f"[ERRO] Ao ler {nome_arquivo}: {e}")
+    return None
+
+def ler_config_rede():
+    """Caminho (ou tcp://host:porta do servidor_banco) configurado em config_rede.txt, ou None"""
+    return ler_config("config_rede.txt")
+
+def ler_config_impressora():
+    """Impressora deste terminal (config_impressora.txt); sem arquivo, GDI na padrão do Windows"""
+    return ler_config("config_impressora.txt") or ("gdi" if WINDOWS_PRINT_AVAILABLE else "nula")
+
+def get_app_path():
+    """Pasta do banco: a da config de rede ou, sem ela, a pasta local (não acessa a rede)"""
+    return CAMINHO_REDE or get_pasta_local()
+
+def verificar_caminho():
+    """True se a pasta (ou o servidor) do banco responde; no compartilhamento fora do ar, pode levar segundos"""
+    if BANCO.modo == "servidor":
+        try:
+            BANCO.conexao()
+        except sqlite3.Error as e:
+            print(f"[OFFLINE] Servidor do banco não responde: {e}")
+            return False
+        print(f"[SERVIDOR] Usando o servidor do banco em {CAMINHO_REDE}")
+        return True
+    if CAMINHO_REDE:
+        if os.path.exists(CAMINHO_REDE):
+            print(f"[REDE] Usando banco em: {CAMINHO_REDE}")
+            return True
+        # Não cai para um banco local vazio: o terminal segue com a
+        # réplica local e a fila até o compartilhamento voltar
+        print(f"[OFFLINE] Caminho de rede não acessível: {CAMINHO_REDE}")
+        return False
+    print(f"[LOCAL] Usando banco em: {get_pasta_local()}")
+    return True
+
+def get_pasta_local():
+    """Pasta da aplicação nesta máquina (%APPDATA%\\TotalPharma), mesmo com banco em rede"""
+    app_data = os.getenv('APPDATA') or os.path.expanduser("~")
     pasta_app = os.path.join(app_data, "TotalPharma")
     if not os.path.exists(pasta_app):
         try: 
             os.makedirs(pasta_app)
         except: 
             pass
-    print(f"[LOCAL] Usando banco em: {pasta_app}")
     return pasta_app
 
-def init_db():
+def init_db(db_path):
+    """Migra o banco principal; retorna se o schema ficou em dia"""
     try:
-        pasta_app = get_app_path()
-        db_path = os.path.join(pasta_app, "dados_farmacia.db")
-        
         # Conexão com timeout maior para suportar rede
         conn = sqlite3.connect(db_path, timeout=30)
-        cursor = conn.cursor()
-        
-        # Habilita WAL mode para melhor performance em rede
-        cursor.execute("PRAGMA journal_mode=WAL")
-        cursor.execute("PRAGMA synchronous=NORMAL")
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS clientes (
-                telefone TEXT PRIMARY KEY,
-                nome TEXT,
-                rua TEXT,
-                numero TEXT,
-                bairro TEXT,
-                referencia TEXT
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS historico_enderecos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telefone_cliente TEXT,
-                rua TEXT,
-                numero TEXT,
-                bairro TEXT,
-                referencia TEXT,
-                ultimo_uso DATE,
-                FOREIGN KEY(telefone_cliente) REFERENCES clientes(telefone)
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS pedidos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data TEXT,
-                cliente_tel TEXT,
-                entregador TEXT,
-                valor_total REAL,
-                metodo_pagamento TEXT, 
-                detalhes_pagamento TEXT,
-                FOREIGN KEY(cliente_tel) REFERENCES clientes(telefone)
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS lembretes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cliente_tel TEXT,
-                medicamento TEXT,
-                data_aviso TEXT,
-                status TEXT,
-                FOREIGN KEY(cliente_tel) REFERENCES clientes(telefone)
-            )
-        """)
+        aplicar_pragmas(conn, modo_do_caminho(db_path))
         
-        # Migrações de colunas
-        cols_cli = ["rua", "numero", "bairro", "referencia"]
-        for c in cols_cli:
-            try: 
-                cursor.execute(f"ALTER TABLE clientes ADD COLUMN {c} TEXT")
-            except: 
-                pass
-            
-        try: 
-            cursor.execute("ALTER TABLE pedidos ADD COLUMN metodo_pagamento TEXT")
-        except: 
-            pass
-        
-        try: 
-            cursor.execute("ALTER TABLE pedidos ADD COLUMN detalhes_pagamento TEXT")
-        except: 
-            pass
-
-        conn.commit()
+        # Schema versionado: com o banco em dia, só lê o PRAGMA user_version
+        migrar(conn)
         conn.close()
-        return db_path
+        return True
     except Exception as e:
         print(f"[ERRO] Inicialização do banco: {e}")
-        return "dados_farmacia.db"
-
-DB_PATH = init_db()
+        return False
+
+def preparar_banco():
+    """Abertura em segundo plano (thread de banco): pasta do banco, schema e réplica local.
+
+    Roda enquanto a janela já aparece; o App segura os pedidos ao banco até
+    isto terminar. Não levanta: sem servidor, segue com a réplica e a fila.
+    """
+    global SCHEMA_EM_DIA, REPLICA
+    with ABERTURA.etapa("pasta do banco"):
+        acessivel = verificar_caminho()
+    if BANCO.modo == "servidor":
+        # O servidor migra o schema ao subir; fora do ar, gravar_lote_pedidos confere antes de gravar
+        SCHEMA_EM_DIA = acessivel
+    else:
+        with ABERTURA.etapa("schema (migrações)"):
+            SCHEMA_EM_DIA = init_db(DB_PATH)
+    # Com banco em rede, o cadastro é lido de uma réplica nesta máquina
+    if BANCO.modo in ("rede", "servidor"):
+        with ABERTURA.etapa("réplica local"):
+            try:
+                REPLICA = ReplicaLocal(os.path.join(get_pasta_local(), "replica_farmacia.db"), BANCO, FILA_PEDIDOS)
+                SERVICO.replica = REPLICA
+            except Exception as e:
+                print(f"[ERRO] Réplica local indisponível: {e}")
+
+# Eventos de desempenho (e os print() do executável sem console) em logs/eventos.jsonl
+instrumentacao.configurar(os.path.join(get_pasta_local(), "logs"), LIMITE_CONSULTA_LENTA_MS)
+
+# Só o caminho (config_rede.txt é local): a rede e o schema ficam para preparar_banco
+CAMINHO_REDE = ler_config_rede()
+SCHEMA_EM_DIA = False
+if eh_endereco_servidor(CAMINHO_REDE):
+    # Banco atendido pelo servidor_banco.py: nada de arquivo aberto pela rede
+    DB_PATH = CAMINHO_REDE
+    BANCO = ConexoesServidor(CAMINHO_REDE)
+else:
+    DB_PATH = os.path.join(get_app_path(), "dados_farmacia.db")
+    BANCO = GerenciadorConexoes(DB_PATH, modo="rede" if CAMINHO_REDE else None)
+INDICE_TELEFONES = IndiceTelefones()
+
+def gravar_lote_pedidos(lote):
+    """Descarrega um lote da fila (pedidos, cadastros, endereços, lembretes...) numa única transação"""
+    global SCHEMA_EM_DIA
+    if not SCHEMA_EM_DIA:
+        # Aberto com o servidor fora do ar: migra antes da primeira gravação
+        migrar(BANCO.conexao())
+        SCHEMA_EM_DIA = True
+    with BANCO.transacao("fila_pedidos") as cursor:
+        for _, dados in lote:
+            gravar_da_fila(cursor, dados)
+
+PASTA_BACKUPS = os.path.join(get_pasta_local(), "backups")
+
+MANUTENCAO = Manutencao(BANCO, DB_PATH)
+
+FILA_PEDIDOS = FilaGravacao(os.path.join(get_pasta_local(), "fila_pedidos.jsonl"), gravar_lote_pedidos)
+
+REPLICA = None   # Criada por preparar_banco (banco em rede)
+
+# Cupons e etiquetas saem por um thread próprio; o que falhar fica para reimprimir
+IMPRESSAO = FilaImpressao(os.path.join(get_pasta_local(), "fila_impressao.jsonl"),
+                          criar_impressora(ler_config_impressora(), os.path.join(get_pasta_local(), "impressoes")))
+
+# Regras de clientes, pedidos e lembretes (sem interface); o App só lê a tela e chama
+SERVICO = ServicoPedidos(BANCO, FILA_PEDIDOS, REPLICA)
+ABERTURA.seguinte("configuração (logs, fila, serviço)")
 
 class App(ctk.CTk):
     def __init__(self):
@@ -165,34 +216,192 @@ class App(ctk.CTk):
         self.title("TotalPharma - PDV Profissional V10")
         self.geometry("1000x920")
         
-        # Ícone
-        try:
-            if getattr(sys, 'frozen', False):
-                app_path = os.path.dirname(sys.executable)
-            else:
-                app_path = os.path.dirname(os.path.abspath(__file__))
-            caminho_icone = os.path.join(app_path, "farmacia.ico")
-            if os.path.exists(caminho_icone):
-                self.iconbitmap(caminho_icone)
-                self.wm_iconbitmap(caminho_icone)
-        except: 
-            pass 
+        # Todo acesso ao banco sai da thread da interface por aqui. A abertura
+        # do banco (rede, schema, réplica) corre enquanto a tela é montada; até
+        # ela terminar, no_banco guarda os pedidos em _aguardando_banco
+        self.executor = ExecutorBanco(self, ao_mudar_ocupado=self.mostrar_ocupado)
+        self._aguardando_banco = []
+        self.executor.enviar(preparar_banco, ao_concluir=self.banco_pronto, ao_falhar=self.banco_pronto,
+                             descricao="Preparar banco", silenciosa=True)
+        self._visivel = False
+        self.bind("<Map>", self.janela_visivel, add="+")
         
         self.grid_columnconfigure(0, weight=1)
         self.grid_columnconfigure(1, weight=1)
         self.grid_rowconfigure(0, weight=1)
+        
+        self._ultimo_tel_buscado = None
+        self.total_centavos = 0
+        self._fila_gravados = 0
+        self._offline = False
+        # Telas de consulta: montadas na primeira abertura, depois só escondidas/mostradas
+        self.janelas = Janelas(self)
 
         self.criar_coluna_cliente()
         self.criar_coluna_pagamento()
         
         self.limpar_tela()
         self.verificar_conexao_rede()
-        self.after(1000, self.verificar_avisos_hoje_silencioso)
+        # Primeiras consultas: saem assim que o banco estiver pronto
+        self.verificar_avisos_hoje_silencioso()
         self.atualizar_painel_status()
+        self.protocol("WM_DELETE_WINDOW", self.ao_fechar)
+        self.after(INTERVALO_SYNC_INDICE, self.sincronizar_indice_telefones)
+        self.after(INTERVALO_MONITOR_FILA, self.monitorar_fila)
+        IMPRESSAO.iniciar()
+        self._backup_agendado_tentado = None
+        self.after(INTERVALO_AGENDA_BACKUP, self.verificar_backup_agendado)
+        self._ultima_atividade = time.monotonic()
+        self.bind_all("<Key>", self.registrar_atividade, add="+")
+        self.bind_all("<Button>", self.registrar_atividade, add="+")
+        self.after(INTERVALO_MANUTENCAO, self.verificar_manutencao)
+        if DEBUG_WIDGETS:
+            self.monitor_widgets = MonitorWidgets(self, INTERVALO_DEBUG_WIDGETS, self.janelas)
+            self.monitor_widgets.iniciar()
+        ABERTURA.seguinte("janela principal (widgets)")
+
+    # ================== ABERTURA EM ETAPAS ==================
+    def janela_visivel(self, event):
+        if event.widget is not self or self._visivel:
+            return
+        self._visivel = True
+        ABERTURA.marco("janela visível")
+        self.after_idle(self.carregar_icone)
+
+    def carregar_icone(self):
+        with ABERTURA.etapa("ícone"):
+            try:
+                if getattr(sys, 'frozen', False):
+                    app_path = os.path.dirname(sys.executable)
+                else:
+                    app_path = os.path.dirname(os.path.abspath(__file__))
+                caminho_icone = os.path.join(app_path, "farmacia.ico")
+                if os.path.exists(caminho_icone):
+                    self.iconbitmap(caminho_icone)
+                    self.wm_iconbitmap(caminho_icone)
+            except: 
+                pass 
+
+    def banco_pronto(self, _):
+        """Fim de preparar_banco: inicia fila, réplica e índice e envia o que esperava o banco"""
+        ABERTURA.marco("banco pronto")
+        FILA_PEDIDOS.iniciar()
+        if REPLICA:
+            REPLICA.iniciar()
+        pendentes, self._aguardando_banco = self._aguardando_banco, None
+        self.no_banco(lambda: INDICE_TELEFONES.carregar(SERVICO.leitura().conexao()),
+                      ao_concluir=self.indice_carregado, ao_falhar=self.indice_carregado,
+                      descricao="Carregar índice de telefones")
+        for funcao, args, opcoes in pendentes:
+            self.executor.enviar(funcao, *args, **opcoes)
+
+    def indice_carregado(self, _):
+        print(f"[INDICE] {len(INDICE_TELEFONES)} telefones carregados")
+        ABERTURA.marco("índice de telefones")
+
+    def ao_fechar(self):
+        """Descarrega a fila e fecha as conexões persistentes antes de encerrar"""
+        # Leituras são descartadas; gravações em andamento ganham alguns segundos
+        self.configure(cursor="watch")
+        self.update_idletasks()
+        restantes = self.executor.aguardar_gravacoes(ESPERA_GRAVACOES_FECHAR)
+        self.configure(cursor="")
+        if self._aguardando_banco:
+            # Banco nem ficou pronto: o que esperava por ele não rodou
+            restantes += sum(1 for _, _, opcoes in self._aguardando_banco if opcoes["chave"] is None)
+        if restantes and not messagebox.askyesno(
+                "Gravações pendentes",
+                f"{restantes} operação(ões) de banco (cadastro, endereço, lembrete...) ainda não terminaram.\n"
+                "O banco pode estar lento ou fora do ar.\n\n"
+                "Fechar mesmo assim? Elas serão perdidas e precisarão ser refeitas."):
+            return
+        self.executor.encerrar()
+        IMPRESSAO.parar(timeout=3)
+        FILA_PEDIDOS.parar(timeout=5)
+        if BANCO.modo != "servidor":   # Com servidor, o optimize roda nele
+            try:
+                MANUTENCAO.ao_encerrar()
+            except sqlite3.Error as e:
+                print(f"[MANUTENCAO] optimize não executado: {e}")
+        if REPLICA:
+            REPLICA.parar()
+            REPLICA.fechar_todas()
+        BANCO.fechar_todas()
+        instrumentacao.encerrar()
+        self.destroy()
+
+    def no_banco(self, funcao, *args, ao_concluir=None, ao_falhar=None, chave=None, descricao=None,
+                 silenciosa=False):
+        """Roda `funcao` numa thread de banco; os retornos voltam para a thread da interface"""
+        opcoes = dict(ao_concluir=ao_concluir, ao_falhar=ao_falhar, chave=chave, descricao=descricao,
+                      silenciosa=silenciosa)
+        if self._aguardando_banco is not None:
+            # Banco ainda em preparação (abertura): vai na ordem assim que ficar pronto
+            self._aguardando_banco.append((funcao, args, opcoes))
+            return None
+        return self.executor.enviar(funcao, *args, **opcoes)
+
+    def mostrar_ocupado(self, ocupado):
+        """Indicador de consulta em andamento (só aparece se demorar)"""
+        if ocupado:
+            self.lbl_ocupado.configure(text="⏳ Consultando o banco...")
+            self.lbl_ocupado.pack(pady=(0, 5), before=self.lbl_status_total)
+            self.configure(cursor="watch")
+        else:
+            self.lbl_ocupado.pack_forget()
+            self.configure(cursor="")
+
+    # ================== FILA DE GRAVAÇÃO ==================
+    def monitorar_fila(self):
+        """Mostra os pedidos ainda não gravados e atualiza o painel quando a fila anda"""
+        self.atualizar_indicador_fila()
+        self.atualizar_indicador_impressao()
+        if FILA_PEDIDOS.gravados != self._fila_gravados:
+            self._fila_gravados = FILA_PEDIDOS.gravados
+            self.atualizar_painel_status()
+        offline = bool(REPLICA and (REPLICA.ultimo_erro or FILA_PEDIDOS.ultimo_erro))
+        if offline != self._offline:
+            self._offline = offline
+            self.verificar_conexao_rede()
+            if not offline:
+                self.atualizar_painel_status()
+        self.after(INTERVALO_MONITOR_FILA, self.monitorar_fila)
+
+    def atualizar_indicador_fila(self):
+        qtd = FILA_PEDIDOS.quantidade_pendente()
+        if qtd == 0:
+            self.lbl_fila.configure(text="")
+            self.lbl_fila.pack_forget()
+            return
+        texto = f"⏳ {qtd} registro(s) aguardando gravação no banco"
+        if FILA_PEDIDOS.ultimo_erro:
+            texto += "\n⚠️ Banco indisponível, tentando novamente..."
+        self.lbl_fila.configure(text=texto)
+        self.lbl_fila.pack(pady=(0, 10))
+
+    def atualizar_indicador_impressao(self):
+        """Impressora travada ou impressões com falha: botão para a tela de reimpressão"""
+        travada = IMPRESSAO.travada()
+        falhas = IMPRESSAO.quantidade_falhas()
+        if travada is not None:
+            texto = f"🖨️ Impressora sem resposta há {travada:.0f}s ({IMPRESSAO.quantidade_pendente()} na fila)"
+        elif falhas:
+            texto = f"🖨️ {falhas} impressão(ões) com falha - ver"
+        else:
+            self.btn_falhas_impressao.pack_forget()
+            return
+        self.btn_falhas_impressao.configure(text=texto)
+        self.btn_falhas_impressao.pack(fill="x", padx=10, pady=(0, 10))
 
     def verificar_conexao_rede(self):
         """Atualiza o título indicando se está em rede ou local"""
-        if "\\\\" in DB_PATH or DB_PATH.startswith("//"):
+        if BANCO.modo in ("rede", "servidor") and self._offline:
+            self.title("TotalPharma - PDV V10 [⚠️ SEM REDE - usando cópia local]")
+            self.modo_rede = True
+        elif BANCO.modo == "servidor":
+            self.title("TotalPharma - PDV V10 [🖧 SERVIDOR]")
+            self.modo_rede = True
+        elif BANCO.modo == "rede":
             self.title("TotalPharma - PDV V10 [🌐 REDE]")
             self.modo_rede = True
         else:
@@ -212,12 +421,22 @@ class App(ctk.CTk):
         
         self.entry_tel = ctk.CTkEntry(frame_tel, placeholder_text="Somente números")
         self.entry_tel.pack(side="left", fill="x", expand=True, padx=(0, 5))
-        self.entry_tel.bind("<FocusOut>", self.buscar_cliente) 
+        self.entry_tel.bind("<FocusOut>", self.ao_sair_telefone) 
         self.entry_tel.bind("<Return>", self.buscar_cliente)
+        self.entry_tel.bind("<KeyRelease>", self.sugerir_telefones)
+        self.entry_tel.bind("<Escape>", lambda e: self.esconder_sugestoes())
         
         btn_lupa = ctk.CTkButton(frame_tel, text="🔍", width=40, command=self.buscar_cliente, fg_color="#333", text_color="white")
         btn_lupa.pack(side="right")
 
+        # Sugestões de clientes enquanto digita (índice em memória, sem banco)
+        self.frame_sugestoes = ctk.CTkFrame(frame_cli, fg_color="#2C3E50", border_width=1, border_color="#3B8ED0")
+        self.botoes_sugestao = []
+        for _ in range(6):
+            btn = ctk.CTkButton(self.frame_sugestoes, text="", anchor="w", height=24, fg_color="transparent",
+                                hover_color="#34495E", text_color="white", font=("Arial", 12))
+            self.botoes_sugestao.append(btn)
+
         ctk.CTkLabel(frame_cli, text="Nome do Cliente:").pack(anchor="w", padx=15)
         self.entry_nome = ctk.CTkEntry(frame_cli)
         self.entry_nome.pack(fill="x", padx=15, pady=(0, 10))
@@ -398,40 +617,120 @@ class App(ctk.CTk):
                                                      font=("Arial", 10), text_color="#BDC3C7")
         self.lbl_status_entregadores.pack(pady=(0,10))
 
+        self.lbl_fila = ctk.CTkLabel(self.frame_status, text="", font=("Arial", 10, "bold"), 
+                                     text_color="#F1C40F")
+
+        self.btn_falhas_impressao = ctk.CTkButton(self.frame_status, text="", height=24, fg_color="#C0392B",
+                                                  text_color="white", font=("Arial", 10, "bold"),
+                                                  command=self.ver_falhas_impressao)
+
+        self.lbl_ocupado = ctk.CTkLabel(self.frame_status, text="", font=("Arial", 10, "bold"),
+                                        text_color="#3B8ED0")
+
     # ================== DIAGNÓSTICO DO BANCO ==================
     def diagnosticar_banco(self):
-        """Verifica integridade do banco e mostra estatísticas"""
-        try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            
-            # Verifica integridade
-            cursor.execute("PRAGMA integrity_check")
-            integridade = cursor.fetchone()[0]
-            
-            # Conta registros
-            cursor.execute("SELECT COUNT(*) FROM clientes")
-            qtd_clientes = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM pedidos")
-            qtd_pedidos = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM lembretes")
-            qtd_lembretes = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM historico_enderecos")
-            qtd_enderecos = cursor.fetchone()[0]
-            
-            conn.close()
-            
-            # Tamanho do arquivo
+        """Painel de desempenho: latências, rede, WAL, cache, tamanho das tabelas e integridade"""
+        top = ctk.CTkToplevel(self)
+        top.title("Diagnóstico do Banco")
+        top.geometry("780x820")
+        top.attributes("-topmost", True)
+        top.lift()
+        top.focus_force()
+
+        texto = ctk.CTkTextbox(top, font=("Courier New", 12), wrap="none")
+        texto.pack(fill="both", expand=True, padx=15, pady=(15, 10))
+
+        frame_botoes = ctk.CTkFrame(top, fg_color="transparent")
+        frame_botoes.pack(pady=(0, 15))
+
+        def escrever(msg):
+            texto.configure(state="normal")
+            texto.delete("1.0", "end")
+            texto.insert("1.0", msg)
+            texto.configure(state="disabled")
+
+        def atualizar():
+            escrever("Coletando...")
+            self.no_banco(self.coletar_diagnostico, chave="diagnostico", descricao="Diagnóstico",
+                          ao_concluir=lambda msg: escrever(msg + self.texto_latencias() + self.texto_abertura()
+                                                           + self.texto_widgets()),
+                          ao_falhar=lambda e: escrever(f"Falha no diagnóstico:\n{e}"))
+
+        def verificar_integridade():
+            # integrity_check pode levar minutos num banco grande em rede
+            def concluido(integridade):
+                if integridade != "ok":
+                    messagebox.showwarning("Diagnóstico - ATENÇÃO",
+                                           f"🔍 Integridade: {integridade.upper()}\n\n⚠️ BANCO CORROMPIDO!\nFaça backup e execute VACUUM.")
+                else:
+                    messagebox.showinfo("Diagnóstico", "🔍 Integridade: OK\n\n✅ Banco saudável!")
+
+            self.no_banco(lambda: BANCO.conexao().execute("PRAGMA integrity_check").fetchone()[0],
+                          ao_concluir=concluido, chave="integridade", descricao="Verificar integridade",
+                          ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha na verificação:\n{e}"))
+
+        ctk.CTkButton(frame_botoes, text="🔄 ATUALIZAR", command=atualizar, width=140).pack(side="left", padx=5)
+        ctk.CTkButton(frame_botoes, text="🔍 VERIFICAR INTEGRIDADE", command=verificar_integridade,
+                      fg_color="#E74C3C", width=200).pack(side="left", padx=5)
+        atualizar()
+
+    def coletar_diagnostico(self):
+        """Monta o texto do diagnóstico (thread de banco)"""
+        conn = BANCO.conexao()
+        qtd = {}
+        for tabela in ("clientes", "pedidos", "lembretes", "historico_enderecos"):
+            qtd[tabela] = conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+
+        if BANCO.modo == "servidor":
+            # WAL, cache e tamanho medidos no servidor, onde o arquivo está
+            servidor = BANCO.estado()
+            tamanho_mb = servidor["tamanho"] / (1024 * 1024)
+            modo = (f"🖧 SERVIDOR ({servidor['sessoes']} sessões, {servidor['pedidos']} pedidos "
+                    f"desde {servidor['iniciado_em']})\n   Arquivo no servidor: {servidor['caminho']}")
+            rtt_min, rtt_mediana = servidor["rtt"]
+            wal_bytes, paginas_log, atraso = servidor["wal"]
+            cache = servidor["cache"]
+            alvo_rtt = "ao servidor"
+        else:
             tamanho_mb = os.path.getsize(DB_PATH) / (1024 * 1024)
-            
-            # Verifica modo de conexão
-            modo = "🌐 REDE" if ("\\\\" in DB_PATH or DB_PATH.startswith("//")) else "💻 LOCAL"
-            
-            msg = f"""
-═══════════════════════════════
+            modo = "🌐 REDE" if BANCO.modo == "rede" else "💻 LOCAL"
+            # Rede x banco: ida e volta ao arquivo, WAL e cache
+            rtt_min, rtt_mediana = medir_rtt(DB_PATH)
+            wal_bytes, paginas_log, atraso = estado_wal(conn, DB_PATH)
+            cache = BANCO.com_conexoes(lambda conexoes: acertos_cache(conexoes, DB_PATH))
+            alvo_rtt = "ao arquivo"
+        if REPLICA:
+            if REPLICA.ultima_sincronizacao:
+                modo += f"\n🗂️ Réplica local: sincronizada às {datetime.fromtimestamp(REPLICA.ultima_sincronizacao).strftime('%H:%M:%S')}"
+            else:
+                modo += "\n🗂️ Réplica local: ainda não sincronizada"
+
+        if cache and sum(cache):
+            taxa_cache = f"{cache[0] / sum(cache):.1%} ({cache[0]} acertos, {cache[1]} leituras do disco)"
+        else:
+            taxa_cache = "indisponível"
+
+        tabelas = tamanho_tabelas(conn)
+        if tabelas is None:
+            linhas_tabelas = "dbstat indisponível neste SQLite"
+        else:
+            linhas_tabelas = "\n".join(f"{nome[:30]:<30} {tamanho / 1048576:>9.2f} MB" for nome, tamanho in tabelas[:15])
+
+        # Última execução de cada tarefa de manutenção
+        try:
+            registros = MANUTENCAO.registros()
+        except sqlite3.OperationalError:
+            registros = {}
+        linhas_manutencao = []
+        for tarefa in TAREFAS:
+            if tarefa in registros and registros[tarefa][0]:
+                quando, duracao, resultado = registros[tarefa]
+                linhas_manutencao.append(f"🧹 {tarefa}: {quando} ({duracao:.2f}s)\n    {resultado}")
+            else:
+                linhas_manutencao.append(f"🧹 {tarefa}: nunca executado")
+        manutencao = "\n".join(linhas_manutencao)
+
+        return f"""═══════════════════════════════
    DIAGNÓSTICO DO BANCO V10
 ═══════════════════════════════
 
@@ -441,56 +740,105 @@ class App(ctk.CTk):
 📊 Tamanho: {tamanho_mb:.2f} MB
 🔌 Modo: {modo}
 
+═══════════════════════════════
+      REDE E BANCO
+═══════════════════════════════
+📡 Ida e volta {alvo_rtt}: {rtt_mediana * 1000:.2f} ms (mínimo {rtt_min * 1000:.2f} ms)
+📝 WAL: {wal_bytes / 1048576:.2f} MB, {paginas_log} páginas no log
+   Atraso do checkpoint: {atraso} páginas
+🧠 Acerto do cache: {taxa_cache}
+🔁 Reconexões: {BANCO.reconexoes}
+
 ═══════════════════════════════
          REGISTROS
 ═══════════════════════════════
-👥 Clientes: {qtd_clientes}
-📦 Pedidos: {qtd_pedidos}
-🔔 Lembretes: {qtd_lembretes}
-📍 Endereços: {qtd_enderecos}
+👥 Clientes: {qtd['clientes']}
+📦 Pedidos: {qtd['pedidos']}
+🔔 Lembretes: {qtd['lembretes']}
+📍 Endereços: {qtd['historico_enderecos']}
 
 ═══════════════════════════════
-      INTEGRIDADE
+      TAMANHO POR TABELA
+═══════════════════════════════
+{linhas_tabelas}
+
 ═══════════════════════════════
-🔍 Status: {integridade.upper()}
+      MANUTENÇÃO
+═══════════════════════════════
+{manutencao}
+"""
+
+    def texto_latencias(self):
+        """Latências das consultas e ações mais lentas desta sessão"""
+        consultas = CONSULTAS.resumo()
+        if consultas:
+            linhas = [f"{'consulta':<32} {'qtd':>5} {'p50':>8} {'p95':>8} {'p99':>8}"]
+            for nome, qtd, p50, p95, p99 in consultas:
+                linhas.append(f"{nome[:32]:<32} {qtd:>5} {p50 * 1000:>6.0f}ms {p95 * 1000:>6.0f}ms {p99 * 1000:>6.0f}ms")
+            latencias = "\n".join(linhas)
+        else:
+            latencias = "Nenhuma consulta ainda"
+        contencao = CONTENCAO.resumo()
+        if contencao:
+            linhas = [f"{'operação':<22} {'qtd':>5} {'disput.':>7} {'tent.':>5} {'desist.':>7} {'espera p95':>10} "
+                      f"{'máx':>7} {'com lock p95':>12}"]
+            for operacao, qtd, disputadas, tentativas, desistencias, p95, maxima, duracao in contencao:
+                linhas.append(f"{operacao[:22]:<22} {qtd:>5} {disputadas:>7} {tentativas:>5} {desistencias:>7} "
+                              f"{p95 * 1000:>8.0f}ms {maxima * 1000:>5.0f}ms {duracao * 1000:>10.0f}ms")
+            escrita = "\n".join(linhas)
+        else:
+            escrita = "Nenhuma gravação ainda"
+        acoes = ACOES.mais_lentas(10)
+        if acoes:
+            lentas = "\n".join(f"{quando.strftime('%H:%M:%S')}  {segundos * 1000:>7.0f}ms  {nome}"
+                               for segundos, nome, quando in acoes)
+        else:
+            lentas = "Nenhuma ação ainda"
+        return f"""
+═══════════════════════════════
+   LATÊNCIA (últimas {JANELA} de cada)
+═══════════════════════════════
+{latencias}
+
+═══════════════════════════════
+   GRAVAÇÕES: ESPERA PELO LOCK
+═══════════════════════════════
+{escrita}
+
+═══════════════════════════════
+   AÇÕES MAIS LENTAS
+═══════════════════════════════
+{lentas}
+"""
+
+    def texto_abertura(self):
+        """Quanto levou cada etapa da abertura do programa"""
+        return f"""
+═══════════════════════════════
+   ABERTURA DO PROGRAMA
+═══════════════════════════════
+{ABERTURA.texto().replace("[ABERTURA] ", "")}
+"""
+
+    def texto_widgets(self):
+        """Widgets e janelas vivos (só com --debug-widgets)"""
+        if not DEBUG_WIDGETS:
+            return ""
+        contagem = self.monitor_widgets.texto(separador="\n")
+        return f"""
+═══════════════════════════════
+   WIDGETS (--debug-widgets)
+═══════════════════════════════
+{contagem}
 """
-            
-            if integridade != "ok":
-                msg += "\n\n⚠️ BANCO CORROMPIDO!\nFaça backup e execute VACUUM."
-                messagebox.showwarning("Diagnóstico - ATENÇÃO", msg)
-            else:
-                msg += "\n✅ Banco saudável!"
-                messagebox.showinfo("Diagnóstico", msg)
-                
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha no diagnóstico:\n{e}")
 
     # ================== PAINEL DE STATUS ==================
     def atualizar_painel_status(self):
         """Atualiza o painel de status com entregas do dia"""
-        try:
-            hoje = datetime.now().strftime("%Y-%m-%d")
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            
-            # Total do dia
-            cursor.execute("SELECT COUNT(*), COALESCE(SUM(valor_total), 0) FROM pedidos WHERE data = ?", (hoje,))
-            total_entregas, faturamento = cursor.fetchone()
-            
-            # Por entregador
-            cursor.execute("""
-                SELECT entregador, COUNT(*) 
-                FROM pedidos 
-                WHERE data = ? 
-                GROUP BY entregador 
-                ORDER BY COUNT(*) DESC
-            """, (hoje,))
-            por_entregador = cursor.fetchall()
-            conn.close()
-            
-            # Atualiza labels
+        def mostrar(resultado):
+            total_entregas, faturamento, por_entregador = resultado
             self.lbl_status_total.configure(
-                text=f"Total: {total_entregas} entregas | R$ {faturamento:.2f}"
+                text=f"Total: {total_entregas} entregas | R$ {formatar_centavos(faturamento)}"
             )
             
             if por_entregador:
@@ -499,22 +847,22 @@ class App(ctk.CTk):
                 texto_entregadores = "Nenhuma entrega ainda"
                 
             self.lbl_status_entregadores.configure(text=texto_entregadores)
-            
-        except Exception as e:
+            ABERTURA.marco("painel do dia")
+
+        def falhou(e):
             self.lbl_status_total.configure(text="Erro ao carregar")
             print(f"[ERRO] Atualizar painel: {e}")
+            ABERTURA.marco("painel do dia")
+
+        # Total do dia e por entregador (resumo_diario, mantido por triggers em pedidos)
+        self.no_banco(SERVICO.painel_do_dia, ao_concluir=mostrar, ao_falhar=falhou, chave="painel", descricao="Painel do dia")
 
     # ================== HISTÓRICO DE ENTREGAS POR PERÍODO ==================
     def consultar_historico_entregas(self):
         """Consulta entregas por período com filtros"""
-        top = ctk.CTkToplevel(self)
-        top.title("Histórico de Entregas")
-        top.geometry("850x700")
-        top.attributes("-topmost", True)
-        top.lift()
-        top.focus_force()
-        top.grab_set()
-        
+        self.janelas.abrir("historico", "Histórico de Entregas", "850x700", self.montar_historico_entregas)
+
+    def montar_historico_entregas(self, top):
         # --- FILTROS ---
         frame_filtros = ctk.CTkFrame(top, fg_color="#1a1a2e")
         frame_filtros.pack(fill="x", padx=15, pady=15)
@@ -587,147 +935,102 @@ class App(ctk.CTk):
         # --- LISTA DE ENTREGAS ---
         ctk.CTkLabel(top, text="Detalhes dos Pedidos:", font=("Arial", 12, "bold")).pack(anchor="w", padx=15)
         
-        scroll = ctk.CTkScrollableFrame(top, height=280)
-        scroll.pack(fill="both", expand=True, padx=15, pady=(5,10))
+        def criar_linha_pedido(frame):
+            lbl_data = ctk.CTkLabel(frame, text="", font=("Arial", 12, "bold"), width=110, anchor="w")
+            lbl_data.pack(side="left", padx=(10, 0))
+            lbl_pedido = ctk.CTkLabel(frame, text="", font=("Arial", 11, "bold"), anchor="w")
+            lbl_pedido.pack(anchor="w", padx=10, pady=(5,0))
+            lbl_detalhe = ctk.CTkLabel(frame, text="", font=("Arial", 10), text_color="#BDC3C7", anchor="w")
+            lbl_detalhe.pack(anchor="w", padx=10, pady=(0,5))
+            return lbl_data, lbl_pedido, lbl_detalhe
+        
+        def preencher_linha_pedido(partes, pedido, indice):
+            lbl_data, lbl_pedido, lbl_detalhe = partes
+            pid, dia, cliente, telefone, entregador, centavos, metodo = pedido
+            # Separador por data: a data aparece no primeiro pedido de cada dia (e no topo da lista)
+            anterior = lista.item(indice - 1)
+            if indice == lista.primeira or anterior is None or anterior[1] != dia:
+                lbl_data.configure(text=f"📅 {data_do_dia(dia).strftime('%d/%m/%Y')}", text_color="#F39C12")
+            else:
+                lbl_data.configure(text="")
+            
+            cliente_nome = cliente if cliente else "Cliente não encontrado"
+            tel_fmt = self.formatar_telefone_visual(telefone) if telefone else "N/A"
+            metodo_str = metodo if metodo else "N/A"
+            
+            lbl_pedido.configure(text=f"#{pid} | {cliente_nome} ({tel_fmt})")
+            lbl_detalhe.configure(text=f"🏍️ {entregador} | 💳 {metodo_str} | 💰 R$ {formatar_centavos(centavos)}")
+        
+        lista = ListaVirtual(top, 58, criar_linha_pedido, preencher_linha_pedido, cor_linha="#333", height=280,
+                             texto_vazio="Nenhuma entrega encontrada no período.")
+        lista.pack(fill="both", expand=True, padx=15, pady=(5,10))
         
         # --- BOTÃO EXPORTAR ---
         btn_exportar = ctk.CTkButton(top, text="📥 EXPORTAR PERÍODO (CSV)", fg_color="#8E44AD", 
                                       text_color="white", command=lambda: exportar_periodo())
         btn_exportar.pack(pady=(5,15))
         
-        # Variável para guardar os dados da busca atual
-        dados_busca_atual = []
-        
         def converter_data(data_str):
-            """Converte dd/mm/aaaa para aaaa-mm-dd"""
+            """Converte dd/mm/aaaa para o número do dia usado em pedidos.dia"""
             try:
-                partes = data_str.strip().split("/")
-                return f"{partes[2]}-{partes[1]}-{partes[0]}"
+                return dia_de(datetime.strptime(data_str.strip(), "%d/%m/%Y"))
             except:
                 return None
         
+        @instrumentacao.cronometrado("executar_busca")
         def executar_busca():
-            nonlocal dados_busca_atual
-            
-            # Limpa lista anterior
-            for widget in scroll.winfo_children():
-                widget.destroy()
-            
             # Converte datas
             data_ini = converter_data(entry_data_ini.get())
             data_fim = converter_data(entry_data_fim.get())
             
-            if not data_ini or not data_fim:
+            if data_ini is None or data_fim is None:
                 messagebox.showwarning("Erro", "Formato de data inválido.\nUse: dd/mm/aaaa")
                 return
             
             entregador_filtro = combo_entregador.get()
             
-            try:
-                conn = sqlite3.connect(DB_PATH, timeout=10)
-                cursor = conn.cursor()
-                
-                # Query base
-                if entregador_filtro == "Todos":
-                    cursor.execute("""
-                        SELECT p.id, p.data, c.nome, c.telefone, p.entregador, 
-                               p.valor_total, p.metodo_pagamento
-                        FROM pedidos p
-                        LEFT JOIN clientes c ON p.cliente_tel = c.telefone
-                        WHERE p.data BETWEEN ? AND ?
-                        ORDER BY p.data DESC, p.id DESC
-                    """, (data_ini, data_fim))
-                else:
-                    cursor.execute("""
-                        SELECT p.id, p.data, c.nome, c.telefone, p.entregador, 
-                               p.valor_total, p.metodo_pagamento
-                        FROM pedidos p
-                        LEFT JOIN clientes c ON p.cliente_tel = c.telefone
-                        WHERE p.data BETWEEN ? AND ? AND p.entregador = ?
-                        ORDER BY p.data DESC, p.id DESC
-                    """, (data_ini, data_fim, entregador_filtro))
-                
-                pedidos = cursor.fetchall()
-                dados_busca_atual = pedidos
-                
-                # Resumo por entregador
-                if entregador_filtro == "Todos":
-                    cursor.execute("""
-                        SELECT entregador, COUNT(*), SUM(valor_total)
-                        FROM pedidos
-                        WHERE data BETWEEN ? AND ?
-                        GROUP BY entregador
-                    """, (data_ini, data_fim))
-                else:
-                    cursor.execute("""
-                        SELECT entregador, COUNT(*), SUM(valor_total)
-                        FROM pedidos
-                        WHERE data BETWEEN ? AND ? AND entregador = ?
-                        GROUP BY entregador
-                    """, (data_ini, data_fim, entregador_filtro))
-                
-                resumo_entregadores = cursor.fetchall()
-                conn.close()
-                
-                # Calcula totais
-                total_entregas = len(pedidos)
-                total_valor = sum([p[5] for p in pedidos if p[5]]) if pedidos else 0
+            entregador = None if entregador_filtro == "Todos" else entregador_filtro
+            
+            def buscar_pagina(inicio, quantidade, ao_chegar):
+                self.no_banco(SERVICO.pagina_periodo, data_ini, data_fim, entregador, inicio, quantidade,
+                              ao_concluir=ao_chegar, ao_falhar=lambda e: ao_chegar(None),
+                              descricao="Histórico de entregas (página)")
+            
+            def mostrar(relatorio):
+                pedidos, resumo_entregadores = relatorio["pedidos"], relatorio["por_entregador"]
+                total_entregas, total_valor = relatorio["entregas"], relatorio["valor_centavos"]
                 
                 # Atualiza resumo
-                lbl_resumo_total.configure(text=f"Total: {total_entregas} entregas | R$ {total_valor:.2f}")
+                lbl_resumo_total.configure(text=f"Total: {total_entregas} entregas | R$ {formatar_centavos(total_valor)}")
                 
                 if resumo_entregadores:
-                    texto_ent = " | ".join([f"{e[0]}: {e[1]} (R$ {e[2] or 0:.2f})" for e in resumo_entregadores])
+                    texto_ent = " | ".join([f"{e[0]}: {e[1]} (R$ {formatar_centavos(e[2])})" for e in resumo_entregadores])
                     lbl_resumo_entregadores.configure(text=texto_ent)
                 else:
                     lbl_resumo_entregadores.configure(text="Nenhuma entrega no período")
                 
-                # Popula lista
-                if not pedidos:
-                    ctk.CTkLabel(scroll, text="Nenhuma entrega encontrada no período.", 
-                                 text_color="#888").pack(pady=20)
-                    return
-                
-                data_anterior = None
-                for pid, data, cliente, telefone, entregador, valor, metodo in pedidos:
-                    # Separador por data
-                    data_fmt = datetime.strptime(data, "%Y-%m-%d").strftime("%d/%m/%Y")
-                    if data_fmt != data_anterior:
-                        ctk.CTkLabel(scroll, text=f"📅 {data_fmt}", font=("Arial", 12, "bold"),
-                                     text_color="#F39C12").pack(anchor="w", pady=(15,5))
-                        data_anterior = data_fmt
-                    
-                    # Card do pedido
-                    card = ctk.CTkFrame(scroll, fg_color="#333")
-                    card.pack(fill="x", pady=2)
-                    
-                    cliente_nome = cliente if cliente else "Cliente não encontrado"
-                    tel_fmt = self.formatar_telefone_visual(telefone) if telefone else "N/A"
-                    metodo_str = metodo if metodo else "N/A"
-                    valor = valor or 0
-                    
-                    texto_pedido = f"#{pid} | {cliente_nome} ({tel_fmt})"
-                    texto_detalhe = f"🏍️ {entregador} | 💳 {metodo_str} | 💰 R$ {valor:.2f}"
-                    
-                    ctk.CTkLabel(card, text=texto_pedido, font=("Arial", 11, "bold"), 
-                                 anchor="w").pack(anchor="w", padx=10, pady=(5,0))
-                    ctk.CTkLabel(card, text=texto_detalhe, font=("Arial", 10), 
-                                 text_color="#BDC3C7", anchor="w").pack(anchor="w", padx=10, pady=(0,5))
-                                 
-            except Exception as e:
-                messagebox.showerror("Erro", f"Erro na busca:\n{e}")
+                # Só a primeira página vem com o resumo; o resto, ao rolar
+                lista.carregar(total_entregas, buscar_pagina, pedidos)
+            
+            self.no_banco(SERVICO.relatorio_periodo, data_ini, data_fim, entregador, TAMANHO_PAGINA,
+                          ao_concluir=mostrar, chave="historico", descricao="Histórico de entregas",
+                          ao_falhar=lambda e: messagebox.showerror("Erro", f"Erro na busca:\n{e}"))
         
         def exportar_periodo():
-            if not dados_busca_atual:
-                messagebox.showwarning("Aviso", "Faça uma busca primeiro.")
+            """Exporta direto do banco (não depende da lista na tela), em segundo plano"""
+            data_ini = converter_data(entry_data_ini.get())
+            data_fim = converter_data(entry_data_fim.get())
+            if data_ini is None or data_fim is None:
+                messagebox.showwarning("Erro", "Formato de data inválido.\nUse: dd/mm/aaaa")
                 return
+            entregador = None if combo_entregador.get() == "Todos" else combo_entregador.get()
             
             data_ini_nome = entry_data_ini.get().replace("/", "-")
             data_fim_nome = entry_data_fim.get().replace("/", "-")
             
             filename = filedialog.asksaveasfilename(
                 defaultextension=".csv",
-                filetypes=[("Arquivo CSV", "*.csv")],
+                filetypes=[("Arquivo CSV", "*.csv"), ("CSV comprimido", "*.csv.gz")],
                 initialfile=f"Entregas_{data_ini_nome}_a_{data_fim_nome}.csv",
                 title="Salvar Relatório"
             )
@@ -735,22 +1038,60 @@ class App(ctk.CTk):
             if not filename:
                 return
             
-            try:
-                with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
-                    writer = csv.writer(f, delimiter=';')
-                    writer.writerow(["ID", "Data", "Cliente", "Telefone", "Entregador", "Valor (R$)", "Pagamento"])
-                    
-                    for pid, data, cliente, telefone, entregador, valor, metodo in dados_busca_atual:
-                        data_fmt = datetime.strptime(data, "%Y-%m-%d").strftime("%d/%m/%Y")
-                        valor_fmt = f"{valor or 0:.2f}".replace(".", ",")
-                        writer.writerow([pid, data_fmt, cliente or "N/A", telefone or "N/A", entregador, valor_fmt, metodo or "N/A"])
-                
-                messagebox.showinfo("Sucesso", f"Relatório exportado!\n\n{filename}")
-            except Exception as e:
-                messagebox.showerror("Erro", f"Erro ao exportar:\n{e}")
+            janela = ctk.CTkToplevel(top)
+            janela.title("Exportar Período")
+            janela.geometry("380x160")
+            janela.attributes("-topmost", True)
+            lbl_etapa = ctk.CTkLabel(janela, text="Contando pedidos...")
+            lbl_etapa.pack(pady=(20, 10))
+            barra = ctk.CTkProgressBar(janela, width=320)
+            barra.set(0)
+            barra.pack()
+            cancelar = threading.Event()
+            btn_cancelar = ctk.CTkButton(janela, text="CANCELAR", fg_color="#C0392B", width=120,
+                                         command=cancelar.set)
+            btn_cancelar.pack(pady=15)
+            janela.protocol("WM_DELETE_WINDOW", cancelar.set)
+            
+            andamento = {"feitos": 0, "total": 0, "fim": False}
+            
+            def progresso(feitos, total):
+                andamento["feitos"], andamento["total"] = feitos, total
+            
+            def acompanhar():
+                if andamento["fim"] or not janela.winfo_exists():
+                    return
+                if cancelar.is_set():
+                    lbl_etapa.configure(text="Cancelando...")
+                    btn_cancelar.configure(state="disabled")
+                elif andamento["total"]:
+                    lbl_etapa.configure(text=f"{andamento['feitos']} de {andamento['total']} pedidos")
+                    barra.set(andamento["feitos"] / andamento["total"])
+                self.after(100, acompanhar)
+            
+            def concluido(qtd):
+                andamento["fim"] = True
+                janela.destroy()
+                if qtd is None:
+                    messagebox.showinfo("Exportação", "Exportação cancelada.")
+                else:
+                    messagebox.showinfo("Sucesso", f"Relatório exportado! ({qtd} pedidos)\n\n{filename}")
+            
+            def falhou(erro):
+                andamento["fim"] = True
+                janela.destroy()
+                messagebox.showerror("Erro", f"Erro ao exportar:\n{erro}")
+            
+            self.no_banco(SERVICO.exportar_periodo_csv, filename, data_ini, data_fim, entregador, progresso, cancelar,
+                          descricao="Exportar período", silenciosa=True, ao_concluir=concluido, ao_falhar=falhou)
+            acompanhar()
         
-        # Executa busca inicial
-        executar_busca()
+        def ao_abrir():
+            # Cada abertura volta ao padrão (últimos 7 dias, todos) e busca de novo
+            combo_entregador.set("Todos")
+            definir_periodo(7)
+
+        return ao_abrir
 
     # ================== LÓGICA DE PAGAMENTO ==================
     def toggle_pagamento_duplo(self):
@@ -833,41 +1174,20 @@ class App(ctk.CTk):
             messagebox.showwarning("Aviso", "Digite um telefone primeiro.")
             return
             
-        top = ctk.CTkToplevel(self)
-        top.title("Histórico de Endereços")
-        top.geometry("550x500")
-        top.attributes("-topmost", True)
-        
+        self.janelas.abrir("enderecos", "Histórico de Endereços", "550x500", self.montar_historico_enderecos,
+                           tel_limpo, modal=False)
+
+    def montar_historico_enderecos(self, top):
+        estado = {"telefone": None}
+
         frame_topo = ctk.CTkFrame(top)
         frame_topo.pack(fill="x", padx=10, pady=10)
         ctk.CTkLabel(frame_topo, text="Endereços Antigos", font=("Arial", 14, "bold")).pack(side="left")
         
         ctk.CTkButton(frame_topo, text="➕ NOVO ENDEREÇO", width=140, fg_color="#3498DB", text_color="white",
-                      command=lambda: self.adicionar_endereco_manual(tel_limpo, top)).pack(side="right")
-        
-        scroll = ctk.CTkScrollableFrame(top)
-        scroll.pack(fill="both", expand=True, padx=10, pady=10)
+                      command=lambda: self.adicionar_endereco_manual(estado["telefone"], top, carregar)
+                      ).pack(side="right")
         
-        self.carregar_lista_historico(scroll, tel_limpo, top)
-
-    def carregar_lista_historico(self, scroll_frame, tel_limpo, top_window):
-        for widget in scroll_frame.winfo_children(): 
-            widget.destroy()
-
-        try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            cursor.execute("SELECT rua, numero, bairro, referencia, ultimo_uso FROM historico_enderecos WHERE telefone_cliente = ? ORDER BY ultimo_uso DESC", (tel_limpo,))
-            enderecos = cursor.fetchall()
-            conn.close()
-        except Exception as e:
-            ctk.CTkLabel(scroll_frame, text=f"Erro: {e}").pack(pady=20)
-            return
-        
-        if not enderecos:
-            ctk.CTkLabel(scroll_frame, text="Nenhum endereço salvo.").pack(pady=20)
-            return
-            
         def usar_endereco(dados):
             self.entry_rua.delete(0, "end")
             self.entry_rua.insert(0, dados[0])
@@ -877,16 +1197,37 @@ class App(ctk.CTk):
             self.entry_bairro.insert(0, dados[2])
             self.entry_ref.delete(0, "end")
             self.entry_ref.insert(0, dados[3])
-            top_window.destroy()
+            self.janelas.esconder("enderecos")
+
+        def criar_linha(frame):
+            lbl_texto = ctk.CTkLabel(frame, text="", justify="left", anchor="w")
+            lbl_texto.pack(side="left", padx=10, pady=5)
+            btn_usar = ctk.CTkButton(frame, text="USAR ESTE", width=80, fg_color="#27AE60", text_color="white")
+            btn_usar.pack(side="right", padx=10)
+            return lbl_texto, btn_usar
+
+        def preencher_linha(partes, end, indice):
+            lbl_texto, btn_usar = partes
+            lbl_texto.configure(text=f"{end[0]}, {end[1]}\nBairro: {end[2]}\nRef: {end[3]}")
+            btn_usar.configure(command=lambda: usar_endereco(end))
+
+        lista = ListaVirtual(top, 80, criar_linha, preencher_linha, cor_linha="#333",
+                             texto_vazio="Nenhum endereço salvo.")
+        lista.pack(fill="both", expand=True, padx=10, pady=10)
+
+        def carregar():
+            self.no_banco(SERVICO.enderecos, estado["telefone"],
+                          chave="historico_enderecos", descricao="Histórico de endereços",
+                          ao_concluir=lista.mostrar, ao_falhar=lambda e: lista.avisar(f"Erro: {e}"))
+
+        def ao_abrir(tel_limpo):
+            estado["telefone"] = tel_limpo
+            lista.avisar("Carregando...")
+            carregar()
 
-        for end in enderecos:
-            card = ctk.CTkFrame(scroll_frame, fg_color="#333")
-            card.pack(fill="x", pady=5)
-            texto = f"{end[0]}, {end[1]}\nBairro: {end[2]}\nRef: {end[3]}"
-            ctk.CTkLabel(card, text=texto, justify="left", anchor="w").pack(side="left", padx=10, pady=5)
-            ctk.CTkButton(card, text="USAR ESTE", width=80, fg_color="#27AE60", text_color="white", command=lambda e=end: usar_endereco(e)).pack(side="right", padx=10)
+        return ao_abrir
 
-    def adicionar_endereco_manual(self, tel_limpo, janela_pai):
+    def adicionar_endereco_manual(self, tel_limpo, janela_pai, ao_gravar):
         add_win = ctk.CTkToplevel(janela_pai)
         add_win.title("Adicionar Endereço")
         add_win.geometry("400x350")
@@ -913,47 +1254,56 @@ class App(ctk.CTk):
             if not r or not b:
                 messagebox.showwarning("Erro", "Rua e Bairro são obrigatórios.")
                 return
-            try:
-                conn = sqlite3.connect(DB_PATH, timeout=10)
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO historico_enderecos (telefone_cliente, rua, numero, bairro, referencia, ultimo_uso) VALUES (?, ?, ?, ?, ?, ?)",
-                                (tel_limpo, r, n, b, ref, datetime.now().strftime("%Y-%m-%d")))
-                conn.commit()
-                conn.close()
+
+            def gravado(_):
                 messagebox.showinfo("Sucesso", "Endereço adicionado!")
                 add_win.destroy()
-                
-                scroll_widget = None
-                for widget in janela_pai.winfo_children():
-                    if isinstance(widget, ctk.CTkScrollableFrame):
-                        scroll_widget = widget
-                        break
-                if scroll_widget:
-                    self.carregar_lista_historico(scroll_widget, tel_limpo, janela_pai)
-            except Exception as e:
-                messagebox.showerror("Erro", f"Falha ao salvar:\n{e}")
+                ao_gravar()
+
+            self.no_banco(SERVICO.adicionar_endereco, tel_limpo, r, n, b, ref, ao_concluir=gravado,
+                          descricao="Adicionar endereço",
+                          ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha ao salvar:\n{e}"))
 
         ctk.CTkButton(add_win, text="SALVAR", command=salvar_novo, fg_color="#2ECC71", text_color="white").pack(pady=20)
 
     # ================== GESTÃO DE CLIENTES ==================
     def abrir_gestao_clientes(self):
-        top = ctk.CTkToplevel(self)
-        top.title("Buscar Cliente / Iniciar Pedido")
-        top.geometry("950x650") 
-        top.attributes("-topmost", True)
-        top.lift()
-        top.focus_force()
-        top.grab_set()
+        self.janelas.abrir("clientes", "Buscar Cliente / Iniciar Pedido", "950x650", self.montar_gestao_clientes)
 
+    def montar_gestao_clientes(self, top):
         frame_busca = ctk.CTkFrame(top)
         frame_busca.pack(fill="x", padx=10, pady=10)
         
-        entry_busca = ctk.CTkEntry(frame_busca, placeholder_text="Digite Nome ou Telefone e dê Enter...")
+        entry_busca = ctk.CTkEntry(frame_busca, placeholder_text="Digite Nome ou Telefone...")
         entry_busca.pack(side="left", fill="x", expand=True, padx=(0, 10))
-        entry_busca.focus_set() 
         
-        scroll = ctk.CTkScrollableFrame(top)
-        scroll.pack(fill="both", expand=True, padx=10, pady=(0,10))
+        def criar_linha_cliente(frame):
+            lbl_info = ctk.CTkLabel(frame, text="", font=("Arial", 13), justify="left", anchor="w")
+            lbl_info.pack(side="left", padx=10, pady=10)
+            botoes = {
+                "pedido": ctk.CTkButton(frame, text="✅ NOVO PEDIDO", font=("Arial", 12, "bold"), width=120,
+                                        fg_color="#2ECC71", text_color="black"),
+                "excluir": ctk.CTkButton(frame, text="🗑️", width=40, fg_color="#C0392B", text_color="white"),
+                "editar": ctk.CTkButton(frame, text="✏️", width=40, fg_color="#F39C12", text_color="white"),
+                "lembrete": ctk.CTkButton(frame, text="🔔", width=40, fg_color="#8E44AD", text_color="white"),
+            }
+            botoes["pedido"].pack(side="right", padx=10)
+            for nome in ("excluir", "editar", "lembrete"):
+                botoes[nome].pack(side="right", padx=5)
+            return lbl_info, botoes
+
+        def preencher_linha_cliente(partes, cli, indice):
+            lbl_info, botoes = partes
+            tel_fmt = self.formatar_telefone_visual(cli[0])
+            lbl_info.configure(text=f"{cli[1]} - {tel_fmt}\n{cli[2] or ''}, {cli[3] or ''} - {cli[4] or ''}")
+            botoes["pedido"].configure(command=lambda: usar_cliente_para_pedido(cli))
+            botoes["excluir"].configure(command=lambda: deletar_cliente(cli[0]))
+            botoes["editar"].configure(command=lambda: modal_editar_cliente(cli))
+            botoes["lembrete"].configure(command=lambda: modal_adicionar_lembrete(cli))
+
+        lista = ListaVirtual(top, 70, criar_linha_cliente, preencher_linha_cliente,
+                             texto_vazio="Nenhum cliente encontrado.")
+        lista.pack(fill="both", expand=True, padx=10, pady=(0,10))
 
         def usar_cliente_para_pedido(dados_cli):
             self.limpar_tela()
@@ -969,58 +1319,55 @@ class App(ctk.CTk):
                 self.entry_bairro.insert(0, dados_cli[4])
             if dados_cli[5]: 
                 self.entry_ref.insert(0, dados_cli[5])
-            top.destroy()
+            self.janelas.esconder("clientes")
             self.entry_val.focus_set() 
 
-        def carregar_clientes(termo=""):
-            for widget in scroll.winfo_children(): 
-                widget.destroy()
-            try:
-                conn = sqlite3.connect(DB_PATH, timeout=10)
-                cursor = conn.cursor()
-                if termo:
-                    t = f"%{termo}%"
-                    cursor.execute("SELECT * FROM clientes WHERE nome LIKE ? OR telefone LIKE ? ORDER BY nome", (t, t))
-                else:
-                    cursor.execute("SELECT * FROM clientes ORDER BY nome LIMIT 50")
-                clientes = cursor.fetchall()
-                conn.close()
-            except Exception as e:
-                ctk.CTkLabel(scroll, text=f"Erro: {e}").pack(pady=20)
-                return
+        # Busca enquanto digita: espera ATRASO_BUSCA sem tecla e interrompe a consulta anterior
+        busca = {"termo": None, "agendada": None, "cancelar": threading.Event()}
 
-            if not clientes:
-                ctk.CTkLabel(scroll, text="Nenhum cliente encontrado.").pack(pady=20)
+        def agendar_busca(event=None):
+            if event is not None and event.keysym in ("Return", "Escape", "Tab"):
                 return
+            if busca["agendada"] is not None:
+                top.after_cancel(busca["agendada"])
+            busca["agendada"] = top.after(ATRASO_BUSCA, buscar_digitado)
 
-            for cli in clientes:
-                card = ctk.CTkFrame(scroll, fg_color="#2C3E50")
-                card.pack(fill="x", pady=5)
-                tel_fmt = self.formatar_telefone_visual(cli[0])
-                info_texto = f"{cli[1]} - {tel_fmt}\n{cli[2] or ''}, {cli[3] or ''} - {cli[4] or ''}"
-                ctk.CTkLabel(card, text=info_texto, font=("Arial", 13), justify="left", anchor="w").pack(side="left", padx=10, pady=10)
-                
-                ctk.CTkButton(card, text="✅ NOVO PEDIDO", font=("Arial", 12, "bold"), width=120, fg_color="#2ECC71", 
-                              text_color="black", command=lambda c=cli: usar_cliente_para_pedido(c)).pack(side="right", padx=10)
+        def buscar_digitado():
+            busca["agendada"] = None
+            if top.winfo_exists() and entry_busca.get().strip() != busca["termo"]:
+                carregar_clientes(entry_busca.get())
 
-                ctk.CTkButton(card, text="🗑️", width=40, fg_color="#C0392B", text_color="white", command=lambda t=cli[0]: deletar_cliente(t)).pack(side="right", padx=5)
-                ctk.CTkButton(card, text="✏️", width=40, fg_color="#F39C12", text_color="white", command=lambda c=cli: modal_editar_cliente(c)).pack(side="right", padx=5)
-                ctk.CTkButton(card, text="🔔", width=40, fg_color="#8E44AD", text_color="white", command=lambda c=cli: modal_adicionar_lembrete(c)).pack(side="right", padx=5)
+        @instrumentacao.cronometrado("carregar_clientes")
+        def carregar_clientes(termo=""):
+            # Busca sem acento/maiúscula e por prefixo (FTS5), em páginas por nome
+            busca["cancelar"].set()
+            busca["cancelar"] = threading.Event()
+            busca["termo"] = termo.strip()
+            self.no_banco(SERVICO.buscar_clientes, termo, None, busca["cancelar"],
+                          ao_concluir=mostrar_clientes, ao_falhar=mostrar_erro,
+                          chave="gestao_clientes", descricao="Buscar clientes")
+
+        def buscar_mais(ultimo, ao_chegar):
+            apos = (ultimo[1], ultimo[0])
+            self.no_banco(SERVICO.buscar_clientes, busca["termo"], apos, busca["cancelar"],
+                          ao_concluir=lambda clientes: ao_chegar(clientes, len(clientes) < LIMITE_BUSCA),
+                          ao_falhar=lambda e: ao_chegar(None),
+                          chave="gestao_clientes", descricao="Buscar mais clientes", silenciosa=True)
+
+        def mostrar_erro(e):
+            lista.avisar(f"Erro: {e}")
+
+        def mostrar_clientes(clientes):
+            lista.mostrar(clientes, buscar_mais if len(clientes) >= LIMITE_BUSCA else None)
 
         def deletar_cliente(telefone):
             if messagebox.askyesno("Excluir", "Tem certeza? Isso apaga o histórico de pedidos deste cliente!"):
-                try:
-                    conn = sqlite3.connect(DB_PATH, timeout=10)
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM clientes WHERE telefone = ?", (telefone,))
-                    cursor.execute("DELETE FROM pedidos WHERE cliente_tel = ?", (telefone,))
-                    cursor.execute("DELETE FROM lembretes WHERE cliente_tel = ?", (telefone,))
-                    cursor.execute("DELETE FROM historico_enderecos WHERE telefone_cliente = ?", (telefone,))
-                    conn.commit()
-                    conn.close()
+                def apagado(_):
+                    INDICE_TELEFONES.remover(telefone)
                     carregar_clientes(entry_busca.get())
-                except Exception as e:
-                    messagebox.showerror("Erro", f"Falha ao deletar:\n{e}")
+
+                self.no_banco(SERVICO.excluir_cliente, telefone, ao_concluir=apagado, descricao="Excluir cliente",
+                              ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha ao deletar:\n{e}"))
 
         def modal_editar_cliente(dados_cli):
             edit_win = ctk.CTkToplevel(top)
@@ -1053,17 +1400,19 @@ class App(ctk.CTk):
             e_ref.pack(fill="x", padx=20)
             
             def salvar_edicao():
-                try:
-                    conn = sqlite3.connect(DB_PATH, timeout=10)
-                    cursor = conn.cursor()
-                    cursor.execute("UPDATE clientes SET nome=?, rua=?, numero=?, bairro=?, referencia=? WHERE telefone=?", (e_nome.get(), e_rua.get(), e_num.get(), e_bairro.get(), e_ref.get(), dados_cli[0]))
-                    conn.commit()
-                    conn.close()
+                cliente = {"telefone": dados_cli[0], "nome": e_nome.get(), "rua": e_rua.get(), "numero": e_num.get(),
+                           "bairro": e_bairro.get(), "referencia": e_ref.get()}
+
+                def salvo(_):
+                    INDICE_TELEFONES.adicionar(dados_cli[0], cliente["nome"])
+                    self.atualizar_indicador_fila()
                     messagebox.showinfo("Sucesso", "Dados atualizados!")
                     edit_win.destroy()
                     carregar_clientes(entry_busca.get())
-                except Exception as e:
-                    messagebox.showerror("Erro", f"Falha ao salvar:\n{e}")
+
+                self.no_banco(SERVICO.gravar_cadastro, cliente, ao_concluir=salvo,
+                              descricao="Editar cliente",
+                              ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha ao salvar:\n{e}"))
 
             ctk.CTkButton(edit_win, text="SALVAR ALTERAÇÕES", command=salvar_edicao, fg_color="#27AE60", text_color="white").pack(pady=20)
 
@@ -1084,54 +1433,105 @@ class App(ctk.CTk):
             e_dias.pack(fill="x", padx=20)
             
             def salvar_lembrete_manual():
-                med = e_med.get()
-                dias = e_dias.get()
-                if not med or not dias.isdigit():
+                lembrete = lembrete_de(e_med.get(), e_dias.get())
+                if lembrete is None:
                     messagebox.showwarning("Erro", "Preencha corretamente.")
                     return
-                hoje_dt = datetime.now()
-                d_int = int(dias)
-                data_aviso = (hoje_dt + timedelta(days=d_int-3)).strftime("%Y-%m-%d")
-                try:
-                    conn = sqlite3.connect(DB_PATH, timeout=10)
-                    cursor = conn.cursor()
-                    cursor.execute("INSERT INTO lembretes (cliente_tel, medicamento, data_aviso, status) VALUES (?, ?, ?, 'PENDENTE')", (dados_cli[0], med, data_aviso))
-                    conn.commit()
-                    conn.close()
+
+                def gravado(_):
                     messagebox.showinfo("Sucesso", "Lembrete agendado!")
                     lem_win.destroy()
                     self.verificar_avisos_hoje_silencioso()
-                except Exception as e:
-                    messagebox.showerror("Erro", f"Falha ao salvar:\n{e}")
+
+                self.no_banco(SERVICO.agendar_lembrete, dados_cli[0], lembrete, ao_concluir=gravado,
+                              descricao="Agendar lembrete",
+                              ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha ao salvar:\n{e}"))
 
             ctk.CTkButton(lem_win, text="AGENDAR", command=salvar_lembrete_manual, fg_color="#8E44AD", text_color="white").pack(pady=20)
 
+        entry_busca.bind("<KeyRelease>", agendar_busca)
         entry_busca.bind("<Return>", lambda event: carregar_clientes(entry_busca.get()))
         btn_buscar = ctk.CTkButton(frame_busca, text="🔍", width=50, command=lambda: carregar_clientes(entry_busca.get()), text_color="white")
         btn_buscar.pack(side="right")
-        carregar_clientes()
+        ctk.CTkButton(frame_busca, text="📤 EXPORTAR", width=100, fg_color="#8E44AD", text_color="white",
+                      command=lambda: self.exportar_clientes_csv()).pack(side="right", padx=(0, 5))
+        ctk.CTkButton(frame_busca, text="📥 IMPORTAR", width=100, fg_color="#3498DB", text_color="white",
+                      command=lambda: self.importar_clientes_csv(lambda: carregar_clientes(entry_busca.get()))
+                      ).pack(side="right", padx=(0, 5))
+
+        def ao_abrir():
+            # Cada abertura começa com a busca vazia (lista inicial por nome)
+            if busca["agendada"] is not None:
+                top.after_cancel(busca["agendada"])
+                busca["agendada"] = None
+            entry_busca.delete(0, "end")
+            entry_busca.focus_set()
+            carregar_clientes()
+
+        return ao_abrir
+
+    def importar_clientes_csv(self, ao_terminar):
+        """Cadastro vindo de outro PDV (CSV); linhas recusadas vão para <arquivo>_erros.csv"""
+        origem = filedialog.askopenfilename(title="Importar Clientes",
+                                            filetypes=[("Arquivo CSV", "*.csv *.txt"), ("Todos", "*.*")])
+        if not origem:
+            return
+
+        def importar():
+            resumo = importar_clientes(BANCO, origem)
+            if resumo["erros"]:
+                resumo["relatorio"] = os.path.splitext(origem)[0] + "_erros.csv"
+                gravar_erros_csv(resumo["relatorio"], resumo["erros"])
+            SERVICO.sincronizar_replica()
+            INDICE_TELEFONES.sincronizar(SERVICO.leitura().conexao())
+            return resumo
+
+        def importado(resumo):
+            texto = (f"{resumo['lidas']} linhas lidas em {resumo['segundos']:.1f}s\n\n"
+                     f"Gravados (novos ou alterados): {resumo['gravadas']}\n"
+                     f"Já estavam iguais: {resumo['sem_alteracao']}\n"
+                     f"Recusados: {resumo['recusadas']}")
+            if resumo["erros"]:
+                texto += "\n\n" + "\n".join(f"Linha {linha}: {motivo}" for linha, motivo in resumo["erros"][:8])
+                texto += f"\n\nLista completa em:\n{resumo['relatorio']}"
+            messagebox.showinfo("Importação concluída", texto)
+            ao_terminar()
+
+        self.no_banco(importar, ao_concluir=importado, descricao="Importar clientes",
+                      ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha na importação:\n{e}"))
+
+    def exportar_clientes_csv(self):
+        destino = filedialog.asksaveasfilename(title="Exportar Clientes", defaultextension=".csv",
+                                               filetypes=[("Arquivo CSV", "*.csv")],
+                                               initialfile=f"Clientes_{datetime.now().strftime('%d-%m-%Y')}.csv")
+        if not destino:
+            return
+        self.no_banco(exportar_clientes, BANCO, destino, descricao="Exportar clientes",
+                      ao_concluir=lambda qtd: messagebox.showinfo("Sucesso", f"{qtd} clientes exportados!\n\n{destino}"),
+                      ao_falhar=lambda e: messagebox.showerror("Erro", f"Erro ao exportar:\n{e}"))
 
     # ================== FUNÇÕES DE SUPORTE ==================
     def limpar_telefone(self, tel):
-        numeros = "".join(filter(str.isdigit, tel))
-        tam = len(numeros)
-        if tam == 8 or tam == 9: 
-            return f"{DDD_PADRAO}{numeros}"
-        return numeros
+        return limpar_telefone(tel)
 
     def formatar_telefone_visual(self, tel):
-        numeros = "".join(filter(str.isdigit, tel))
-        if len(numeros) == 11: 
-            return f"({numeros[:2]}) {numeros[2:7]}-{numeros[7:]}"
-        elif len(numeros) == 10: 
-            return f"({numeros[:2]}) {numeros[2:6]}-{numeros[6:]}"
-        return tel
+        return formatar_telefone(tel)
 
     def formatar_float(self, valor_str):
-        try: 
-            return float(valor_str.replace(",", ".").strip())
-        except: 
-            return 0.0
+        return texto_para_reais(valor_str)
+
+    def cliente_da_tela(self):
+        return cliente_de(self.entry_tel.get(), self.entry_nome.get(), self.entry_rua.get(), self.entry_num.get(),
+                          self.entry_bairro.get(), self.entry_ref.get())
+
+    def pagamento_da_tela(self):
+        """Formas e valores de pagamento no formato de servico_pedidos"""
+        forma1 = self.combo_pag1.get()
+        partes = [(forma1, self.combo_parcelas1.get(), self.formatar_float(self.entry_val_pag1.get()))]
+        if self.chk_pagamento_duplo.get() == 1:
+            partes.append((self.combo_pag2.get(), self.combo_parcelas2.get(),
+                           self.formatar_float(self.entry_val_pag2.get())))
+        return {"partes": partes, "recebido": self.formatar_float(self.entry_troco.get())}
 
     def toggle_lembrete(self):
         if self.chk_lembrete.get() == 1:
@@ -1142,6 +1542,8 @@ class App(ctk.CTk):
             self.entry_dias_duracao.pack_forget()
 
     def limpar_tela(self):
+        self._ultimo_tel_buscado = None
+        self.esconder_sugestoes()
         self.entry_tel.delete(0, "end")
         self.entry_nome.delete(0, "end")
         self.entry_rua.delete(0, "end")
@@ -1172,20 +1574,83 @@ class App(ctk.CTk):
         # Reset entregador
         self.var_entregador.set("Entregador A")
 
+    # ================== SUGESTÕES DE TELEFONE ==================
+    def sincronizar_indice_telefones(self):
+        """Traz clientes cadastrados por outros terminais (em segundo plano)"""
+        self.no_banco(lambda: INDICE_TELEFONES.sincronizar(SERVICO.leitura().conexao()),
+                      chave="sincronizar_indice", descricao="Sincronizar índice de telefones")
+        self.after(INTERVALO_SYNC_INDICE, self.sincronizar_indice_telefones)
+
+    def sugerir_telefones(self, event=None):
+        if event is not None and event.keysym in ("Return", "Escape", "Tab"):
+            return
+        digitos = "".join(filter(str.isdigit, self.entry_tel.get()))
+        if len(digitos) < 4 or not INDICE_TELEFONES.carregado:
+            self.esconder_sugestoes()
+            return
+        
+        sugestoes = INDICE_TELEFONES.por_prefixo(digitos, limite=len(self.botoes_sugestao))
+        # Digitado sem DDD: completa com os números do DDD padrão
+        if len(sugestoes) < len(self.botoes_sugestao) and not digitos.startswith(DDD_PADRAO):
+            restante = len(self.botoes_sugestao) - len(sugestoes)
+            sugestoes += INDICE_TELEFONES.por_prefixo(DDD_PADRAO + digitos, limite=restante)
+        
+        if not sugestoes:
+            self.esconder_sugestoes()
+            return
+        
+        for btn in self.botoes_sugestao:
+            btn.pack_forget()
+        for btn, (tel, nome) in zip(self.botoes_sugestao, sugestoes):
+            btn.configure(text=f"{self.formatar_telefone_visual(tel)}  -  {nome}",
+                          command=lambda t=tel: self.usar_sugestao(t))
+            btn.pack(fill="x", padx=2, pady=1)
+        self.frame_sugestoes.place(in_=self.entry_tel, relx=0, rely=1, relwidth=1, y=2)
+        self.frame_sugestoes.lift()
+
+    def esconder_sugestoes(self):
+        self.frame_sugestoes.place_forget()
+
+    def usar_sugestao(self, telefone):
+        self.esconder_sugestoes()
+        self.entry_tel.delete(0, "end")
+        self.entry_tel.insert(0, self.formatar_telefone_visual(telefone))
+        self.buscar_cliente()
+
+    def ao_sair_telefone(self, event=None):
+        # Atraso para o clique numa sugestão chegar antes de escondê-la
+        self.after(150, self.esconder_sugestoes)
+        self.buscar_cliente(event)
+
+    @instrumentacao.cronometrado("buscar_cliente")
     def buscar_cliente(self, event=None):
         tel_bruto = self.entry_tel.get()
         if not tel_bruto.strip(): 
             return
         tel_limpo = self.limpar_telefone(tel_bruto)
+        self.esconder_sugestoes()
         
-        try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            cursor.execute("SELECT nome, rua, numero, bairro, referencia FROM clientes WHERE telefone = ?", (tel_limpo,))
-            res = cursor.fetchone()
-            conn.close()
-        except: 
-            res = None
+        # Mesmo número da última busca (ex.: Enter seguido de FocusOut): nada a fazer
+        if tel_limpo == self._ultimo_tel_buscado:
+            return
+        self._ultimo_tel_buscado = tel_limpo
+        
+        if INDICE_TELEFONES.certamente_ausente(tel_limpo):
+            self.preencher_cliente(tel_limpo, None)
+            return
+
+        self.no_banco(SERVICO.buscar_cliente, tel_limpo,
+                      chave="buscar_cliente", descricao="Buscar cliente",
+                      ao_concluir=lambda res: self.preencher_cliente(tel_limpo, res),
+                      ao_falhar=lambda e: self.preencher_cliente(tel_limpo, None))
+
+    def preencher_cliente(self, tel_limpo, res):
+        """Retorno de buscar_cliente: preenche a tela se o telefone ainda é o mesmo"""
+        if self.limpar_telefone(self.entry_tel.get()) != tel_limpo:
+            return   # O atendente já digitou outro número
+        if not res:
+            # Cliente novo cujo primeiro pedido ainda está na fila de gravação
+            res = SERVICO.cliente_na_fila(tel_limpo)
         
         if res:
             self.entry_nome.delete(0, "end")
@@ -1210,327 +1675,290 @@ class App(ctk.CTk):
             self.entry_nome.focus_set()
 
     def atualizar_totais(self, event=None):
-        val_prod = self.formatar_float(self.entry_val.get())
-        val_taxa = self.formatar_float(self.entry_taxa.get())
+        # Soma em centavos inteiros: evita diferença de 1 centavo por arredondamento
+        cent_prod = texto_para_centavos(self.entry_val.get())
+        cent_taxa = texto_para_centavos(self.entry_taxa.get())
         if event:
             self.entry_val.delete(0, "end")
-            self.entry_val.insert(0, f"{val_prod:.2f}")
+            self.entry_val.insert(0, formatar_centavos(cent_prod))
             self.entry_taxa.delete(0, "end")
-            self.entry_taxa.insert(0, f"{val_taxa:.2f}")
-        total = val_prod + val_taxa
-        self.lbl_total.configure(text=f"TOTAL: R$ {total:.2f}")
-        return total
+            self.entry_taxa.insert(0, formatar_centavos(cent_taxa))
+        self.total_centavos = cent_prod + cent_taxa
+        self.lbl_total.configure(text=f"TOTAL: R$ {formatar_centavos(self.total_centavos)}")
+        return self.total_centavos / 100
 
     def fazer_backup_seguranca(self):
-        try:
-            db_origem = DB_PATH
-            if not os.path.exists(db_origem):
-                messagebox.showerror("Erro", "Banco de dados não encontrado.")
+        """Backup online (API de backup do SQLite) comprimido, com barra de progresso"""
+        if BANCO.modo == "servidor":
+            # O arquivo está no servidor: o backup é feito lá, na pasta de backups dele
+            if not messagebox.askyesno("Backup", "O banco está no servidor.\nFazer agora o backup na pasta de backups do servidor?"):
+                return
+            destino = None
+        else:
+            destino = filedialog.asksaveasfilename(title="Salvar Backup de Segurança", initialfile=nome_backup(),
+                                               defaultextension=".gz", filetypes=[("Backup comprimido", "*.db.gz")])
+            if not destino:
                 return
-            hoje_str = datetime.now().strftime("%Y-%m-%d_%H%M")
-            nome_sugerido = f"backup_totalpharma_{hoje_str}.db"
-            destino = filedialog.asksaveasfilename(title="Salvar Backup de Segurança", initialfile=nome_sugerido, defaultextension=".db", filetypes=[("Arquivo de Banco de Dados", "*.db")])
-            if destino:
-                shutil.copy2(db_origem, destino)
-                messagebox.showinfo("Sucesso", f"Backup realizado com sucesso!\n\nSalvo em:\n{destino}")
-        except Exception as e:
-            messagebox.showerror("Erro Backup", f"Não foi possível fazer o backup:\n{e}")
 
-    def salvar_apenas_cliente(self):
-        tel_limpo = self.limpar_telefone(self.entry_tel.get())
-        nome = self.entry_nome.get().strip()
-        
-        if not tel_limpo or not nome:
-            messagebox.showwarning("Aviso", "Para cadastrar, preencha pelo menos Telefone e Nome.")
+        janela = ctk.CTkToplevel(self)
+        janela.title("Backup")
+        janela.geometry("380x130")
+        janela.attributes("-topmost", True)
+        lbl_etapa = ctk.CTkLabel(janela, text="Iniciando backup...")
+        lbl_etapa.pack(pady=(20, 10))
+        barra = ctk.CTkProgressBar(janela, width=320)
+        barra.set(0)
+        barra.pack()
+
+        if destino is None:
+            tarefa = TarefaBackup(BANCO.fazer_backup).iniciar()
+        else:
+            tarefa = TarefaBackup(fazer_backup, DB_PATH, destino).iniciar()
+        etapas = {"servidor": "Backup em andamento no servidor...","iniciando": "Iniciando backup...", "copiando": "Copiando páginas do banco...",
+                  "comprimindo": "Comprimindo...", "verificando": "Verificando o backup..."}
+
+        def acompanhar():
+            if not tarefa.concluida:
+                lbl_etapa.configure(text=etapas.get(tarefa.etapa, tarefa.etapa))
+                barra.set(tarefa.fracao)
+                self.after(100, acompanhar)
+                return
+            janela.destroy()
+            if tarefa.erro:
+                messagebox.showerror("Erro Backup", f"Não foi possível fazer o backup:\n{tarefa.erro}")
+                return
+            r = tarefa.resultado
+            messagebox.showinfo("Sucesso", f"Backup realizado e verificado!\n\n"
+                                           f"Tamanho: {r['tamanho_original'] / 1048576:.1f} MB → {r['tamanho_comprimido'] / 1048576:.1f} MB\n"
+                                           f"Tempo: {r['duracao']:.1f}s\n\nSalvo em:\n{r['arquivo']}")
+
+        acompanhar()
+
+    def verificar_backup_agendado(self):
+        """Depois do HORARIO_BACKUP, faz o backup do dia na pasta local (uma tentativa por dia)"""
+        self.after(INTERVALO_AGENDA_BACKUP, self.verificar_backup_agendado)
+        if BANCO.modo == "servidor":
+            return   # O servidor_banco faz o backup do fechamento
+        if not HORARIO_BACKUP or datetime.now().strftime("%H:%M") < HORARIO_BACKUP:
             return
-        
-        # Validação extra
-        if len(tel_limpo) < 10 or len(tel_limpo) > 11:
-            messagebox.showwarning("Aviso", f"Telefone inválido: {tel_limpo} ({len(tel_limpo)} dígitos)\nEsperado: 10 ou 11 dígitos.")
+        hoje = datetime.now().date()
+        if self._backup_agendado_tentado == hoje or backup_do_dia_existe(PASTA_BACKUPS, hoje):
             return
-            
-        rua = self.entry_rua.get().strip()
-        num = self.entry_num.get().strip()
-        bairro = self.entry_bairro.get().strip()
-        ref = self.entry_ref.get().strip()
-        
-        conn = None
+        self._backup_agendado_tentado = hoje
+        tarefa = TarefaBackup(backup_agendado, DB_PATH, PASTA_BACKUPS).iniciar()
+
+        def acompanhar():
+            if not tarefa.concluida:
+                self.after(1000, acompanhar)
+            elif tarefa.erro:
+                print(f"[BACKUP] Backup automático falhou: {tarefa.erro}")
+            else:
+                r = tarefa.resultado
+                print(f"[BACKUP] Automático: {r['arquivo']} ({r['duracao']:.1f}s, {len(r['apagados'])} antigos removidos)")
+
+        acompanhar()
+
+    # ================== MANUTENÇÃO ==================
+    def registrar_atividade(self, event=None):
+        self._ultima_atividade = time.monotonic()
+
+    def verificar_manutencao(self):
+        """Com o terminal parado, roda checkpoint, incremental_vacuum e quick_check em segundo plano"""
+        self.after(INTERVALO_MANUTENCAO, self.verificar_manutencao)
+        if BANCO.modo == "servidor":
+            return   # A manutenção roda no servidor_banco
+        if self._offline or self.executor.pendentes:
+            return
+        if time.monotonic() - self._ultima_atividade < OCIOSO_MANUTENCAO:
+            return
+        # VACUUM completo (conversão de banco antigo) só no horário de fechamento
+        fechamento = bool(HORARIO_BACKUP) and datetime.now().strftime("%H:%M") >= HORARIO_BACKUP
+
+        def concluido(executadas):
+            if executadas:
+                print(f"[MANUTENCAO] Executado: {', '.join(executadas)}")
+
+        self.no_banco(MANUTENCAO.executar_pendentes, ORCAMENTO_MANUTENCAO, fechamento,
+                      ao_concluir=concluido, chave="manutencao", descricao="Manutenção", silenciosa=True)
+
+    def salvar_apenas_cliente(self):
+        cliente = self.cliente_da_tela()
         try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            
-            # Verifica se já existe
-            cursor.execute("SELECT nome FROM clientes WHERE telefone = ?", (tel_limpo,))
-            existente = cursor.fetchone()
-            
-            cursor.execute("INSERT OR REPLACE INTO clientes (telefone, nome, rua, numero, bairro, referencia) VALUES (?, ?, ?, ?, ?, ?)", 
-                           (tel_limpo, nome, rua, num, bairro, ref))
-            conn.commit()
+            validar_cliente(cliente)
+        except DadosInvalidos as e:
+            messagebox.showwarning("Aviso", str(e))
+            return
+        nome = cliente["nome"]
+
+        def gravado(existente):
+            INDICE_TELEFONES.adicionar(cliente["telefone"], nome)
+            self.atualizar_indicador_fila()
             
             if existente:
                 messagebox.showinfo("Sucesso", f"Cliente {nome} ATUALIZADO!")
             else:
                 messagebox.showinfo("Sucesso", f"Cliente {nome} CADASTRADO com sucesso!")
-                
-        except sqlite3.IntegrityError as e:
-            messagebox.showerror("Erro de Integridade", f"Telefone já existe ou dado inválido:\n{e}")
-        except sqlite3.OperationalError as e:
-            messagebox.showerror("Erro Operacional", f"Banco pode estar corrompido ou bloqueado:\n{e}")
-        except Exception as e:
-            messagebox.showerror("Erro BD", f"Erro inesperado:\n{type(e).__name__}: {e}")
-        finally:
-            if conn:
-                conn.close()
+
+        def falhou(e):
+            if isinstance(e, sqlite3.IntegrityError):
+                messagebox.showerror("Erro de Integridade", f"Telefone já existe ou dado inválido:\n{e}")
+            elif erro_de_lock(e):
+                messagebox.showerror("Banco ocupado", MENSAGEM_BANCO_OCUPADO)
+            elif isinstance(e, sqlite3.OperationalError):
+                messagebox.showerror("Erro Operacional", f"Banco pode estar corrompido ou bloqueado:\n{e}")
+            else:
+                messagebox.showerror("Erro BD", f"Erro inesperado:\n{type(e).__name__}: {e}")
+
+        self.no_banco(SERVICO.salvar_cliente, cliente, ao_concluir=gravado, ao_falhar=falhou, descricao="Salvar cliente")
 
     def imprimir_apenas_endereco(self):
-        if not WINDOWS_PRINT_AVAILABLE:
+        if IMPRESSAO.impressora.nome == "nula":
             messagebox.showwarning("Aviso", "Impressão não disponível neste sistema.")
             return
             
-        tel_limpo = self.limpar_telefone(self.entry_tel.get())
-        nome = self.entry_nome.get().strip()
-        if not tel_limpo or not nome:
+        cliente = self.cliente_da_tela()
+        if not cliente["telefone"] or not cliente["nome"]:
             messagebox.showwarning("Aviso", "Preencha dados do cliente.")
             return
-        rua = self.entry_rua.get().strip()
-        num = self.entry_num.get().strip()
-        bairro = self.entry_bairro.get().strip()
-        ref = self.entry_ref.get().strip()
-        tel_fmt = self.formatar_telefone_visual(tel_limpo)
-        rua_wrap = textwrap.fill(f"{rua}, {num}", width=LARGURA_PAPEL)
-        bairro_wrap = textwrap.fill(f"Bairro: {bairro}", width=LARGURA_PAPEL)
-        ref_wrap = textwrap.fill(f"Obs: {ref}", width=LARGURA_PAPEL)
-
-        texto = "-" * 32 + "\n       ENTREGA RAPIDA\n" + "-" * 32 + "\n"
-        texto += f"CLI: {nome}\nTEL: {tel_fmt}\n" + "-" * 32 + "\n"
-        texto += f"{rua_wrap}\n{bairro_wrap}\n\n"
-        if ref: 
-            texto += f"{ref_wrap}\n"
-        texto += "-" * 32 + "\n" + f"MOTO: {self.var_entregador.get()}\n" + "-" * 32 + "\n"
-        self.imprimir_via_windows_gdi(texto)
-
-    def imprimir_via_windows_gdi(self, texto_cupom):
-        if not WINDOWS_PRINT_AVAILABLE:
-            messagebox.showwarning("Aviso", "Impressão não disponível neste sistema.")
-            return
-            
-        try:
-            hDC = win32ui.CreateDC()
-            hDC.CreatePrinterDC(win32print.GetDefaultPrinter())
-            hDC.StartDoc("Cupom TotalPharma")
-            hDC.StartPage()
-            
-            font_dict = {'name': 'Courier New', 'height': 26, 'weight': 600} 
-            font = win32ui.CreateFont(font_dict)
-            hDC.SelectObject(font)
-            
-            y = 50
-            for linha in texto_cupom.split("\n"):
-                hDC.TextOut(10, y, linha)
-                y += 28 
-                
-            hDC.TextOut(10, y + 50, ".")
-            hDC.EndPage()
-            hDC.EndDoc()
-            hDC.DeleteDC()
-        except Exception as e:
-            messagebox.showerror("Erro GDI", f"Erro na impressão:\n{e}")
-
+        entregador = self.var_entregador.get()
+        IMPRESSAO.enfileirar(texto_etiqueta(cliente, entregador), tipo="etiqueta", resumo=cliente["nome"],
+                             campos=campos_etiqueta(cliente, entregador))
+
+    # ================== IMPRESSÕES COM FALHA ==================
+    def ver_falhas_impressao(self):
+        self.janelas.abrir("impressoes", "Impressões com Falha", "700x500", self.montar_falhas_impressao)
+
+    def montar_falhas_impressao(self, top):
+        ctk.CTkLabel(top, text="IMPRESSÕES COM FALHA", font=("Arial", 20, "bold"), text_color="#E74C3C").pack(pady=10)
+
+        def criar_linha(frame):
+            frame_info = ctk.CTkFrame(frame, fg_color="transparent")
+            frame_info.pack(side="left", fill="x", expand=True, padx=10, pady=5)
+            lbl_titulo = ctk.CTkLabel(frame_info, text="", font=("Arial", 14, "bold"), anchor="w")
+            lbl_titulo.pack(fill="x")
+            lbl_erro = ctk.CTkLabel(frame_info, text="", text_color="#BDC3C7", anchor="w")
+            lbl_erro.pack(fill="x")
+            btn_descartar = ctk.CTkButton(frame, text="🗑️", width=40, fg_color="#C0392B", text_color="white")
+            btn_descartar.pack(side="right", padx=5)
+            btn_reimprimir = ctk.CTkButton(frame, text="🖨️ REIMPRIMIR", width=120, fg_color="#27AE60", text_color="white")
+            btn_reimprimir.pack(side="right", padx=5)
+            return lbl_titulo, lbl_erro, btn_reimprimir, btn_descartar
+
+        def preencher_linha(partes, trabalho, indice):
+            lbl_titulo, lbl_erro, btn_reimprimir, btn_descartar = partes
+            quando = datetime.fromtimestamp(trabalho["criado"]).strftime("%d/%m %H:%M")
+            lbl_titulo.configure(text=f"{quando}  {trabalho['tipo'].upper()}  {trabalho['resumo']}")
+            lbl_erro.configure(text=trabalho.get("erro", "")[:90])
+            btn_reimprimir.configure(command=lambda: reimprimir([trabalho["id"]]))
+            btn_descartar.configure(command=lambda: descartar(trabalho["id"]))
+
+        def reimprimir(ids):
+            for id_trabalho in ids:
+                IMPRESSAO.reimprimir(id_trabalho)
+            carregar()
+            self.atualizar_indicador_impressao()
+
+        def descartar(id_trabalho):
+            if messagebox.askyesno("Confirmar", "Descartar esta impressão sem imprimir?"):
+                IMPRESSAO.descartar(id_trabalho)
+                carregar()
+                self.atualizar_indicador_impressao()
+
+        def carregar():
+            lista.mostrar(IMPRESSAO.falhas())
+
+        ctk.CTkButton(top, text="🖨️ REIMPRIMIR TODAS", fg_color="#27AE60", text_color="white",
+                      command=lambda: reimprimir([trabalho["id"] for trabalho in reversed(IMPRESSAO.falhas())])
+                      ).pack(pady=(0, 5))
+        lista = ListaVirtual(top, 70, criar_linha, preencher_linha, texto_vazio="Nenhuma impressão com falha.")
+        lista.pack(fill="both", expand=True, padx=10, pady=10)
+        return carregar
+
+    @instrumentacao.cronometrado("finalizar")
     def finalizar(self):
-        tel_limpo = self.limpar_telefone(self.entry_tel.get())
-        nome = self.entry_nome.get().strip()
-        if not tel_limpo or not nome:
-            messagebox.showwarning("Aviso", "Preencha Telefone e Nome.")
-            return
-        rua = self.entry_rua.get().strip()
-        num = self.entry_num.get().strip()
-        bairro = self.entry_bairro.get().strip()
-        ref = self.entry_ref.get().strip()
-        total = self.atualizar_totais()
-        if total <= 0:
-            messagebox.showwarning("Aviso", "Valor total zerado.")
-            return
-
-        salvar_lembrete = False
-        data_aviso = None
-        med_nome = ""
+        self.atualizar_totais()
+        lembrete = None
         if self.chk_lembrete.get() == 1:
-            med_nome = self.entry_med_nome.get().strip()
-            dias_duracao = self.entry_dias_duracao.get().strip()
-            if med_nome and dias_duracao.isdigit():
-                hoje_dt = datetime.now()
-                dias = int(dias_duracao)
-                data_aviso = (hoje_dt + timedelta(days=dias-3)).strftime("%Y-%m-%d")
-                salvar_lembrete = True
-
-        # --- Lógica de Pagamento ---
-        pag_desc = ""
-        pag_resumo_bd = "" 
-        
-        forma1 = self.combo_pag1.get()
-        if self.chk_pagamento_duplo.get() == 0:
-            # Pagamento Único
-            if forma1 == "Cartão":
-                parc = self.combo_parcelas1.get()
-                pag_desc = f"PAGAMENTO: Cartão ({parc})"
-                pag_resumo_bd = f"Cartão ({parc})"
-            else:
-                pag_desc = f"PAGAMENTO: {forma1.upper()}"
-                pag_resumo_bd = forma1
-                
-            if forma1 == "Dinheiro":
-                pago = self.formatar_float(self.entry_troco.get())
-                troco = pago - total
-                if troco > 0: 
-                    pag_desc += f"\nDinheiro: R$ {pago:.2f} | Troco: R$ {troco:.2f}"
-                else: 
-                    pag_desc += "\nSem Troco"
-        else:
-            # Pagamento Duplo
-            val1 = self.formatar_float(self.entry_val_pag1.get())
-            parc1 = self.combo_parcelas1.get() if forma1 == "Cartão" else ""
-            desc1 = f"{forma1} {parc1}"
-            
-            forma2 = self.combo_pag2.get()
-            val2 = self.formatar_float(self.entry_val_pag2.get())
-            parc2 = self.combo_parcelas2.get() if forma2 == "Cartão" else ""
-            desc2 = f"{forma2} {parc2}"
-            
-            pag_desc = "PAGAMENTO MISTO:"
-            pag_desc += f"\n1) {desc1}: R$ {val1:.2f}"
-            pag_desc += f"\n2) {desc2}: R$ {val2:.2f}"
-            pag_resumo_bd = f"Misto: {desc1}/{desc2}"
-            
-            if "Dinheiro" in [forma1, forma2]:
-                pago = self.formatar_float(self.entry_troco.get())
-                soma_din = 0
-                if forma1 == "Dinheiro": 
-                    soma_din += val1
-                if forma2 == "Dinheiro": 
-                    soma_din += val2
-                if pago > soma_din:
-                    pag_desc += f"\nTroco: R$ {pago - soma_din:.2f}"
-
-        # --- Cupom ---
-        tel_fmt = self.formatar_telefone_visual(tel_limpo)
-        sep = "-" * 32 
-        rua_wrap = textwrap.fill(f"{rua}, {num}", width=LARGURA_PAPEL)
-        bairro_wrap = textwrap.fill(f"Bairro: {bairro}", width=LARGURA_PAPEL)
-        ref_wrap = textwrap.fill(f"Obs: {ref}", width=LARGURA_PAPEL)
-        dt_hora = datetime.now().strftime('%d/%m/%Y %H:%M')
-
-        cupom = f"""
-     FARMACIA TOTALPHARMA
-{dt_hora}
-{sep}
-CLIENTE: {nome}
-TEL: {tel_fmt}
-{sep}
-ENTREGA:
-{rua_wrap}
-{bairro_wrap}
-
-{ref_wrap}
-{sep}
-MOTOBOY: {self.var_entregador.get()}
-{sep}
-VALORES:
-Prod:  R$ {self.formatar_float(self.entry_val.get()):.2f}
-Taxa:  R$ {self.formatar_float(self.entry_taxa.get()):.2f}
-TOTAL: R$ {total:.2f}
-{sep}
-{pag_desc}
-{sep}
-
-   Obrigado pela preferencia!
-"""
-        conn = None
+            lembrete = lembrete_de(self.entry_med_nome.get(), self.entry_dias_duracao.get())
         try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            
-            cursor.execute("INSERT OR REPLACE INTO clientes (telefone, nome, rua, numero, bairro, referencia) VALUES (?, ?, ?, ?, ?, ?)", 
-                           (tel_limpo, nome, rua, num, bairro, ref))
-                           
-            cursor.execute("SELECT rua, numero FROM historico_enderecos WHERE telefone_cliente = ? ORDER BY id DESC LIMIT 1", (tel_limpo,))
-            ultimo = cursor.fetchone()
-            if not ultimo or (ultimo[0] != rua or ultimo[1] != num):
-                 cursor.execute("INSERT INTO historico_enderecos (telefone_cliente, rua, numero, bairro, referencia, ultimo_uso) VALUES (?, ?, ?, ?, ?, ?)",
-                                (tel_limpo, rua, num, bairro, ref, datetime.now().strftime("%Y-%m-%d")))
-
-            cursor.execute("INSERT INTO pedidos (data, cliente_tel, entregador, valor_total, metodo_pagamento, detalhes_pagamento) VALUES (?, ?, ?, ?, ?, ?)", 
-                           (datetime.now().strftime("%Y-%m-%d"), tel_limpo, self.var_entregador.get(), total, pag_resumo_bd, pag_desc))
-            
-            if salvar_lembrete:
-                cursor.execute("INSERT INTO lembretes (cliente_tel, medicamento, data_aviso, status) VALUES (?, ?, ?, 'PENDENTE')", 
-                               (tel_limpo, med_nome, data_aviso))
-            conn.commit()
-        except Exception as e:
-            messagebox.showerror("Erro BD", str(e))
-        finally:
-            if conn:
-                conn.close()
-
-        if WINDOWS_PRINT_AVAILABLE:
-            self.imprimir_via_windows_gdi(cupom)
+            pedido = montar_pedido(self.cliente_da_tela(), self.var_entregador.get(),
+                                   texto_para_centavos(self.entry_val.get()), texto_para_centavos(self.entry_taxa.get()),
+                                   self.pagamento_da_tela(), lembrete)
+        except DadosInvalidos as e:
+            messagebox.showwarning("Aviso", str(e))
+            return
+
+        # Primeiro o diário local (fsync, aqui mesmo: é só um arquivo local), depois o cupom.
+        # Gravação direta (sem diário) e réplica vão em segundo plano; na abertura
+        # esperam o banco ficar pronto (a réplica pode ainda não existir)
+        na_fila = SERVICO.enfileirar_pedido(pedido)
+        self.atualizar_indicador_fila()
+
+        def registrado(_):
+            if not na_fila:
+                self.atualizar_painel_status()
+
+        self.no_banco(SERVICO.finalizar_pedido, pedido, na_fila, descricao="Gravar pedido", ao_concluir=registrado,
+                      ao_falhar=lambda e: messagebox.showerror(
+                          "Erro BD", MENSAGEM_BANCO_OCUPADO if erro_de_lock(e) else str(e)))
+        INDICE_TELEFONES.adicionar(pedido["telefone"], pedido["nome"])
+
+        IMPRESSAO.enfileirar(texto_cupom(pedido), resumo=pedido["nome"], campos=campos_cupom(pedido))
         self.limpar_tela()
-        self.atualizar_painel_status()
 
     def verificar_avisos_hoje_silencioso(self):
-        try:
-            hoje = datetime.now().strftime("%Y-%m-%d")
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            cursor.execute("SELECT count(*) FROM lembretes WHERE data_aviso <= ? AND status = 'PENDENTE'", (hoje,))
-            qtd = cursor.fetchone()[0]
-            conn.close()
+        def mostrar(qtd):
             if qtd > 0: 
                 self.btn_alertas.configure(fg_color="#E74C3C", text=f"🔔 {qtd} CLIENTES!", text_color="white") 
             else: 
                 self.btn_alertas.configure(fg_color="#555", text="🔔 RECOMPRAS", text_color="white")
-        except: 
-            pass
+            ABERTURA.marco("avisos de recompra")
 
-    def ver_alertas_recompra(self):
-        hoje = datetime.now().strftime("%Y-%m-%d")
-        try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            cursor.execute("SELECT l.id, c.nome, c.telefone, l.medicamento, l.data_aviso FROM lembretes l JOIN clientes c ON l.cliente_tel = c.telefone WHERE l.data_aviso <= ? AND l.status = 'PENDENTE'", (hoje,))
-            dados = cursor.fetchall()
-            conn.close()
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao carregar:\n{e}")
-            return
+        self.no_banco(SERVICO.contar_lembretes_vencidos, ao_concluir=mostrar,
+                      ao_falhar=lambda e: ABERTURA.marco("avisos de recompra"),
+                      chave="avisos_hoje", descricao="Contar avisos de hoje")
 
-        if not dados:
+    def ver_alertas_recompra(self):
+        self.no_banco(SERVICO.contar_lembretes_vencidos, ao_concluir=self.mostrar_alertas_recompra,
+                      chave="alertas_recompra", descricao="Alertas de recompra",
+                      ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha ao carregar:\n{e}"))
+
+    def buscar_pagina_lembretes(self, funcao, descricao):
+        """buscar_pagina da ListaVirtual para uma listagem paginada de lembretes do SERVICO"""
+        def buscar(inicio, quantidade, ao_chegar):
+            self.no_banco(lambda: funcao(inicio=inicio, quantidade=quantidade), ao_concluir=ao_chegar,
+                          ao_falhar=lambda e: ao_chegar(None), descricao=descricao)
+        return buscar
+
+    def mostrar_alertas_recompra(self, total):
+        if not total:
+            self.janelas.esconder("alertas")
             messagebox.showinfo("Tudo Certo", "Nenhum cliente para ligar hoje.")
             return
-            
-        top = ctk.CTkToplevel(self)
-        top.title("Gestão de Recompras")
-        top.geometry("700x500")
-        top.attributes("-topmost", True)
-        top.lift()
-        top.focus_force()
-        top.grab_set()
-        
-        scroll = ctk.CTkScrollableFrame(top)
-        scroll.pack(fill="both", expand=True, padx=10, pady=10)
-        
-        for id_lembrete, nome, tel, med, data in dados:
-            card = ctk.CTkFrame(scroll, fg_color="#444")
-            card.pack(fill="x", pady=5)
-            tel_fmt = self.formatar_telefone_visual(tel)
-            lbl_info = ctk.CTkLabel(card, text=f"{nome} ({tel_fmt})\nRemédio: {med}", font=("Arial", 14), anchor="w", justify="left")
+        self.janelas.abrir("alertas", "Gestão de Recompras", "700x500", self.montar_alertas_recompra, total)
+
+    def montar_alertas_recompra(self, top):
+        def criar_linha(frame):
+            lbl_info = ctk.CTkLabel(frame, text="", font=("Arial", 14), anchor="w", justify="left")
             lbl_info.pack(side="left", padx=10, pady=10)
-            
-            btn_zap = ctk.CTkButton(card, text="💬 WHATSAPP", width=120, fg_color="#25D366", text_color="white",
-                                    command=lambda n=nome, t=tel, m=med: self.abrir_whatsapp_recompra(n, t, m))
+            btn_zap = ctk.CTkButton(frame, text="💬 WHATSAPP", width=120, fg_color="#25D366", text_color="white")
             btn_zap.pack(side="right", padx=5)
-            btn_ok = ctk.CTkButton(card, text="✅ JÁ RESOLVI", width=120, fg_color="#27AE60", text_color="white", 
-                                   command=lambda i=id_lembrete, t=top: self.dar_baixa_lembrete(i, t))
+            btn_ok = ctk.CTkButton(frame, text="✅ JÁ RESOLVI", width=120, fg_color="#27AE60", text_color="white")
             btn_ok.pack(side="right", padx=5)
+            return lbl_info, btn_zap, btn_ok
+        
+        def preencher_linha(partes, lembrete, indice):
+            lbl_info, btn_zap, btn_ok = partes
+            id_lembrete, nome, tel, med, data = lembrete
+            tel_fmt = self.formatar_telefone_visual(tel)
+            lbl_info.configure(text=f"{nome} ({tel_fmt})\nRemédio: {med}")
+            btn_zap.configure(command=lambda: self.abrir_whatsapp_recompra(nome, tel, med))
+            btn_ok.configure(command=lambda: self.dar_baixa_lembrete(id_lembrete))
+        
+        lista = ListaVirtual(top, 70, criar_linha, preencher_linha, cor_linha="#444")
+        lista.pack(fill="both", expand=True, padx=10, pady=10)
+        buscar_pagina = self.buscar_pagina_lembretes(SERVICO.lembretes_vencidos, "Alertas de recompra (página)")
+        return lambda total: lista.carregar(total, buscar_pagina)
 
     def abrir_whatsapp_recompra(self, nome, telefone, remedio):
         numeros = "".join(filter(str.isdigit, telefone))
@@ -1540,58 +1968,57 @@ TOTAL: R$ {total:.2f}
         link = f"https://wa.me/{numeros}?text={urllib.parse.quote(msg)}"
         webbrowser.open(link)
 
-    def dar_baixa_lembrete(self, id_lembrete, janela):
-        try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            cursor.execute("UPDATE lembretes SET status = 'CONCLUIDO' WHERE id = ?", (id_lembrete,))
-            conn.commit()
-            conn.close()
-            janela.destroy()
+    def lembrete_provisorio(self, id_lembrete):
+        """Lembrete criado aqui que ainda não chegou ao servidor (id negativo na réplica)"""
+        if id_lembrete < 0:
+            messagebox.showinfo("Aguarde", "Este lembrete ainda não foi gravado no servidor.\nTente novamente quando a rede voltar.")
+            return True
+        return False
+
+    def dar_baixa_lembrete(self, id_lembrete):
+        if self.lembrete_provisorio(id_lembrete):
+            return
+
+        def gravado(_):
+            # Recarrega a mesma janela (ou fecha, se não sobrou ninguém)
             self.ver_alertas_recompra()
             self.verificar_avisos_hoje_silencioso()
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha:\n{e}")
+
+        self.no_banco(SERVICO.concluir_lembrete, id_lembrete, ao_concluir=gravado, descricao="Baixa de lembrete",
+                      ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha:\n{e}"))
 
     def listar_todos_agendamentos(self):
-        try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT l.id, c.nome, c.telefone, l.medicamento, l.data_aviso 
-                FROM lembretes l
-                JOIN clientes c ON l.cliente_tel = c.telefone
-                WHERE l.status = 'PENDENTE'
-                ORDER BY l.data_aviso ASC
-            """)
-            dados = cursor.fetchall()
-            conn.close()
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao carregar:\n{e}")
-            return
+        self.no_banco(SERVICO.contar_lembretes_pendentes,
+                      ao_concluir=self.mostrar_agendamentos, chave="agendamentos", descricao="Agendamentos futuros",
+                      ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha ao carregar:\n{e}"))
 
-        top = ctk.CTkToplevel(self)
-        top.title("Todos os Agendamentos Futuros")
-        top.geometry("700x600")
-        top.attributes("-topmost", True)
-        top.lift()
-        top.focus_force()
-        top.grab_set()
-        
+    def mostrar_agendamentos(self, total):
+        self.janelas.abrir("agendamentos", "Todos os Agendamentos Futuros", "700x600", self.montar_agendamentos, total)
+
+    def montar_agendamentos(self, top):
         ctk.CTkLabel(top, text="PRÓXIMAS RECOMPRAS", font=("Arial", 20, "bold"), text_color="#3498DB").pack(pady=10)
-        scroll = ctk.CTkScrollableFrame(top)
-        scroll.pack(fill="both", expand=True, padx=10, pady=10)
-        hoje = datetime.now().date()
+        estado = {"hoje": datetime.now().date()}
         
-        if not dados:
-            ctk.CTkLabel(scroll, text="Nenhum agendamento encontrado.").pack(pady=20)
-            return
-
-        for id_lembrete, nome, tel, med, data_str in dados:
-            card = ctk.CTkFrame(scroll, fg_color="#2C3E50")
-            card.pack(fill="x", pady=5)
+        def criar_linha(frame):
+            frame_info = ctk.CTkFrame(frame, fg_color="transparent")
+            frame_info.pack(side="left", padx=10, pady=5)
+            lbl_nome = ctk.CTkLabel(frame_info, text="", font=("Arial", 14, "bold"))
+            lbl_nome.pack(anchor="w")
+            lbl_remedio = ctk.CTkLabel(frame_info, text="", text_color="#BDC3C7")
+            lbl_remedio.pack(anchor="w")
+            lbl_status = ctk.CTkLabel(frame, text="", font=("Arial", 13, "bold"))
+            lbl_status.pack(side="left", padx=20)
+            btn_apagar = ctk.CTkButton(frame, text="🗑️", width=40, fg_color="#C0392B", text_color="white")
+            btn_apagar.pack(side="right", padx=5)
+            btn_zap = ctk.CTkButton(frame, text="💬", width=40, fg_color="#25D366", text_color="white")
+            btn_zap.pack(side="right", padx=5)
+            return lbl_nome, lbl_remedio, lbl_status, btn_apagar, btn_zap
+        
+        def preencher_linha(partes, lembrete, indice):
+            lbl_nome, lbl_remedio, lbl_status, btn_apagar, btn_zap = partes
+            id_lembrete, nome, tel, med, data_str = lembrete
             data_alvo = datetime.strptime(data_str, "%Y-%m-%d").date()
-            dias_restantes = (data_alvo - hoje).days
+            dias_restantes = (data_alvo - estado["hoje"]).days
             
             if dias_restantes < 0:
                 cor_status = "#E74C3C"
@@ -1603,32 +2030,36 @@ TOTAL: R$ {total:.2f}
                 cor_status = "#27AE60"
                 texto_status = f"Faltam {dias_restantes} dias ({data_alvo.strftime('%d/%m')})"
 
-            frame_info = ctk.CTkFrame(card, fg_color="transparent")
-            frame_info.pack(side="left", padx=10, pady=5)
-            tel_fmt = self.formatar_telefone_visual(tel)
-            ctk.CTkLabel(frame_info, text=f"{nome}", font=("Arial", 14, "bold")).pack(anchor="w")
-            ctk.CTkLabel(frame_info, text=f"Remédio: {med}", text_color="#BDC3C7").pack(anchor="w")
-            ctk.CTkLabel(card, text=texto_status, text_color=cor_status, font=("Arial", 13, "bold")).pack(side="left", padx=20)
-            
-            btn_apagar = ctk.CTkButton(card, text="🗑️", width=40, fg_color="#C0392B", text_color="white", command=lambda i=id_lembrete, t=top: self.apagar_lembrete(i, t))
-            btn_apagar.pack(side="right", padx=5)
+            lbl_nome.configure(text=f"{nome}")
+            lbl_remedio.configure(text=f"Remédio: {med}")
+            lbl_status.configure(text=texto_status, text_color=cor_status)
+            btn_apagar.configure(command=lambda: self.apagar_lembrete(id_lembrete))
             if dias_restantes <= 0:
-                btn_zap = ctk.CTkButton(card, text="💬", width=40, fg_color="#25D366", text_color="white", command=lambda n=nome, tele=tel, m=med: self.abrir_whatsapp_recompra(n, tele, m))
-                btn_zap.pack(side="right", padx=5)
+                btn_zap.configure(command=lambda: self.abrir_whatsapp_recompra(nome, tel, med))
+                btn_zap.pack(side="right", padx=5, after=btn_apagar)
+            else:
+                btn_zap.pack_forget()
+        
+        lista = ListaVirtual(top, 70, criar_linha, preencher_linha, texto_vazio="Nenhum agendamento encontrado.")
+        lista.pack(fill="both", expand=True, padx=10, pady=10)
+        buscar_pagina = self.buscar_pagina_lembretes(SERVICO.lembretes_pendentes, "Agendamentos futuros (página)")
+
+        def ao_abrir(total):
+            estado["hoje"] = datetime.now().date()   # A janela pode ficar aberta de um dia para o outro
+            lista.carregar(total, buscar_pagina)
+
+        return ao_abrir
 
-    def apagar_lembrete(self, id_lembrete, janela):
+    def apagar_lembrete(self, id_lembrete):
+        if self.lembrete_provisorio(id_lembrete):
+            return
         if messagebox.askyesno("Confirmar", "Tem certeza que deseja apagar este lembrete?"):
-            try:
-                conn = sqlite3.connect(DB_PATH, timeout=10)
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM lembretes WHERE id = ?", (id_lembrete,))
-                conn.commit()
-                conn.close()
-                janela.destroy()
+            def apagado(_):
                 self.listar_todos_agendamentos()
                 self.verificar_avisos_hoje_silencioso()
-            except Exception as e:
-                messagebox.showerror("Erro", f"Falha:\n{e}")
+
+            self.no_banco(SERVICO.apagar_lembrete, id_lembrete, ao_concluir=apagado, descricao="Apagar lembrete",
+                          ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha:\n{e}"))
 
 if __name__ == "__main__":
     app = App()
@@ -0,0 +1,148 @@
+"""Fila de gravação com diário local: o pedido é gravado no disco da máquina
+(com fsync) e um thread em segundo plano descarrega no banco principal."""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class FilaGravacao:
+    """Diário append-only em JSON Lines.
+
+    Cada linha é {"id": ..., "dados": {...}} (entrada) ou {"ok": id} (já gravada
+    no banco). Na abertura, entradas sem "ok" são reenviadas; a função de
+    gravação precisa ser idempotente pelo id.
+    """
+
+    TAMANHO_LOTE = 50
+    ESPERA_MAXIMA = 60   # Segundos entre tentativas com o banco fora do ar
+
+    def __init__(self, caminho_diario, gravar_lote):
+        self.caminho = caminho_diario
+        self.caminho_erros = os.path.splitext(caminho_diario)[0] + "_erros.jsonl"
+        self._gravar_lote = gravar_lote
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._parar = False
+        self._pendentes = {}          # id -> dados, em ordem de chegada
+        self._thread = None
+        self.gravados = 0             # Total descarregado desde a abertura
+        self.ultimo_erro = None
+        self._carregar_diario()
+
+    # ---------- Diário ----------
+    def _carregar_diario(self):
+        if not os.path.exists(self.caminho):
+            return
+        confirmados = set()
+        entradas = []
+        with open(self.caminho, "r", encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue   # Linha incompleta de uma queda no meio da escrita
+                if "ok" in registro:
+                    confirmados.add(registro["ok"])
+                else:
+                    entradas.append(registro)
+        for registro in entradas:
+            if registro["id"] not in confirmados:
+                self._pendentes[registro["id"]] = registro["dados"]
+        if self._pendentes:
+            print(f"[FILA] {len(self._pendentes)} pedidos pendentes recuperados do diário")
+
+    def _anexar(self, registros, caminho=None):
+        with open(caminho or self.caminho, "a", encoding="utf-8") as f:
+            for registro in registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def enfileirar(self, id_registro, dados):
+        """Grava no diário local (fsync) e acorda o thread de gravação"""
+        with self._lock:
+            self._anexar([{"id": id_registro, "dados": dados}])
+            self._pendentes[id_registro] = dados
+        self._evento.set()
+
+    # ---------- Consulta ----------
+    def quantidade_pendente(self):
+        return len(self._pendentes)
+
+    def pendentes(self):
+        with self._lock:
+            return list(self._pendentes.values())
+
+    # ---------- Gravação em segundo plano ----------
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, daemon=True, name="fila-gravacao")
+        self._thread.start()
+
+    def parar(self, timeout=5):
+        """Tenta descarregar o que falta; o que sobrar continua no diário"""
+        self._parar = True
+        self._evento.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _executar(self):
+        espera = 1
+        while True:
+            self._evento.wait(timeout=espera if self._pendentes else None)
+            self._evento.clear()
+            while self._pendentes:
+                with self._lock:
+                    lote = list(self._pendentes.items())[:self.TAMANHO_LOTE]
+                try:
+                    self._gravar_lote(lote)
+                except Exception as e:
+                    self.ultimo_erro = f"{type(e).__name__}: {e}"
+                    print(f"[FILA] Falha ao gravar lote: {self.ultimo_erro}")
+                    if not self._separar_com_defeito(lote):
+                        espera = min(espera * 2, self.ESPERA_MAXIMA)
+                        break
+                    continue
+                self._confirmar([id_registro for id_registro, _ in lote])
+                self.ultimo_erro = None
+                espera = 1
+            if self._parar and (not self._pendentes or self.ultimo_erro):
+                return
+
+    def _separar_com_defeito(self, lote):
+        """Regrava um a um; registros recusados pelo banco vão para o arquivo de erros.
+
+        Retorna False quando o problema é o banco (nenhum registro passou).
+        """
+        resultado = True
+        recusados = []
+        for id_registro, dados in lote:
+            try:
+                self._gravar_lote([(id_registro, dados)])
+                self._confirmar([id_registro])
+            except Exception as e:
+                if not _erro_de_dados(e):
+                    resultado = bool(recusados) or id_registro != lote[0][0]
+                    break
+                recusados.append({"id": id_registro, "dados": dados, "erro": str(e), "em": time.time()})
+        if recusados:
+            self._anexar(recusados, self.caminho_erros)
+            self._confirmar([r["id"] for r in recusados])
+            print(f"[FILA] {len(recusados)} registros recusados pelo banco, ver {self.caminho_erros}")
+        return resultado
+
+    def _confirmar(self, ids):
+        with self._lock:
+            for id_registro in ids:
+                self._pendentes.pop(id_registro, None)
+            if self._pendentes:
+                self._anexar([{"ok": id_registro} for id_registro in ids])
+            else:
+                # Tudo gravado: o diário pode recomeçar vazio
+                open(self.caminho, "w").close()
+            self.gravados += len(ids)
+
+
+def _erro_de_dados(erro):
+    return isinstance(erro, (sqlite3.IntegrityError, sqlite3.InterfaceError, KeyError, TypeError, ValueError))
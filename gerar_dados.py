@@ -0,0 +1,230 @@
+"""Gera um banco sintético com volume de loja grande, para testes de desempenho.
+
+Telefones, nomes e endereços no formato brasileiro (a maioria de João Pessoa),
+anos de pedidos, histórico de endereços e lembretes pendentes e concluídos.
+O resultado é determinístico para a mesma semente.
+
+    python gerar_dados.py banco_teste.db --clientes 200000 --pedidos 2000000
+
+Depois: python benchmark.py banco_teste.db
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+from banco import dia_de, migrar, reconstruir_busca_clientes, reconstruir_resumo_diario
+from servico_pedidos import resumir_pagamento
+
+LOTE = 50000    # Linhas por executemany
+
+DDDS = ["83"] * 16 + ["81", "84", "82", "85", "11", "21", "87", "86"]
+
+NOMES = [
+    "Maria", "José", "Ana", "João", "Antônio", "Francisca", "Francisco", "Antônia", "Carlos", "Adriana",
+    "Paulo", "Juliana", "Pedro", "Márcia", "Lucas", "Fernanda", "Luiz", "Patrícia", "Marcos", "Aline",
+    "Luís", "Sandra", "Gabriel", "Camila", "Rafael", "Amanda", "Daniel", "Bruna", "Marcelo", "Jéssica",
+    "Bruno", "Letícia", "Eduardo", "Júlia", "Felipe", "Luciana", "Raimundo", "Vanessa", "Rodrigo", "Mariana",
+    "Severino", "Conceição", "Sebastião", "Raimunda", "Josefa", "Edvaldo", "Socorro", "Ivanildo", "Genilda",
+    "Wellington", "Jailson", "Cícero", "Damiana", "Heloísa", "Ítalo", "Thaís", "Cláudio", "Rosângela",
+]
+SOBRENOMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Ferreira", "Costa", "Rodrigues", "Almeida",
+    "Nascimento", "Alves", "Carvalho", "Araújo", "Ribeiro", "Gomes", "Martins", "Barbosa", "Cavalcanti",
+    "Medeiros", "Dantas", "Freitas", "Monteiro", "Vasconcelos", "Albuquerque", "Brito", "Batista", "Melo",
+    "Farias", "Lacerda", "Queiroga", "Nóbrega", "Galvão", "Bezerra", "Leite", "Cunha", "Sá", "Figueiredo",
+]
+LOGRADOUROS = [
+    "Rua das Trincheiras", "Av. Epitácio Pessoa", "Av. Cabo Branco", "Rua Rodrigues de Aquino",
+    "Av. Dom Pedro II", "Rua Duque de Caxias", "Av. Beira Rio", "Rua Silvino Lopes", "Av. Flamboyant",
+    "Rua Monsenhor Walfredo Leal", "Av. Hilton Souto Maior", "Rua Josefa Taveira", "Av. Cruz das Armas",
+    "Rua Desembargador Souto Maior", "Av. Presidente Café Filho", "Rua Infante Dom Henrique",
+    "Rua Coração de Jesus", "Av. Sapé", "Rua Professor Batista Leite", "Av. Ranieri Mazzilli",
+    "Rua Antônio Rabelo Júnior", "Av. Tancredo Neves", "Rua Manoel Arruda Cavalcanti", "Av. Juarez Távora",
+    "Travessa São José", "Rua Bananeiras", "Rua Guaporé", "Av. Nossa Senhora dos Navegantes",
+    "Rua Aníbal de Oliveira", "Rua Maria Rosa", "Av. Gouveia Nóbrega", "Rua Empresário Clóvis Rolim",
+]
+BAIRROS = [
+    "Manaíra", "Tambaú", "Cabo Branco", "Bessa", "Bancários", "Mangabeira", "Cristo Redentor", "Centro",
+    "Torre", "Valentina", "Jaguaribe", "Cruz das Armas", "Tambauzinho", "Miramar", "Altiplano", "Geisel",
+    "José Américo", "Água Fria", "Ernesto Geisel", "Oitizeiro", "Róger", "Expedicionários", "Castelo Branco",
+    "Jardim Cidade Universitária", "Alto do Mateus", "Funcionários", "Cuiá", "Gramame", "Paratibe", "Ipês",
+]
+REFERENCIAS = [
+    "", "", "", "", "Próximo ao mercadinho", "Casa de muro azul", "Em frente à padaria", "Apto 302",
+    "Bloco B apto 101", "Portão verde", "Ao lado da igreja", "Esquina com a farmácia", "Condomínio, falar na portaria",
+    "Casa dos fundos", "Perto da escola", "Em frente à praça",
+]
+MEDICAMENTOS = [
+    "Losartana 50mg", "Metformina 850mg", "Sinvastatina 20mg", "Omeprazol 20mg", "Levotiroxina 50mcg",
+    "Hidroclorotiazida 25mg", "Enalapril 10mg", "Glibenclamida 5mg", "Atenolol 50mg", "AAS 100mg",
+    "Insulina NPH", "Clonazepam 2mg", "Anlodipino 5mg", "Puran T4 25mcg", "Fralda Geriátrica G",
+]
+ENTREGADORES = ["Entregador A"] * 5 + ["Entregador B"] * 4 + ["Moto Extra/App"]
+PARCELAS = ["1x"] * 6 + ["2x", "3x"]
+
+
+def gerar_telefones(rnd, qtd):
+    """Telefones únicos: celulares (DDD + 9 + 8 dígitos) e alguns fixos (DDD + 8 dígitos)"""
+    telefones = set()
+    while len(telefones) < qtd:
+        ddd = rnd.choice(DDDS)
+        if rnd.random() < 0.9:
+            tel = f"{ddd}9{rnd.choice('6789')}{rnd.randrange(10 ** 7):07d}"
+        else:
+            tel = f"{ddd}{rnd.choice('2345')}{rnd.randrange(10 ** 7):07d}"
+        telefones.add(tel)
+    telefones = sorted(telefones)
+    rnd.shuffle(telefones)
+    return telefones
+
+
+def nome_completo(rnd):
+    sobrenomes = rnd.sample(SOBRENOMES, rnd.choice((1, 2, 2, 3)))
+    return " ".join([rnd.choice(NOMES)] + sobrenomes)
+
+
+def endereco(rnd):
+    return (rnd.choice(LOGRADOUROS), str(rnd.randint(1, 2500)), rnd.choice(BAIRROS), rnd.choice(REFERENCIAS))
+
+
+def pagamento(rnd, centavos):
+    """(metodo_pagamento, detalhes_pagamento) pelas mesmas regras do PDV (resumir_pagamento)"""
+    sorteio = rnd.random()
+    total = centavos / 100
+    if sorteio < 0.35:
+        pago = (int(total) // 10 + 1) * 10 if rnd.random() < 0.7 else total
+        formas = {"partes": [("Dinheiro", "", None)], "recebido": pago}
+    elif sorteio < 0.70:
+        formas = {"partes": [("Pix", "", None)]}
+    elif sorteio < 0.95:
+        formas = {"partes": [("Cartão", rnd.choice(PARCELAS), None)]}
+    else:
+        val1 = round(total * rnd.uniform(0.3, 0.7), 2)
+        formas = {"partes": [("Pix", "", val1), ("Cartão", rnd.choice(PARCELAS), total - val1)]}
+    detalhes, metodo = resumir_pagamento(total, formas)
+    return metodo, detalhes
+
+
+def _em_lotes(linhas, executar):
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= LOTE:
+            executar(lote)
+            lote = []
+    if lote:
+        executar(lote)
+
+
+def gerar(caminho, clientes=200000, pedidos=2000000, anos=3, semente=42, hoje=None):
+    """Cria `caminho` (não pode existir) com o schema atual e os dados sintéticos"""
+    if os.path.exists(caminho):
+        raise FileExistsError(f"{caminho} já existe")
+    hoje = hoje or date.today()
+    rnd = random.Random(semente)
+    inicio_geral = time.perf_counter()
+
+    conn = sqlite3.connect(caminho)
+    migrar(conn)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-200000")
+
+    # Carga sem triggers (FTS, resumo_diario, log de réplica); recalculados no fim
+    gatilhos = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+    conn.execute("BEGIN")
+    for nome, _ in gatilhos:
+        conn.execute(f"DROP TRIGGER {nome}")
+
+    # Clientes
+    inicio = time.perf_counter()
+    telefones = gerar_telefones(rnd, clientes)
+    enderecos = {}
+    cadastros = []
+    for tel in telefones:
+        enderecos[tel] = endereco(rnd)
+        carimbo = hoje - timedelta(days=rnd.randrange(anos * 365))
+        cadastros.append((tel, nome_completo(rnd), *enderecos[tel], f"{carimbo.isoformat()} 12:00:00.000"))
+    _em_lotes(cadastros, lambda lote: conn.executemany(
+        "INSERT INTO clientes (telefone, nome, rua, numero, bairro, referencia, atualizado_em) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        lote))
+    del cadastros
+    print(f"[GERADOR] {clientes} clientes em {time.perf_counter() - inicio:.1f}s")
+
+    # Pedidos: poucos clientes compram muito, a maioria compra pouco
+    inicio = time.perf_counter()
+    primeiro_dia = hoje - timedelta(days=anos * 365)
+    dias_totais = (hoje - primeiro_dia).days + 1
+
+    def linhas_pedidos():
+        for i in range(pedidos):
+            # Em ordem de data, como numa loja de verdade
+            data = primeiro_dia + timedelta(days=i * dias_totais // pedidos)
+            tel = telefones[int(clientes * rnd.random() ** 2.5)]
+            centavos = int(rnd.lognormvariate(4.0, 0.7) * 100) + 500
+            metodo, detalhes = pagamento(rnd, centavos)
+            yield (f"{rnd.getrandbits(128):032x}", data.isoformat(), dia_de(data), tel, rnd.choice(ENTREGADORES),
+                   centavos / 100, centavos, metodo, detalhes)
+    _em_lotes(linhas_pedidos(), lambda lote: conn.executemany(
+        "INSERT INTO pedidos (uuid, data, dia, cliente_tel, entregador, valor_total, valor_centavos, "
+        "metodo_pagamento, detalhes_pagamento) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", lote))
+    print(f"[GERADOR] {pedidos} pedidos em {time.perf_counter() - inicio:.1f}s")
+
+    # Histórico de endereços: o atual e, para alguns, mudanças antigas
+    inicio = time.perf_counter()
+
+    def linhas_enderecos():
+        for tel in telefones:
+            for _ in range(rnd.choice((0, 0, 0, 1, 1, 2))):
+                antigo = hoje - timedelta(days=rnd.randrange(365, anos * 365 + 1))
+                yield (tel, *endereco(rnd), antigo.isoformat())
+            recente = hoje - timedelta(days=rnd.randrange(365))
+            yield (tel, *enderecos[tel], recente.isoformat())
+    _em_lotes(linhas_enderecos(), lambda lote: conn.executemany(
+        "INSERT INTO historico_enderecos (telefone_cliente, rua, numero, bairro, referencia, ultimo_uso) "
+        "VALUES (?, ?, ?, ?, ?, ?)", lote))
+
+    # Lembretes de recompra: concluídos no passado, pendentes de um mês atrás a dois meses à frente
+    def linhas_lembretes():
+        for tel in telefones:
+            if rnd.random() < 0.15:
+                for _ in range(rnd.choice((1, 1, 2))):
+                    if rnd.random() < 0.6:
+                        aviso, status = hoje + timedelta(days=rnd.randint(-30, 60)), "PENDENTE"
+                    else:
+                        aviso, status = hoje - timedelta(days=rnd.randint(1, anos * 365)), "CONCLUIDO"
+                    yield (tel, rnd.choice(MEDICAMENTOS), aviso.isoformat(), status)
+    _em_lotes(linhas_lembretes(), lambda lote: conn.executemany(
+        "INSERT INTO lembretes (cliente_tel, medicamento, data_aviso, status) VALUES (?, ?, ?, ?)", lote))
+    print(f"[GERADOR] Endereços e lembretes em {time.perf_counter() - inicio:.1f}s")
+
+    inicio = time.perf_counter()
+    reconstruir_resumo_diario(conn)
+    reconstruir_busca_clientes(conn)
+    for _, sql in gatilhos:
+        conn.execute(sql)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    print(f"[GERADOR] Resumo, busca e estatísticas em {time.perf_counter() - inicio:.1f}s")
+    print(f"[GERADOR] {caminho}: {os.path.getsize(caminho) / 1048576:.0f} MB em "
+          f"{time.perf_counter() - inicio_geral:.0f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera um banco sintético para testes de desempenho")
+    parser.add_argument("destino", help="arquivo .db a criar (não pode existir)")
+    parser.add_argument("--clientes", type=int, default=200000)
+    parser.add_argument("--pedidos", type=int, default=2000000)
+    parser.add_argument("--anos", type=int, default=3, help="anos de histórico de pedidos")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+    try:
+        gerar(args.destino, args.clientes, args.pedidos, args.anos, args.semente)
+    except FileExistsError as e:
+        print(f"[GERADOR] {e}")
+        sys.exit(1)
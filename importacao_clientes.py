@@ -0,0 +1,230 @@
+"""Importação e exportação do cadastro de clientes em CSV, em fluxo contínuo.
+
+Para migrar uma loja de outro PDV: o arquivo é lido linha a linha (nunca
+inteiro na memória), cada telefone passa pelas mesmas regras de
+limpar_telefone/validar_cliente da tela e os válidos são gravados com
+executemany em transações de LOTE linhas. Entre um lote e outro o banco fica
+livre para os outros terminais.
+
+Cliente que já existe é atualizado; campo de endereço vazio no arquivo não
+apaga o que já está cadastrado. Linhas recusadas voltam com o número da linha
+e o motivo.
+
+    python importacao_clientes.py importar clientes_outro_pdv.csv
+    python importacao_clientes.py exportar clientes.csv
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+from banco import GerenciadorConexoes, agora_utc, normalizar_texto
+from servico_pedidos import CAMPOS_CLIENTE, DadosInvalidos, cliente_de, validar_cliente
+
+LOTE = 2000                 # Linhas por transação
+AMOSTRA = 64 * 1024         # Bytes lidos para descobrir codificação e separador
+MAX_ERROS_GUARDADOS = 1000  # Erros devolvidos em detalhe (os demais só são contados)
+
+# Nomes de coluna aceitos (sem acento, minúsculas) para cada campo
+ALIASES = {
+    "telefone": ("telefone", "fone", "tel", "celular", "whatsapp", "contato", "telefone1", "fone1"),
+    "nome": ("nome", "cliente", "nome do cliente", "nome_cliente", "razao social"),
+    "rua": ("rua", "endereco", "logradouro", "end", "endereco1"),
+    "numero": ("numero", "num", "no", "nro", "n"),
+    "bairro": ("bairro",),
+    "referencia": ("referencia", "ref", "ponto de referencia", "complemento", "obs", "observacao"),
+}
+
+# Cada lote entra primeiro numa tabela temporária (executemany) e vai para
+# clientes num único INSERT ... SELECT: o trigger do índice de busca (FTS5)
+# descarrega uma vez por lote, não uma por linha (metade do tempo em 100 mil linhas).
+SQL_TEMPORARIA = """
+    CREATE TEMP TABLE IF NOT EXISTS importacao_clientes (
+        telefone TEXT, nome TEXT, rua TEXT, numero TEXT, bairro TEXT, referencia TEXT, atualizado_em TEXT
+    )
+"""
+SQL_UPSERT = """
+    INSERT INTO clientes (telefone, nome, rua, numero, bairro, referencia, atualizado_em)
+    SELECT telefone, nome, rua, numero, bairro, referencia, atualizado_em FROM temp.importacao_clientes WHERE true
+    ON CONFLICT(telefone) DO UPDATE SET
+        nome = excluded.nome,
+        rua = COALESCE(NULLIF(excluded.rua, ''), rua),
+        numero = COALESCE(NULLIF(excluded.numero, ''), numero),
+        bairro = COALESCE(NULLIF(excluded.bairro, ''), bairro),
+        referencia = COALESCE(NULLIF(excluded.referencia, ''), referencia),
+        atualizado_em = excluded.atualizado_em
+    WHERE (nome, rua, numero, bairro, referencia) IS NOT
+          (excluded.nome, COALESCE(NULLIF(excluded.rua, ''), rua), COALESCE(NULLIF(excluded.numero, ''), numero),
+           COALESCE(NULLIF(excluded.bairro, ''), bairro), COALESCE(NULLIF(excluded.referencia, ''), referencia))
+"""
+
+
+# ================== LEITURA DO ARQUIVO ==================
+def _abrir_texto(caminho):
+    """Abre o CSV na codificação certa (UTF-8 ou, vindo de sistema Windows antigo, cp1252)"""
+    with open(caminho, "rb") as f:
+        amostra = f.read(AMOSTRA)
+    codificacao = "utf-8-sig"
+    try:
+        # Uma sequência UTF-8 cortada no fim da amostra não conta como erro
+        amostra.decode("utf-8-sig")
+    except UnicodeDecodeError as e:
+        if e.start < len(amostra) - 3:
+            codificacao = "cp1252"
+    texto = amostra.decode(codificacao, errors="ignore")
+    try:
+        dialeto = csv.Sniffer().sniff(texto, delimiters=";,\t|")
+        separador = dialeto.delimiter
+    except csv.Error:
+        separador = ";"
+    return open(caminho, encoding=codificacao, newline="", errors="replace"), separador
+
+
+def _mapear_colunas(cabecalho):
+    """{campo: índice da coluna}; None se a primeira linha não parece cabeçalho"""
+    nomes = [normalizar_texto(coluna).strip() for coluna in cabecalho]
+    mapa = {}
+    for campo, aceitos in ALIASES.items():
+        for i, nome in enumerate(nomes):
+            if nome in aceitos and i not in mapa.values():
+                mapa[campo] = i
+                break
+    if "telefone" not in mapa or "nome" not in mapa:
+        return None
+    return mapa
+
+
+def ler_clientes(arquivo, separador=";"):
+    """Gera (número da linha, cliente ou None, motivo) para cada linha do CSV.
+
+    Sem cabeçalho reconhecível, as colunas são lidas na ordem do exportador
+    (telefone, nome, rua, numero, bairro, referencia).
+    """
+    leitor = csv.reader(arquivo, delimiter=separador)
+    mapa = None
+    for linha in leitor:
+        if not any(campo.strip() for campo in linha):
+            continue
+        if mapa is None:
+            mapa = _mapear_colunas(linha)
+            if mapa is not None:
+                continue   # Era o cabeçalho
+            mapa = {campo: i for i, campo in enumerate(CAMPOS_CLIENTE)}
+        valores = {campo: (linha[i] if i < len(linha) else "") for campo, i in mapa.items()}
+        cliente = cliente_de(valores.get("telefone", ""), valores.get("nome", ""), valores.get("rua", ""),
+                             valores.get("numero", ""), valores.get("bairro", ""), valores.get("referencia", ""))
+        try:
+            validar_cliente(cliente)
+        except DadosInvalidos as e:
+            yield leitor.line_num, None, str(e).replace("\n", " ")
+            continue
+        yield leitor.line_num, cliente, None
+
+
+# ================== IMPORTAÇÃO ==================
+def importar_clientes(banco, caminho, lote=LOTE, progresso=None):
+    """Importa o CSV em `caminho` para o banco do GerenciadorConexoes `banco`.
+
+    `progresso(linhas_lidas, bytes_lidos, bytes_total)` é chamado a cada lote,
+    da thread que importa. Retorna um dicionário com lidas, gravadas,
+    sem_alteracao, recusadas, erros [(linha, motivo)] e segundos.
+    """
+    inicio = time.perf_counter()
+    total_bytes = os.path.getsize(caminho)
+    resumo = {"lidas": 0, "gravadas": 0, "sem_alteracao": 0, "recusadas": 0, "erros": [], "segundos": 0.0}
+    arquivo, separador = _abrir_texto(caminho)
+    with arquivo:
+        pendentes = []
+
+        def gravar():
+            carimbo = agora_utc()
+            with banco.transacao("importar_clientes") as cursor:
+                cursor.execute(SQL_TEMPORARIA)
+                cursor.execute("DELETE FROM temp.importacao_clientes")
+                cursor.executemany("INSERT INTO temp.importacao_clientes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   [(c["telefone"], c["nome"], c["rua"], c["numero"], c["bairro"], c["referencia"],
+                                     carimbo) for c in pendentes])
+                cursor.execute(SQL_UPSERT)
+                alteradas = cursor.rowcount
+            resumo["gravadas"] += alteradas
+            resumo["sem_alteracao"] += len(pendentes) - alteradas
+            pendentes.clear()
+            if progresso:
+                progresso(resumo["lidas"], arquivo.buffer.tell(), total_bytes)
+
+        for num_linha, cliente, motivo in ler_clientes(arquivo, separador):
+            resumo["lidas"] += 1
+            if cliente is None:
+                resumo["recusadas"] += 1
+                if len(resumo["erros"]) < MAX_ERROS_GUARDADOS:
+                    resumo["erros"].append((num_linha, motivo))
+                continue
+            pendentes.append(cliente)
+            if len(pendentes) >= lote:
+                gravar()
+        if pendentes:
+            gravar()
+    resumo["segundos"] = time.perf_counter() - inicio
+    print(f"[IMPORTACAO] {resumo['lidas']} linhas: {resumo['gravadas']} gravadas, "
+          f"{resumo['sem_alteracao']} sem alteração, {resumo['recusadas']} recusadas ({resumo['segundos']:.1f}s)")
+    return resumo
+
+
+def gravar_erros_csv(caminho, erros):
+    """Relatório das linhas recusadas, para corrigir e importar de novo"""
+    with open(caminho, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["Linha", "Motivo"])
+        writer.writerows(erros)
+
+
+# ================== EXPORTAÇÃO ==================
+def exportar_clientes(banco, caminho, lote=LOTE, progresso=None):
+    """Grava todo o cadastro em CSV (;), lendo o banco aos poucos; retorna quantos exportou.
+
+    O arquivo sai no formato que importar_clientes lê de volta.
+    """
+    conn = banco.conexao()
+    total = conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
+    exportados = 0
+    parcial = caminho + ".parcial"
+    with open(parcial, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["Telefone", "Nome", "Rua", "Numero", "Bairro", "Referencia"])
+        cursor = conn.execute("SELECT telefone, nome, rua, numero, bairro, referencia FROM clientes ORDER BY telefone")
+        while True:
+            linhas = cursor.fetchmany(lote)
+            if not linhas:
+                break
+            writer.writerows([[valor or "" for valor in linha] for linha in linhas])
+            exportados += len(linhas)
+            if progresso:
+                progresso(exportados, total)
+    os.replace(parcial, caminho)
+    return exportados
+
+
+# ================== LINHA DE COMANDO ==================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa ou exporta o cadastro de clientes em CSV")
+    parser.add_argument("acao", choices=("importar", "exportar"))
+    parser.add_argument("arquivo", help="CSV de origem (importar) ou de destino (exportar)")
+    parser.add_argument("--banco", default="dados_farmacia.db")
+    parser.add_argument("--lote", type=int, default=LOTE, help="linhas por transação")
+    args = parser.parse_args()
+    if not os.path.exists(args.banco):
+        print(f"[IMPORTACAO] {args.banco} não existe")
+        sys.exit(1)
+
+    banco = GerenciadorConexoes(args.banco)
+    if args.acao == "importar":
+        resultado = importar_clientes(banco, args.arquivo, args.lote)
+        if resultado["erros"]:
+            relatorio = os.path.splitext(args.arquivo)[0] + "_erros.csv"
+            gravar_erros_csv(relatorio, resultado["erros"])
+            print(f"[IMPORTACAO] Linhas recusadas em {relatorio}")
+    else:
+        qtd = exportar_clientes(banco, args.arquivo, args.lote)
+        print(f"[IMPORTACAO] {qtd} clientes exportados para {args.arquivo}")
+    banco.fechar_todas()
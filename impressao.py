@@ -0,0 +1,413 @@
+"""Fila de impressão: cupons e etiquetas saem por um thread próprio.
+
+Imprimir direto no finalizar travava o PDV enquanto a térmica estava sem
+papel, atolada ou desligada, e o cupom se perdia no erro. Aqui o trabalho
+vai para um diário local (com fsync) e o thread de impressão manda para a
+impressora, com novas tentativas; o que não sai fica guardado como falha
+para reimprimir pela tela de impressões.
+
+As impressoras são intercambiáveis (config_impressora.txt):
+- gdi: texto em Courier pelo driver do Windows (o caminho de sempre);
+- escpos: bytes ESC/POS crus pelo spooler do Windows (WritePrinter, tipo
+  RAW), com a fonte interna da térmica e corte de papel;
+- raster: o cupom desenhado como imagem (cupom_raster.py), em ESC/POS
+  raster pelo mesmo caminho RAW;
+- arquivo / png: cada trabalho vira um .txt / .png numa pasta (testes e
+  pré-visualização fora do Windows);
+- nula: descarta.
+O DC, a fonte e o handle da impressora são abertos na primeira impressão e
+reaproveitados; só são refeitos depois de um erro.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import instrumentacao
+
+DOCUMENTO = "Cupom TotalPharma"
+
+
+# ================== IMPRESSORAS ==================
+class ImpressoraGDI:
+    """Texto linha a linha num DC de impressora (win32ui), com uma fonte só"""
+
+    nome = "gdi"
+    FONTE = {"name": "Courier New", "height": 26, "weight": 600}
+    ALTURA_LINHA = 28
+    MARGEM_ESQUERDA = 10
+    MARGEM_TOPO = 50
+
+    def __init__(self, impressora=None):
+        self.impressora = impressora   # None: a padrão do Windows
+        self._dc = None
+        self._fonte = None
+        self._aberta = None
+
+    def _abrir(self):
+        # Importados na primeira impressão (fora da abertura do programa)
+        import win32print
+        import win32ui
+        nome = self.impressora or win32print.GetDefaultPrinter()
+        if self._dc is not None and nome == self._aberta:
+            return
+        self.fechar()
+        dc = win32ui.CreateDC()
+        dc.CreatePrinterDC(nome)
+        self._fonte = win32ui.CreateFont(self.FONTE)
+        self._dc = dc
+        self._aberta = nome
+        print(f"[IMPRESSAO] DC aberto para '{nome}'")
+
+    def imprimir(self, trabalho):
+        self._abrir()
+        dc = self._dc
+        dc.StartDoc(trabalho["titulo"])
+        try:
+            dc.StartPage()
+            dc.SelectObject(self._fonte)
+            y = self.MARGEM_TOPO
+            for linha in trabalho["texto"].split("\n"):
+                dc.TextOut(self.MARGEM_ESQUERDA, y, linha)
+                y += self.ALTURA_LINHA
+            dc.TextOut(self.MARGEM_ESQUERDA, y + 50, ".")
+            dc.EndPage()
+        except Exception:
+            dc.AbortDoc()
+            raise
+        dc.EndDoc()
+
+    def fechar(self):
+        if self._dc is not None:
+            try:
+                self._dc.DeleteDC()
+            except Exception:
+                pass
+        self._dc = self._fonte = self._aberta = None
+
+
+# ESC/POS: ESC @ reinicia, ESC t 2 escolhe a página de código 850 (acentos);
+# no fim, avança o papel até a guilhotina e GS V 66 0 faz o corte parcial
+ESCPOS_INICIO = b"\x1b@\x1bt\x02"
+ESCPOS_FIM = b"\n\n\n\x1dV\x42\x00"
+ESCPOS_CODIFICACAO = "cp850"
+
+
+def escpos(texto):
+    """Bytes ESC/POS de um cupom em texto puro"""
+    return ESCPOS_INICIO + texto.encode(ESCPOS_CODIFICACAO, errors="replace") + ESCPOS_FIM
+
+
+class ImpressoraEscPos:
+    """ESC/POS cru pelo spooler do Windows: sem driver gráfico, a térmica usa a fonte dela"""
+
+    nome = "escpos"
+
+    def __init__(self, impressora=None):
+        self.impressora = impressora
+        self._handle = None
+        self._aberta = None
+
+    def _abrir(self):
+        import win32print
+        nome = self.impressora or win32print.GetDefaultPrinter()
+        if self._handle is not None and nome == self._aberta:
+            return
+        self.fechar()
+        self._handle = win32print.OpenPrinter(nome)
+        self._aberta = nome
+        print(f"[IMPRESSAO] Impressora '{nome}' aberta (RAW)")
+
+    def _dados(self, trabalho):
+        return escpos(trabalho["texto"])
+
+    def imprimir(self, trabalho):
+        import win32print
+        self._abrir()
+        dados = self._dados(trabalho)
+        win32print.StartDocPrinter(self._handle, 1, (trabalho["titulo"], None, "RAW"))
+        try:
+            win32print.StartPagePrinter(self._handle)
+            escritos = win32print.WritePrinter(self._handle, dados)
+            win32print.EndPagePrinter(self._handle)
+        finally:
+            win32print.EndDocPrinter(self._handle)
+        if escritos != len(dados):
+            raise OSError(f"impressora aceitou {escritos} de {len(dados)} bytes")
+
+    def fechar(self):
+        if self._handle is not None:
+            import win32print
+            try:
+                win32print.ClosePrinter(self._handle)
+            except Exception:
+                pass
+        self._handle = self._aberta = None
+
+
+def imagem(trabalho):
+    """Cupom em imagem de 1 bit: pelo layout do tipo ou, sem campos, o texto linha a linha"""
+    import cupom_raster   # Pillow só é carregado na primeira impressão em imagem
+    if trabalho.get("campos") and trabalho["tipo"] in cupom_raster.LAYOUTS:
+        return cupom_raster.renderizar(trabalho["tipo"], trabalho["campos"])
+    return cupom_raster.renderizar_texto(trabalho["texto"])
+
+
+class ImpressoraRaster(ImpressoraEscPos):
+    """O cupom desenhado como imagem e enviado em ESC/POS raster (GS v 0)"""
+
+    nome = "raster"
+
+    def _dados(self, trabalho):
+        import cupom_raster
+        return ESCPOS_INICIO + cupom_raster.escpos_raster(imagem(trabalho)) + ESCPOS_FIM
+
+
+class ImpressoraArquivo:
+    """Grava cada trabalho em `pasta` (.txt ou, com formato "png", a imagem); sem pasta, descarta"""
+
+    def __init__(self, pasta=None, formato="txt"):
+        self.pasta = pasta
+        self.formato = formato
+        self.nome = ("png" if formato == "png" else "arquivo") if pasta else "nula"
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+    def imprimir(self, trabalho):
+        if not self.pasta:
+            return
+        quando = datetime.fromtimestamp(trabalho["criado"]).strftime("%Y%m%d_%H%M%S")
+        caminho = os.path.join(self.pasta, f"{quando}_{trabalho['tipo']}_{trabalho['id'][:8]}.{self.formato}")
+        if self.formato == "png":
+            import cupom_raster
+            cupom_raster.salvar_png(imagem(trabalho), caminho)
+            return
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.write(trabalho["texto"])
+
+    def fechar(self):
+        pass
+
+
+def criar_impressora(config, pasta_padrao=None):
+    """Impressora a partir da linha de config_impressora.txt: "<tipo> [impressora ou pasta]"
+
+    Ex.: "gdi", "escpos EPSON TM-T20", "raster EPSON TM-T20", "png C:\\cupons", "nula".
+    """
+    tipo, _, destino = (config or "nula").strip().partition(" ")
+    tipo = tipo.lower()
+    destino = destino.strip() or None
+    if tipo == "gdi":
+        return ImpressoraGDI(destino)
+    if tipo == "escpos":
+        return ImpressoraEscPos(destino)
+    if tipo == "raster":
+        return ImpressoraRaster(destino)
+    if tipo in ("arquivo", "png"):
+        return ImpressoraArquivo(destino or pasta_padrao, "png" if tipo == "png" else "txt")
+    if tipo != "nula":
+        print(f"[IMPRESSAO] Tipo de impressora desconhecido '{tipo}', usando nula")
+    return ImpressoraArquivo(None)
+
+
+# ================== FILA ==================
+class FilaImpressao:
+    """Diário append-only em JSON Lines com os trabalhos de impressão.
+
+    Cada linha é {"trabalho": {...}} (novo), {"ok": id} (impresso ou
+    descartado), {"falhou": id, "erro": ...} (esgotou as tentativas) ou
+    {"retentar": id} (mandado reimprimir). Na abertura, trabalhos que não
+    chegaram a sair viram falhas: quem decide reimprimir um cupom antigo é o
+    operador, não o programa.
+
+    A chamada à impressora não tem como ser cancelada; se passar de
+    TEMPO_LIMITE, travada() avisa a interface, e os trabalhos seguintes
+    continuam esperando no diário.
+    """
+
+    TENTATIVAS = 3
+    ESPERA_TENTATIVA = 2   # Segundos antes da 2ª tentativa; dobra a cada uma
+    TEMPO_LIMITE = 15      # Segundos numa impressão antes de avisar que a impressora travou
+    MAX_FALHAS = 100       # Falhas guardadas para reimpressão (as mais antigas saem)
+
+    def __init__(self, caminho_diario, impressora):
+        self.caminho = caminho_diario
+        self.impressora = impressora
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._parar = threading.Event()
+        self._pendentes = {}      # id -> trabalho, em ordem de chegada
+        self._falhas = {}         # id -> trabalho (com "erro")
+        self._imprimindo = None   # (id, início) do trabalho na impressora
+        self._thread = None
+        self.impressos = 0
+        self.ultimo_erro = None
+        self._carregar_diario()
+
+    # ---------- Diário ----------
+    def _carregar_diario(self):
+        if not os.path.exists(self.caminho):
+            return
+        trabalhos = {}
+        with open(self.caminho, "r", encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue   # Linha incompleta de uma queda no meio da escrita
+                if "trabalho" in registro:
+                    trabalho = registro["trabalho"]
+                    trabalhos[trabalho["id"]] = trabalho
+                elif "ok" in registro:
+                    trabalhos.pop(registro["ok"], None)
+                elif "falhou" in registro and registro["falhou"] in trabalhos:
+                    trabalhos[registro["falhou"]]["erro"] = registro["erro"]
+                elif "retentar" in registro and registro["retentar"] in trabalhos:
+                    trabalhos[registro["retentar"]].pop("erro", None)
+        for id_trabalho, trabalho in trabalhos.items():
+            trabalho.setdefault("erro", "não impresso antes de o programa fechar")
+            self._falhas[id_trabalho] = trabalho
+        if self._falhas:
+            print(f"[IMPRESSAO] {len(self._falhas)} impressões com falha recuperadas do diário")
+        with self._lock:
+            self._compactar()
+
+    def _anexar(self, registros):
+        with open(self.caminho, "a", encoding="utf-8") as f:
+            for registro in registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compactar(self):
+        """Reescreve o diário só com as falhas guardadas (chamar com o lock)"""
+        for id_trabalho in list(self._falhas)[:-self.MAX_FALHAS]:
+            del self._falhas[id_trabalho]
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            for trabalho in self._falhas.values():
+                f.write(json.dumps({"trabalho": trabalho}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.caminho)
+
+    def enfileirar(self, texto, tipo="cupom", resumo="", titulo=DOCUMENTO, campos=None):
+        """Grava no diário local (fsync) e acorda o thread de impressão; retorna o id.
+
+        `campos` são os textos do layout em imagem (campos_cupom / campos_etiqueta);
+        as impressoras de texto usam `texto`.
+        """
+        trabalho = {"id": uuid.uuid4().hex, "tipo": tipo, "resumo": resumo, "titulo": titulo,
+                    "texto": texto, "campos": campos, "criado": time.time()}
+        with self._lock:
+            self._anexar([{"trabalho": trabalho}])
+            self._pendentes[trabalho["id"]] = trabalho
+        self._evento.set()
+        return trabalho["id"]
+
+    # ---------- Falhas ----------
+    def falhas(self):
+        """Trabalhos que não saíram, do mais recente para o mais antigo"""
+        with self._lock:
+            return sorted(self._falhas.values(), key=lambda trabalho: trabalho["criado"], reverse=True)
+
+    def reimprimir(self, id_trabalho):
+        with self._lock:
+            trabalho = self._falhas.pop(id_trabalho, None)
+            if trabalho is None:
+                return False
+            trabalho.pop("erro", None)
+            self._anexar([{"retentar": id_trabalho}])
+            self._pendentes[id_trabalho] = trabalho
+        self._evento.set()
+        return True
+
+    def descartar(self, id_trabalho):
+        with self._lock:
+            if self._falhas.pop(id_trabalho, None) is not None:
+                self._anexar([{"ok": id_trabalho}])
+
+    # ---------- Consulta ----------
+    def quantidade_pendente(self):
+        return len(self._pendentes)
+
+    def quantidade_falhas(self):
+        return len(self._falhas)
+
+    def travada(self):
+        """Segundos na impressão atual, se já passou de TEMPO_LIMITE; senão None"""
+        imprimindo = self._imprimindo
+        if imprimindo is None:
+            return None
+        segundos = time.monotonic() - imprimindo[1]
+        return segundos if segundos >= self.TEMPO_LIMITE else None
+
+    # ---------- Impressão em segundo plano ----------
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, daemon=True, name="fila-impressao")
+        self._thread.start()
+
+    def parar(self, timeout=5):
+        """Espera o que está na fila sair; o que sobrar vira falha na próxima abertura"""
+        self._parar.set()
+        self._evento.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _executar(self):
+        while True:
+            self._evento.wait()
+            self._evento.clear()
+            while self._pendentes:
+                with self._lock:
+                    id_trabalho, trabalho = next(iter(self._pendentes.items()))
+                erro = self._imprimir(trabalho)
+                if erro is None:
+                    self._concluir(id_trabalho, {"ok": id_trabalho})
+                    self.impressos += 1
+                    self.ultimo_erro = None
+                elif self._parar.is_set():
+                    break   # Fechando: fica no diário
+                else:
+                    trabalho["erro"] = erro
+                    self._concluir(id_trabalho, {"falhou": id_trabalho, "erro": erro}, falhou=True)
+                    self.ultimo_erro = erro
+            if self._parar.is_set():
+                self.impressora.fechar()
+                return
+
+    def _imprimir(self, trabalho):
+        """Tenta até TENTATIVAS vezes; retorna None ou o último erro"""
+        espera = self.ESPERA_TENTATIVA
+        for tentativa in range(1, self.TENTATIVAS + 1):
+            with instrumentacao.cronometro("impressao", self.impressora.nome, documento=trabalho["tipo"],
+                                           linhas=trabalho["texto"].count("\n") + 1,
+                                           tentativa=tentativa) as medida:
+                self._imprimindo = (trabalho["id"], time.monotonic())
+                try:
+                    self.impressora.imprimir(trabalho)
+                    return None
+                except Exception as e:
+                    erro = medida["erro"] = f"{type(e).__name__}: {e}"
+                finally:
+                    self._imprimindo = None
+            print(f"[IMPRESSAO] Tentativa {tentativa} de '{trabalho['tipo']}' falhou: {erro}")
+            # Handle e DC são refeitos: a impressora pode ter sido religada ou trocada
+            self.impressora.fechar()
+            if tentativa < self.TENTATIVAS and self._parar.wait(espera):
+                break
+            espera *= 2
+        return erro
+
+    def _concluir(self, id_trabalho, registro, falhou=False):
+        with self._lock:
+            trabalho = self._pendentes.pop(id_trabalho, None)
+            if falhou and trabalho is not None:
+                self._falhas[id_trabalho] = trabalho
+            if not self._pendentes and not falhou:
+                # Nada na fila: o diário recomeça só com as falhas guardadas
+                self._compactar()
+            else:
+                self._anexar([registro])
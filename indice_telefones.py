@@ -0,0 +1,123 @@
+"""Índice em memória dos telefones de clientes (prefixo + filtro de Bloom)."""
+import bisect
+import threading
+import time
+import zlib
+
+
+class FiltroBloom:
+    """Filtro de Bloom simples: "não está" é certo, "talvez esteja" exige confirmar"""
+
+    def __init__(self, capacidade, bits_por_item=10, num_hashes=7):
+        self.num_bits = max(1024, capacidade * bits_por_item)
+        self.num_hashes = num_hashes
+        self.bits = bytearray(self.num_bits // 8 + 1)
+
+    def _posicoes(self, chave):
+        dados = chave.encode()
+        h1 = zlib.crc32(dados)
+        h2 = zlib.adler32(dados) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def adicionar(self, chave):
+        for pos in self._posicoes(chave):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def talvez_contem(self, chave):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._posicoes(chave))
+
+
+class IndiceTelefones:
+    """Telefones normalizados em lista ordenada, com o nome na mesma posição.
+
+    Carregado em segundo plano na abertura e atualizado a cada cliente salvo.
+    Clientes cadastrados por outros terminais entram na próxima atualização
+    incremental (rowid maior que o último visto).
+    """
+
+    VALIDADE_NEGATIVO = 30   # Segundos em que um "não existe" dispensa o banco
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._telefones = []
+        self._nomes = []
+        self._bloom = FiltroBloom(0)
+        self._ultimo_rowid = 0
+        self.carregado = False
+        self.ultima_sincronizacao = 0.0
+
+    # ---------- Carga ----------
+    def carregar(self, conn):
+        """Carga completa (chamada fora da thread da interface)"""
+        linhas = conn.execute("SELECT telefone, nome, rowid FROM clientes ORDER BY telefone").fetchall()
+        telefones = [tel for tel, _, _ in linhas]
+        nomes = [nome or "" for _, nome, _ in linhas]
+        bloom = FiltroBloom(len(telefones) * 2)
+        for tel in telefones:
+            bloom.adicionar(tel)
+        ultimo_rowid = max((rowid for _, _, rowid in linhas), default=0)
+        with self._lock:
+            self._telefones, self._nomes, self._bloom = telefones, nomes, bloom
+            self._ultimo_rowid = ultimo_rowid
+            self.carregado = True
+            self.ultima_sincronizacao = time.monotonic()
+
+    def sincronizar(self, conn):
+        """Traz clientes novos ou regravados desde a última carga"""
+        if not self.carregado:
+            return
+        novos = conn.execute("SELECT telefone, nome, rowid FROM clientes WHERE rowid > ? ORDER BY rowid",
+                             (self._ultimo_rowid,)).fetchall()
+        for tel, nome, rowid in novos:
+            self.adicionar(tel, nome)
+            self._ultimo_rowid = max(self._ultimo_rowid, rowid)
+        self.ultima_sincronizacao = time.monotonic()
+
+    # ---------- Atualização ----------
+    def adicionar(self, telefone, nome):
+        with self._lock:
+            if len(self._telefones) >= self._bloom.num_bits // 10:
+                # Filtro lotado (falsos positivos demais): recria com o dobro
+                self._bloom = FiltroBloom(len(self._telefones) * 2)
+                for tel in self._telefones:
+                    self._bloom.adicionar(tel)
+            pos = bisect.bisect_left(self._telefones, telefone)
+            if pos < len(self._telefones) and self._telefones[pos] == telefone:
+                self._nomes[pos] = nome or ""
+            else:
+                self._telefones.insert(pos, telefone)
+                self._nomes.insert(pos, nome or "")
+                self._bloom.adicionar(telefone)
+
+    def remover(self, telefone):
+        # O filtro de Bloom não remove; fica só um falso positivo a mais
+        with self._lock:
+            pos = bisect.bisect_left(self._telefones, telefone)
+            if pos < len(self._telefones) and self._telefones[pos] == telefone:
+                del self._telefones[pos]
+                del self._nomes[pos]
+
+    # ---------- Consulta ----------
+    def certamente_ausente(self, telefone):
+        """True só quando o índice está carregado, recente e o número não existe"""
+        if not self.carregado:
+            return False
+        if time.monotonic() - self.ultima_sincronizacao > self.VALIDADE_NEGATIVO:
+            return False
+        return not self._bloom.talvez_contem(telefone)
+
+    def por_prefixo(self, prefixo, limite=8):
+        """Lista (telefone, nome) cujo telefone começa com o prefixo"""
+        with self._lock:
+            pos = bisect.bisect_left(self._telefones, prefixo)
+            resultado = []
+            while pos < len(self._telefones) and len(resultado) < limite:
+                tel = self._telefones[pos]
+                if not tel.startswith(prefixo):
+                    break
+                resultado.append((tel, self._nomes[pos]))
+                pos += 1
+            return resultado
+
+    def __len__(self):
+        return len(self._telefones)
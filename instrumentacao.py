@@ -0,0 +1,288 @@
+"""Instrumentação sempre ligada, gravada em JSONL rotativo (logs/eventos.jsonl).
+
+- Todo comando SQL das conexões do GerenciadorConexoes é cronometrado
+  (ConexaoMedida). Os tempos são somados por comando em memória e gravados
+  como um evento "sql_resumo" por minuto; comandos acima do limite viram um
+  evento "consulta_lenta" com o SQL e o formato dos parâmetros (tipos e
+  tamanhos, nunca os valores: são telefones e endereços de clientes).
+- Handlers da interface (@cronometrado) e impressões (cronometro) geram um
+  evento por chamada.
+- No executável --windowed não existe console: o que seria print() vai para
+  o mesmo arquivo como evento "print".
+
+A escrita em disco fica numa thread própria (QueueListener); na thread que
+mede, o custo é só o perf_counter e uma soma num dicionário.
+"""
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+LIMITE_LENTA_MS = 200              # Padrão do limite de consulta lenta
+TAMANHO_ARQUIVO = 5 * 1024 * 1024  # Bytes por arquivo antes de rotacionar
+ARQUIVOS_GUARDADOS = 5             # eventos.jsonl.1 ... .5
+INTERVALO_RESUMO = 60              # Segundos entre eventos sql_resumo
+COMANDOS_NO_RESUMO = 20            # Comandos (por tempo total) em cada resumo
+MAX_COMANDOS = 1000                # Comandos distintos somados em memória
+
+_log = logging.getLogger("totalpharma.eventos")
+_log.setLevel(logging.INFO)
+_log.propagate = False
+
+_lock = threading.Lock()
+_somas = {}                        # sql -> [qtd, segundos, maior]
+_limite_lenta = LIMITE_LENTA_MS / 1000
+_ouvinte = None
+_parar = threading.Event()
+
+
+class _FormatoJSON(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+class _SaidaParaLog:
+    """Substitui sys.stdout/stderr quando não há console"""
+
+    def write(self, texto):
+        if texto.strip():
+            evento("print", texto=texto.rstrip())
+
+    def flush(self):
+        pass
+
+
+def configurar(pasta, limite_lenta_ms=LIMITE_LENTA_MS):
+    """Liga a gravação dos eventos em `pasta`/eventos.jsonl"""
+    global _ouvinte, _limite_lenta
+    _limite_lenta = limite_lenta_ms / 1000
+    if _ouvinte is not None:
+        return
+    os.makedirs(pasta, exist_ok=True)
+    arquivo = logging.handlers.RotatingFileHandler(os.path.join(pasta, "eventos.jsonl"), maxBytes=TAMANHO_ARQUIVO,
+                                                   backupCount=ARQUIVOS_GUARDADOS, encoding="utf-8")
+    fila = queue.SimpleQueue()
+    na_fila = logging.handlers.QueueHandler(fila)
+    na_fila.setFormatter(_FormatoJSON())
+    _log.addHandler(na_fila)
+    _ouvinte = logging.handlers.QueueListener(fila, arquivo)
+    _ouvinte.start()
+    threading.Thread(target=_resumir_periodicamente, daemon=True, name="instrumentacao").start()
+    if sys.stdout is None:
+        sys.stdout = _SaidaParaLog()
+    if sys.stderr is None:
+        sys.stderr = _SaidaParaLog()
+    evento("inicio", pid=os.getpid(), limite_lenta_ms=limite_lenta_ms)
+
+
+def encerrar():
+    """Grava o último resumo e esvazia a fila no disco"""
+    global _ouvinte
+    if _ouvinte is None:
+        return
+    _parar.set()
+    gravar_resumo()
+    _ouvinte.stop()
+    _ouvinte = None
+
+
+def evento(tipo, **campos):
+    if _ouvinte is None:
+        return
+    _log.info({"ts": datetime.now().isoformat(timespec="milliseconds"), "tipo": tipo, **campos})
+
+
+# ================== SQL ==================
+def forma_parametros(parametros):
+    """Tipos (e tamanhos de texto) dos parâmetros, sem os valores"""
+    def forma(valor):
+        if isinstance(valor, (str, bytes)):
+            return f"{type(valor).__name__}({len(valor)})"
+        return type(valor).__name__
+    if isinstance(parametros, dict):
+        return {chave: forma(valor) for chave, valor in parametros.items()}
+    return [forma(valor) for valor in parametros]
+
+
+def registrar_sql(sql, parametros, segundos, lote=None):
+    with _lock:
+        soma = _somas.get(sql)
+        if soma is None:
+            chave = sql if len(_somas) < MAX_COMANDOS else "(outros)"
+            soma = _somas.setdefault(chave, [0, 0.0, 0.0])
+        soma[0] += 1
+        soma[1] += segundos
+        if segundos > soma[2]:
+            soma[2] = segundos
+    if segundos >= _limite_lenta:
+        campos = {"sql": " ".join(sql.split()), "ms": round(segundos * 1000, 2),
+                  "thread": threading.current_thread().name}
+        if lote is not None:
+            campos["linhas"] = lote
+        if parametros:
+            campos["parametros"] = forma_parametros(parametros)
+        evento("consulta_lenta", **campos)
+
+
+def gravar_resumo():
+    """Evento sql_resumo com os comandos que mais tomaram tempo desde o último"""
+    global _somas
+    with _lock:
+        somas, _somas = _somas, {}
+    if not somas:
+        return
+    maiores = sorted(somas.items(), key=lambda item: item[1][1], reverse=True)[:COMANDOS_NO_RESUMO]
+    evento("sql_resumo", segundos=INTERVALO_RESUMO, comandos=sum(s[0] for s in somas.values()), maiores=[
+        {"sql": " ".join(sql.split())[:300], "qtd": qtd, "total_ms": round(total * 1000, 2), "max_ms": round(maior * 1000, 2)}
+        for sql, (qtd, total, maior) in maiores])
+
+
+def _resumir_periodicamente():
+    while not _parar.wait(INTERVALO_RESUMO):
+        gravar_resumo()
+
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que cronometra execute/executemany (até a primeira linha, no caso de SELECT)"""
+
+    def execute(self, sql, parametros=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            registrar_sql(sql, parametros, time.perf_counter() - inicio)
+
+    def executemany(self, sql, sequencia):
+        # sequencia pode ser um iterador (ex.: cursor de outro banco): não é lida aqui
+        primeira = sequencia[0] if isinstance(sequencia, (list, tuple)) and sequencia else None
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, sequencia)
+        finally:
+            registrar_sql(sql, primeira, time.perf_counter() - inicio,
+                          lote=len(sequencia) if isinstance(sequencia, (list, tuple)) else "iterador")
+
+    def executescript(self, script):
+        inicio = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            registrar_sql(script, None, time.perf_counter() - inicio)
+
+
+class ConexaoMedida(sqlite3.Connection):
+    """Fábrica de conexão (sqlite3.connect(..., factory=ConexaoMedida))"""
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return self.cursor().executemany(sql, sequencia)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+# ================== HANDLERS E IMPRESSÃO ==================
+@contextmanager
+def cronometro(tipo, nome, **campos):
+    """Mede o bloco e grava um evento; o chamador pode acrescentar campos (ex.: erro)"""
+    inicio = time.perf_counter()
+    try:
+        yield campos
+    finally:
+        evento(tipo, nome=nome, ms=round((time.perf_counter() - inicio) * 1000, 2), **campos)
+
+
+def cronometrado(nome):
+    """Decorador para handlers da interface: um evento "handler" por chamada"""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                evento("handler", nome=nome, ms=round((time.perf_counter() - inicio) * 1000, 2))
+        return medida
+    return decorador
+
+
+# ================== ABERTURA ==================
+class TemposAbertura:
+    """Quanto custa cada etapa da abertura do programa, desde a criação do objeto.
+
+    Etapas da thread principal e de segundo plano se sobrepõem: cada uma
+    guarda início e fim. seguinte(nome) fecha uma etapa da thread principal
+    (desde o fim da anterior); etapa(nome) mede um bloco; marco(nome)
+    registra um instante (ex.: janela visível). Quando todos os `finais`
+    chegam, o relatório vai para o console/log (evento "abertura").
+    """
+
+    def __init__(self, finais=()):
+        self.inicio = time.perf_counter()
+        self.finais = set(finais)
+        self.etapas = []   # (nome, início, fim) em segundos desde self.inicio
+        self.concluida = False
+        self._anterior = self.inicio
+        self._lock = threading.Lock()
+
+    def registrar(self, nome, comeco, fim=None):
+        """Etapa entre os perf_counter() `comeco` e `fim` (padrão: agora)"""
+        fim = time.perf_counter() if fim is None else fim
+        with self._lock:
+            self.etapas.append((nome, comeco - self.inicio, fim - self.inicio))
+
+    def seguinte(self, nome):
+        agora = time.perf_counter()
+        self.registrar(nome, self._anterior, agora)
+        self._anterior = agora
+
+    @contextmanager
+    def etapa(self, nome):
+        comeco = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, comeco)
+
+    def marco(self, nome):
+        if self.concluida:
+            return
+        agora = time.perf_counter()
+        self.registrar(nome, agora, agora)
+        with self._lock:
+            self.finais.discard(nome)
+            pronta = not self.finais
+        if pronta:
+            self.concluir()
+
+    def concluir(self):
+        self.concluida = True
+        print(self.texto())
+        with self._lock:
+            etapas = [{"etapa": nome, "inicio_ms": round(inicio * 1000), "ms": round((fim - inicio) * 1000)}
+                      for nome, inicio, fim in sorted(self.etapas, key=lambda e: e[1])]
+        evento("abertura", etapas=etapas)
+
+    def texto(self):
+        with self._lock:
+            etapas = sorted(self.etapas, key=lambda e: (e[1], e[2]))
+        linhas = []
+        for nome, inicio, fim in etapas:
+            if fim == inicio:
+                linhas.append(f"[ABERTURA] {inicio * 1000:>7.0f}ms  ✓ {nome}")
+            else:
+                linhas.append(f"[ABERTURA] {inicio * 1000:>7.0f}ms  {(fim - inicio) * 1000:>6.0f}ms  {nome}")
+        return "\n".join(linhas)
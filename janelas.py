@@ -0,0 +1,118 @@
+"""Janelas reaproveitadas e contagem de widgets vivos.
+
+Montar um CTkToplevel com toda a árvore de widgets a cada clique custa
+tempo e, num PDV aberto o dia inteiro, qualquer referência esquecida a uma
+janela destruída vira memória que não volta. As telas de consulta são
+montadas uma vez: fechar só esconde a janela (withdraw) e abrir de novo
+mostra a mesma, com os dados atualizados.
+
+Com --debug-widgets, o MonitorWidgets conta periodicamente widgets, janelas
+e comandos Tcl vivos e registra a variação desde o início: se a contagem
+sobe a cada abertura de tela, algo está sendo recriado sem ser destruído.
+"""
+import tkinter
+
+import customtkinter as ctk
+
+import instrumentacao
+
+
+class Janelas:
+    """Registro das janelas montadas uma vez, por nome"""
+
+    def __init__(self, raiz):
+        self.raiz = raiz
+        self._janelas = {}   # nome -> (top, ao_abrir, modal)
+
+    def abrir(self, nome, titulo, geometria, montar, *args, modal=True):
+        """Mostra a janela `nome` e chama ao_abrir(*args).
+
+        Na primeira vez (ou se a janela foi destruída), montar(top) monta os
+        widgets e retorna ao_abrir, que recarrega os dados a cada abertura.
+        """
+        janela = self._janelas.get(nome)
+        if janela is None or not janela[0].winfo_exists():
+            top = ctk.CTkToplevel(self.raiz)
+            top.title(titulo)
+            top.geometry(geometria)
+            top.attributes("-topmost", True)
+            top.protocol("WM_DELETE_WINDOW", lambda: self.esconder(nome))
+            janela = self._janelas[nome] = (top, montar(top), modal)
+            print(f"[JANELAS] '{nome}' montada")
+        top, ao_abrir, modal = janela
+        top.deiconify()
+        top.lift()
+        top.focus_force()
+        if modal:
+            top.grab_set()
+        ao_abrir(*args)
+        return top
+
+    def esconder(self, nome):
+        """Fecha a janela sem destruir (a próxima abertura reaproveita os widgets)"""
+        janela = self._janelas.get(nome)
+        if janela is None or not janela[0].winfo_exists():
+            return
+        top = janela[0]
+        top.grab_release()
+        top.withdraw()
+
+    def montadas(self):
+        return sorted(nome for nome, janela in self._janelas.items() if janela[0].winfo_exists())
+
+
+# ================== CONTAGEM (DEPURAÇÃO) ==================
+def contar_widgets(raiz):
+    """{"widgets", "janelas", "visiveis", "comandos_tcl"} vivos a partir de `raiz`"""
+    widgets = janelas = visiveis = 0
+    pendentes = [raiz]
+    while pendentes:
+        widget = pendentes.pop()
+        widgets += 1
+        if isinstance(widget, tkinter.Toplevel):
+            janelas += 1
+            if widget.winfo_viewable():
+                visiveis += 1
+        pendentes.extend(widget.winfo_children())
+    # Cada widget, bind e after pendente registra um comando no Tcl
+    comandos = len(raiz.tk.splitlist(raiz.tk.call("info", "commands")))
+    return {"widgets": widgets, "janelas": janelas, "visiveis": visiveis, "comandos_tcl": comandos}
+
+
+class MonitorWidgets:
+    """Conta widgets e janelas vivos a cada `intervalo` ms e registra a variação"""
+
+    def __init__(self, raiz, intervalo, janelas=None):
+        self.raiz = raiz
+        self.intervalo = intervalo
+        self.janelas = janelas
+        self.inicial = None
+        self.ultima = None
+
+    def iniciar(self):
+        self.contar()   # Base: a tela principal recém-montada
+        self.raiz.after(self.intervalo, self._contar)
+
+    def contar(self):
+        contagem = contar_widgets(self.raiz)
+        if self.inicial is None:
+            self.inicial = contagem
+        self.ultima = contagem
+        return contagem
+
+    def texto(self, separador=" "):
+        """Contagem atual e a variação desde a primeira"""
+        contagem = self.contar()
+        partes = [f"{nome}={qtd} ({qtd - self.inicial[nome]:+d})" for nome, qtd in contagem.items()]
+        if self.janelas is not None:
+            partes.append(f"montadas={','.join(self.janelas.montadas()) or '-'}")
+        return separador.join(partes)
+
+    def _contar(self):
+        try:
+            texto = self.texto()
+        except tkinter.TclError:
+            return   # Janela principal já fechada
+        print(f"[WIDGETS] {texto}")
+        instrumentacao.evento("widgets", **self.ultima)
+        self.raiz.after(self.intervalo, self._contar)
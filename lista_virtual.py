@@ -0,0 +1,271 @@
+"""Lista rolável virtualizada para as telas com muitas linhas.
+
+Um CTkScrollableFrame cria um card com vários widgets para cada linha do
+resultado; um histórico de 60 dias com alguns milhares de pedidos leva
+segundos para aparecer e centenas de MB de widgets. A ListaVirtual tem
+widgets só para as linhas que cabem na tela: ao rolar, as mesmas linhas são
+reaproveitadas com os dados da nova posição, e os dados vêm do banco em
+páginas, à medida que aparecem.
+"""
+import math
+
+import customtkinter as ctk
+
+TAMANHO_PAGINA = 100      # Itens pedidos ao banco de cada vez
+PAGINAS_EM_MEMORIA = 10   # Acima disso, as páginas mais longe da posição atual são descartadas
+ESPACO = 5                # Espaço entre uma linha e outra
+
+
+class ListaVirtual(ctk.CTkFrame):
+    """Lista de linhas de altura fixa que só tem widgets para as linhas visíveis.
+
+    criar_linha(frame) monta os widgets de uma linha vazia dentro de `frame`
+    e retorna o que preencher_linha precisa (ex.: dicionário de widgets);
+    preencher_linha(partes, item, indice) troca textos, cores e comandos
+    sempre que a linha passa a mostrar outro item.
+
+    Os itens vêm de mostrar(itens), lista já em memória, ou de
+    carregar(total, buscar_pagina): buscar_pagina(inicio, quantidade,
+    ao_chegar) deve buscar em segundo plano e chamar ao_chegar(itens) na
+    thread da interface (ao_chegar(None) se falhar). Só uma página é pedida
+    por vez e só as que aparecem na tela.
+
+    Sem total conhecido (paginação por chave), mostrar(itens, buscar_mais):
+    ao rolar perto do fim é chamado buscar_mais(ultimo_item, ao_chegar), e
+    ao_chegar(itens, fim) acrescenta os itens; fim=True encerra a lista.
+    """
+
+    def __init__(self, master, altura_linha, criar_linha, preencher_linha, cor_linha="#2C3E50",
+                 texto_vazio="Nenhum registro encontrado.", tamanho_pagina=TAMANHO_PAGINA, **kwargs):
+        super().__init__(master, **kwargs)
+        self.altura_linha = altura_linha
+        self.criar_linha = criar_linha
+        self.preencher_linha = preencher_linha
+        self.cor_linha = cor_linha
+        self.texto_vazio = texto_vazio
+        self.tamanho_pagina = tamanho_pagina
+
+        self.total = 0
+        self.primeira = 0           # Índice do item mostrado na primeira linha
+        self._itens = []            # Modo lista em memória
+        self._buscar_pagina = None  # Modo paginado
+        self._buscar_mais = None    # Modo "carregar mais"
+        self._paginas = {}          # número da página -> itens
+        self._pedindo = None        # Página em busca (uma por vez)
+        self._geracao = 0           # Muda a cada carga; respostas antigas são ignoradas
+        self._falhou = False
+        self._aviso = None
+        self._linhas = []           # Widgets reaproveitados: (frame, partes, lbl_carregando)
+        self._visiveis = 0
+        self._tag = f"ListaVirtual{id(self)}"
+
+        self.area = ctk.CTkFrame(self, fg_color="transparent")
+        self.area.pack(side="left", fill="both", expand=True, padx=(5, 0), pady=5)
+        self.barra = ctk.CTkScrollbar(self, command=self._rolar_barra)
+        self.barra.pack(side="right", fill="y", pady=5)
+        self.lbl_vazio = ctk.CTkLabel(self.area, text=texto_vazio, text_color="#888")
+
+        self.area.bind("<Configure>", lambda event: self._redimensionar())
+        self.bind_class(self._tag, "<MouseWheel>", lambda event: self.rolar(-1 if event.delta > 0 else 1))
+        self.bind_class(self._tag, "<Button-4>", lambda event: self.rolar(-1))
+        self.bind_class(self._tag, "<Button-5>", lambda event: self.rolar(1))
+        self._marcar(self.area)
+
+    # ---------- Dados ----------
+    def mostrar(self, itens, buscar_mais=None):
+        """Mostra uma lista já carregada, do começo; com buscar_mais, busca o resto ao rolar"""
+        self._reiniciar()
+        self._itens = list(itens)
+        self._buscar_mais = buscar_mais
+        self.total = len(self._itens)
+        self._atualizar()
+
+    def carregar(self, total, buscar_pagina, primeira_pagina=None):
+        """Mostra `total` itens buscados aos poucos com buscar_pagina, do começo"""
+        self._reiniciar()
+        self._buscar_pagina = buscar_pagina
+        self.total = total
+        if primeira_pagina is not None:
+            self._guardar_pagina(0, primeira_pagina)
+        self._atualizar()
+
+    def avisar(self, texto):
+        """Esvazia a lista e mostra `texto` no lugar (ex.: erro na busca)"""
+        self._reiniciar()
+        self._aviso = texto
+        self._atualizar()
+
+    def item(self, indice):
+        """Item na posição `indice`, ou None se estiver fora da lista ou ainda não carregado"""
+        if not 0 <= indice < self.total:
+            return None
+        if self._buscar_pagina is None:
+            return self._itens[indice] if indice < len(self._itens) else None
+        itens = self._paginas.get(indice // self.tamanho_pagina)
+        deslocamento = indice % self.tamanho_pagina
+        if itens is None or deslocamento >= len(itens):
+            return None
+        return itens[deslocamento]
+
+    def _reiniciar(self):
+        self._geracao += 1
+        self._itens = []
+        self._buscar_pagina = None
+        self._buscar_mais = None
+        self._paginas = {}
+        self._pedindo = None
+        self._falhou = False
+        self._aviso = None
+        self.total = 0
+        self.primeira = 0
+
+    def _pedir(self, pagina):
+        if self._pedindo is not None or self._falhou:
+            return   # A resposta da página em busca chama _atualizar, que pede a próxima que faltar
+        self._pedindo = pagina
+        geracao = self._geracao
+        self._buscar_pagina(pagina * self.tamanho_pagina, self.tamanho_pagina,
+                            lambda itens: self._chegou(geracao, pagina, itens))
+
+    def _chegou(self, geracao, pagina, itens):
+        if geracao != self._geracao or not self.winfo_exists():
+            return
+        self._pedindo = None
+        if itens is None:
+            self._falhou = True   # Nova tentativa só ao rolar
+        else:
+            self._guardar_pagina(pagina, itens)
+            self.primeira = self._limitar(self.primeira)
+        self._atualizar()
+
+    def _pedir_mais(self):
+        if self._pedindo is not None or self._falhou:
+            return
+        self._pedindo = "mais"
+        self.total = len(self._itens) + 1   # Linha "Carregando..." no fim
+        geracao = self._geracao
+        self._buscar_mais(self._itens[-1] if self._itens else None,
+                          lambda itens, fim=False: self._chegaram_mais(geracao, itens, fim))
+
+    def _chegaram_mais(self, geracao, itens, fim):
+        if geracao != self._geracao or not self.winfo_exists():
+            return
+        self._pedindo = None
+        if itens is None:
+            self._falhou = True
+        else:
+            self._itens.extend(itens)
+            if fim or not itens:
+                self._buscar_mais = None
+        self.total = len(self._itens) + (1 if self._falhou else 0)
+        self.primeira = self._limitar(self.primeira)
+        self._atualizar()
+
+    def _guardar_pagina(self, pagina, itens):
+        self._paginas[pagina] = itens
+        if len(itens) < self.tamanho_pagina:
+            # Página incompleta: a lista acaba aqui (o total era uma estimativa)
+            self.total = min(self.total, pagina * self.tamanho_pagina + len(itens))
+        atual = self.primeira // self.tamanho_pagina
+        while len(self._paginas) > PAGINAS_EM_MEMORIA:
+            del self._paginas[max(self._paginas, key=lambda p: abs(p - atual))]
+
+    # ---------- Rolagem ----------
+    def rolar(self, linhas):
+        self._falhou = False
+        self._ir_para(self.primeira + linhas)
+
+    def _rolar_barra(self, acao, valor, unidade=None):
+        if acao == "moveto":
+            self._ir_para(round(float(valor) * self.total))
+        elif unidade == "pages":
+            self.rolar(int(valor) * max(1, self._visiveis - 1))
+        else:
+            self.rolar(int(valor))
+
+    def _ir_para(self, primeira):
+        primeira = self._limitar(primeira)
+        if primeira != self.primeira:
+            self.primeira = primeira
+            self._atualizar()
+
+    def _limitar(self, primeira):
+        return max(0, min(primeira, self.total - self._inteiras()))
+
+    def _inteiras(self):
+        """Linhas que cabem inteiras na área"""
+        return max(1, int(self.area.winfo_height() / (self.altura_linha * self._get_widget_scaling())))
+
+    # ---------- Widgets ----------
+    def _redimensionar(self):
+        altura = self.area.winfo_height() / (self.altura_linha * self._get_widget_scaling())
+        self._visiveis = math.ceil(altura)
+        while len(self._linhas) < self._visiveis:
+            self._nova_linha()
+        self.primeira = self._limitar(self.primeira)
+        self._atualizar()
+
+    def _nova_linha(self):
+        frame = ctk.CTkFrame(self.area, fg_color=self.cor_linha, height=self.altura_linha - ESPACO)
+        frame.pack_propagate(False)
+        frame.grid_propagate(False)
+        partes = self.criar_linha(frame)
+        lbl_carregando = ctk.CTkLabel(frame, text="Carregando...", text_color="#888", fg_color=self.cor_linha)
+        self._marcar(frame)
+        self._linhas.append((frame, partes, lbl_carregando))
+
+    def _marcar(self, widget):
+        """Faz a roda do mouse rolar a lista em cima de qualquer widget dela"""
+        tags = widget.bindtags()
+        if self._tag not in tags:
+            widget.bindtags((self._tag,) + tags)
+        for filho in widget.winfo_children():
+            self._marcar(filho)
+
+    def _atualizar(self):
+        """Põe nas linhas visíveis os itens a partir de self.primeira"""
+        for posicao, (frame, partes, lbl_carregando) in enumerate(self._linhas):
+            indice = self.primeira + posicao
+            if posicao >= self._visiveis or indice >= self.total:
+                frame.place_forget()
+                continue
+            frame.place(x=0, y=posicao * self.altura_linha, relwidth=1)
+            item = self.item(indice)
+            if item is None:
+                if self._buscar_pagina is not None:
+                    self._pedir(indice // self.tamanho_pagina)
+                lbl_carregando.configure(text="Falha ao carregar (role para tentar de novo)" if self._falhou
+                                         else "Carregando...")
+                lbl_carregando.place(relx=0, rely=0, relwidth=1, relheight=1)
+                lbl_carregando.lift()
+                continue
+            lbl_carregando.place_forget()
+            # Ao rolar, toda linha passa a mostrar outro índice: sempre preenche
+            self.preencher_linha(partes, item, indice)
+
+        # "Carregar mais" ao chegar perto do fim do que já veio
+        if self._buscar_mais is not None and self._visiveis and self._pedindo is None and not self._falhou:
+            if self.primeira + 2 * self._visiveis >= len(self._itens):
+                self._pedir_mais()
+                self._atualizar()
+                return
+
+        # Já busca a próxima página quando a tela chega perto do fim da atual
+        if self._buscar_pagina is not None and self._pedindo is None and self._visiveis:
+            proxima = (self.primeira + self._visiveis + self.tamanho_pagina // 2) // self.tamanho_pagina
+            if proxima * self.tamanho_pagina < self.total and proxima not in self._paginas:
+                self._pedir(proxima)
+
+        if self.total:
+            self.lbl_vazio.place_forget()
+            fim = min(self.total, self.primeira + self._inteiras())
+            self.barra.set(self.primeira / self.total, fim / self.total)
+        else:
+            self.lbl_vazio.configure(text=self._aviso or self.texto_vazio)
+            self.lbl_vazio.place(relx=0.5, y=20, anchor="n")
+            self.barra.set(0, 1)
+
+    def destroy(self):
+        for evento in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.unbind_class(self._tag, evento)
+        super().destroy()
@@ -0,0 +1,174 @@
+"""Manutenção do banco em segundo plano, nas janelas ociosas da interface.
+
+Tarefas:
+- checkpoint: wal_checkpoint quando o -wal passa de LIMITE_WAL;
+- incremental_vacuum: devolve ao disco, em lotes, as páginas livres deixadas
+  por exclusões (bancos antigos são convertidos para auto_vacuum incremental
+  uma vez, com VACUUM, no horário de fechamento);
+- quick_check: uma tabela por vez, retomando de onde parou;
+- optimize: no encerramento do programa.
+
+Cada execução fica registrada na tabela manutencao (migração 8), vista no
+diagnóstico do banco.
+"""
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+LIMITE_WAL = 16 * 1024 * 1024      # Bytes do -wal que disparam o checkpoint
+LOTE_VACUUM = 256                  # Páginas devolvidas por incremental_vacuum
+MIN_PAGINAS_LIVRES = 256           # Abaixo disso não vale a pena
+INTERVALO_QUICK_CHECK = 24 * 3600  # Segundos entre ciclos completos do quick_check
+LIMITE_ANALISE = 400               # PRAGMA analysis_limit usado pelo optimize
+
+TAREFAS = ("checkpoint", "incremental_vacuum", "converter_vacuum", "quick_check", "optimize")
+
+
+class Manutencao:
+    """Tarefas curtas, executadas dentro de um orçamento de tempo por chamada"""
+
+    def __init__(self, gerenciador, db_path):
+        self.banco = gerenciador
+        self.db_path = db_path
+        self._wal_conferido = 0   # Tamanho do -wal no último checkpoint
+
+    # ---------- Registro ----------
+    def _registrar(self, conn, tarefa, duracao, resultado, progresso=None):
+        conn.execute("""
+            INSERT OR REPLACE INTO manutencao (tarefa, ultima_execucao, duracao, resultado, progresso)
+            VALUES (?, ?, ?, ?, ?)
+        """, (tarefa, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), duracao, resultado, progresso))
+        conn.commit()
+
+    def _registro(self, conn, tarefa):
+        return conn.execute("SELECT ultima_execucao, duracao, resultado, progresso FROM manutencao WHERE tarefa = ?",
+                            (tarefa,)).fetchone()
+
+    def registros(self):
+        """{tarefa: (ultima_execucao, duracao, resultado)} para o diagnóstico"""
+        linhas = self.banco.conexao().execute(
+            "SELECT tarefa, ultima_execucao, duracao, resultado FROM manutencao").fetchall()
+        return {tarefa: (quando, duracao, resultado) for tarefa, quando, duracao, resultado in linhas}
+
+    # ---------- Execução ----------
+    def executar_pendentes(self, orcamento=2.0, fechamento=False):
+        """Roda o que estiver pendente até esgotar `orcamento` segundos (thread de banco)"""
+        conn = self.banco.conexao()
+        limite = time.monotonic() + orcamento
+        executadas = []
+        for tarefa in (self._checkpoint, self._incremental_vacuum, self._quick_check):
+            if time.monotonic() >= limite:
+                break
+            try:
+                if tarefa(conn, limite):
+                    executadas.append(tarefa.__name__.lstrip("_"))
+            except sqlite3.OperationalError as e:
+                # Banco ocupado por outro terminal: tenta na próxima janela
+                print(f"[MANUTENCAO] {tarefa.__name__.lstrip('_')} adiada: {e}")
+        if fechamento and time.monotonic() < limite:
+            try:
+                if self._converter_vacuum(conn):
+                    executadas.append("converter_vacuum")
+            except sqlite3.OperationalError as e:
+                print(f"[MANUTENCAO] converter_vacuum adiada: {e}")
+        return executadas
+
+    def _checkpoint(self, conn, limite):
+        wal = self.db_path + "-wal"
+        tamanho = os.path.getsize(wal) if os.path.exists(wal) else 0
+        if tamanho < LIMITE_WAL or tamanho == self._wal_conferido:
+            # O arquivo só encolhe quando o WAL recomeça (journal_size_limit)
+            return False
+        inicio = time.perf_counter()
+        # PASSIVE não espera leitores nem bloqueia gravações dos outros terminais
+        ocupado, paginas_log, copiadas = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        self._wal_conferido = tamanho
+        resultado = f"{copiadas}/{paginas_log} páginas ({tamanho / 1048576:.1f} MB de WAL)"
+        self._registrar(conn, "checkpoint", time.perf_counter() - inicio, resultado)
+        return True
+
+    def _incremental_vacuum(self, conn, limite):
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return False
+        livres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if livres < MIN_PAGINAS_LIVRES:
+            return False
+        inicio = time.perf_counter()
+        devolvidas = 0
+        while True:
+            conn.execute(f"PRAGMA incremental_vacuum({LOTE_VACUUM})").fetchall()
+            restantes = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            devolvidas += livres - restantes
+            progrediu = restantes < livres
+            livres = restantes
+            if not livres or not progrediu or time.monotonic() >= limite:
+                break
+        self._registrar(conn, "incremental_vacuum", time.perf_counter() - inicio,
+                        f"{devolvidas} páginas devolvidas, {livres} livres")
+        return True
+
+    def _converter_vacuum(self, conn):
+        """Banco antigo (auto_vacuum NONE) com muito espaço livre: um VACUUM único"""
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        livres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if livres < MIN_PAGINAS_LIVRES:
+            return False
+        inicio = time.perf_counter()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        self._registrar(conn, "converter_vacuum", time.perf_counter() - inicio,
+                        f"VACUUM com auto_vacuum incremental ({livres} páginas livres)")
+        return True
+
+    def _quick_check(self, conn, limite):
+        """quick_check por tabela; o ponto onde parou fica salvo no registro"""
+        registro = self._registro(conn, "quick_check")
+        progresso = registro[3] if registro else None
+        if progresso is None:
+            # Ciclo completo recente: nada a fazer
+            if registro and registro[0]:
+                ultima = datetime.strptime(registro[0], "%Y-%m-%d %H:%M:%S")
+                if (datetime.now() - ultima).total_seconds() < INTERVALO_QUICK_CHECK:
+                    return False
+            progresso = "|0|ok"
+        # progresso = "última tabela conferida|segundos acumulados|situação"
+        proxima, acumulado, situacao = progresso.split("|", 2)
+        acumulado = float(acumulado)
+
+        tabelas = [linha[0] for linha in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name > ? ORDER BY name", (proxima,))]
+        inicio = time.perf_counter()
+        for tabela in tabelas:
+            resultado = conn.execute(f"PRAGMA quick_check('{tabela}')").fetchone()[0]
+            if resultado != "ok":
+                situacao = f"{tabela}: {resultado}"
+                print(f"[MANUTENCAO] quick_check encontrou problema em {tabela}: {resultado}")
+            proxima = tabela
+            if time.monotonic() >= limite:
+                break
+        acumulado += time.perf_counter() - inicio
+
+        if tabelas and proxima != tabelas[-1]:
+            # Orçamento acabou no meio: retoma da próxima tabela na próxima janela
+            anterior = registro[:3] if registro else (None, None, None)
+            self._registrar_progresso(conn, anterior, f"{proxima}|{acumulado}|{situacao}")
+        else:
+            self._registrar(conn, "quick_check", acumulado, situacao)
+        return True
+
+    def _registrar_progresso(self, conn, anterior, progresso):
+        conn.execute("""
+            INSERT INTO manutencao (tarefa, ultima_execucao, duracao, resultado, progresso) VALUES ('quick_check', ?, ?, ?, ?)
+            ON CONFLICT(tarefa) DO UPDATE SET progresso = excluded.progresso
+        """, (*anterior, progresso))
+        conn.commit()
+
+    def ao_encerrar(self):
+        """PRAGMA optimize limitado, no fechamento do programa"""
+        conn = self.banco.conexao()
+        inicio = time.perf_counter()
+        conn.execute(f"PRAGMA analysis_limit={LIMITE_ANALISE}")
+        conn.execute("PRAGMA optimize")
+        self._registrar(conn, "optimize", time.perf_counter() - inicio, "ok")
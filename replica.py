@@ -0,0 +1,222 @@
+"""Réplica local (nesta máquina) de clientes, histórico de endereços e lembretes.
+
+Com o banco na rede, as leituras do cadastro saem da réplica e continuam
+funcionando com o servidor fora do ar. A réplica acompanha o servidor pelo
+log_replicacao (migração 7); o que o terminal grava vai pela fila de gravação
+e é aplicado na réplica como provisório até o servidor confirmar.
+
+Regras de conflito:
+- pedidos só são acrescentados (uuid), nunca sobrescritos;
+- cliente: vence o atualizado_em mais recente; empate mantém o do servidor;
+- depois de reconciliar, o servidor é a verdade: linhas provisórias são
+  descartadas e as chaves tocadas localmente são relidas do servidor.
+"""
+import sqlite3
+import threading
+import time
+
+from banco import (TABELAS_REPLICADAS, GerenciadorConexoes, erro_exige_reconexao, gravar_cadastro_do_pedido,
+                   gravar_cliente, gravar_da_fila, migrar, podar_log_replicacao)
+
+LOTE_LOG = 5000        # Entradas do log lidas por vez
+LOTE_CHAVES = 500      # Chaves por SELECT ... IN (...)
+
+
+class ReplicaLocal:
+    INTERVALO = 15               # Segundos entre sincronizações
+    INTERVALO_PODA = 3600        # Segundos entre podas do log no servidor
+
+    def __init__(self, caminho, principal, fila=None):
+        self.caminho = caminho
+        self.principal = principal
+        self.fila = fila
+        self.local = GerenciadorConexoes(caminho, modo="local")
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._ultima_poda = 0.0
+        self._schema_conferido = False
+        self.online = False
+        self.ultimo_erro = None
+        self.ultima_sincronizacao = None   # time.time() do último sucesso
+        self._preparar()
+
+    def _preparar(self):
+        conn = self.local.conexao()
+        migrar(conn)
+        with self.local.transacao("replica_preparar") as cursor:
+            # A réplica não alimenta ninguém: sem log próprio
+            for tabela in TABELAS_REPLICADAS:
+                for evento in ("insert", "update", "delete"):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS trg_log_{tabela}_{evento}")
+            cursor.execute("CREATE TABLE IF NOT EXISTS replica_meta (chave TEXT PRIMARY KEY, valor)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS replica_pendentes (tabela TEXT, chave, PRIMARY KEY (tabela, chave))")
+
+    # ---------- Acesso (mesma interface do GerenciadorConexoes) ----------
+    def conexao(self):
+        return self.local.conexao()
+
+    def transacao(self, operacao="outras"):
+        return self.local.transacao(operacao)
+
+    def fechar_todas(self):
+        self.local.fechar_todas()
+
+    @property
+    def pronta(self):
+        """True depois da primeira carga completa"""
+        return self._meta("seq") is not None
+
+    def _meta(self, chave):
+        linha = self.local.conexao().execute("SELECT valor FROM replica_meta WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else None
+
+    # ---------- Gravações locais (provisórias) ----------
+    def aplicar_cliente(self, cliente):
+        with self.local.transacao("replica_cliente") as cursor:
+            gravar_cliente(cursor, cliente)
+            self._marcar_pendente(cursor, "clientes", cliente["telefone"])
+
+    def aplicar_pedido(self, pedido):
+        with self.local.transacao("replica_pedido") as cursor:
+            gravar_cadastro_do_pedido(cursor, pedido, provisorio=True)
+            self._marcar_pendente(cursor, "clientes", pedido["telefone"])
+
+    def aplicar_alteracao(self, dados):
+        """Endereço, lembrete ou exclusão que foi para a fila (banco.gravar_da_fila)"""
+        with self.local.transacao("replica_" + dados["tipo"]) as cursor:
+            gravar_da_fila(cursor, dados, provisorio=True)
+            if "telefone" in dados:
+                self._marcar_pendente(cursor, "clientes", dados["telefone"])
+            else:
+                self._marcar_pendente(cursor, "lembretes", dados["id"])
+
+    def _marcar_pendente(self, cursor, tabela, chave):
+        cursor.execute("INSERT OR IGNORE INTO replica_pendentes (tabela, chave) VALUES (?, ?)", (tabela, chave))
+
+    # ---------- Sincronização ----------
+    def iniciar(self):
+        threading.Thread(target=self._executar, daemon=True, name="replica-local").start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _executar(self):
+        while not self._parar.is_set():
+            self.sincronizar()
+            self._parar.wait(self.INTERVALO)
+
+    def sincronizar(self):
+        """Traz do servidor o que mudou; retorna False se o servidor não respondeu"""
+        if self.fila is not None and self.fila.quantidade_pendente():
+            # Gravações deste terminal ainda não chegaram ao servidor: espera
+            # a fila esvaziar para não mostrar uma versão mais velha no meio
+            self.online = not self.fila.ultimo_erro
+            return False
+        with self._lock:
+            try:
+                remoto = self.principal.conexao()
+                if not self._schema_conferido:
+                    # Servidor pode ter sido criado (ou restaurado) com schema antigo
+                    migrar(remoto)
+                    self._schema_conferido = True
+                if self._meta("seq") is None:
+                    self._carga_completa(remoto)
+                else:
+                    self._carga_incremental(remoto)
+                self._podar(remoto)
+            except sqlite3.Error as e:
+                self.online = False
+                self.ultimo_erro = f"{type(e).__name__}: {e}"
+                print(f"[REPLICA] Servidor indisponível: {self.ultimo_erro}")
+                if erro_exige_reconexao(e):
+                    self.principal.reconectar()
+                return False
+            self.online = True
+            self.ultimo_erro = None
+            self.ultima_sincronizacao = time.time()
+            return True
+
+    def _colunas(self, conn, tabela):
+        return [linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")]
+
+    def _colunas_comuns(self, remoto, tabela):
+        locais = set(self._colunas(self.local.conexao(), tabela))
+        return [c for c in self._colunas(remoto, tabela) if c in locais]
+
+    def _carga_completa(self, remoto):
+        inicio = time.perf_counter()
+        # Leitura dentro de uma transação: tabelas e seq do mesmo instante
+        remoto.execute("BEGIN")
+        try:
+            seq = remoto.execute("SELECT COALESCE(MAX(seq), 0) FROM log_replicacao").fetchone()[0]
+            with self.local.transacao("replica_carga") as cursor:
+                for tabela in TABELAS_REPLICADAS:
+                    colunas = self._colunas_comuns(remoto, tabela)
+                    lista = ", ".join(colunas)
+                    cursor.execute(f"DELETE FROM {tabela}")
+                    linhas = remoto.execute(f"SELECT {lista} FROM {tabela}")
+                    cursor.executemany(f"INSERT INTO {tabela} ({lista}) VALUES ({', '.join('?' * len(colunas))})", linhas)
+                cursor.execute("DELETE FROM replica_pendentes")
+                cursor.execute("INSERT OR REPLACE INTO replica_meta (chave, valor) VALUES ('seq', ?)", (seq,))
+        finally:
+            remoto.rollback()
+        print(f"[REPLICA] Carga completa em {time.perf_counter() - inicio:.1f}s (seq {seq})")
+
+    def _carga_incremental(self, remoto):
+        seq_local = self._meta("seq")
+        menor, maior = remoto.execute("SELECT MIN(seq), MAX(seq) FROM log_replicacao").fetchone()
+        if menor is not None and (menor > seq_local + 1 or maior < seq_local):
+            # Log podado além do nosso ponto, ou banco restaurado de backup
+            print("[REPLICA] Log do servidor não cobre a réplica, recarregando tudo")
+            self._carga_completa(remoto)
+            return
+
+        # Com a fila vazia, o servidor já tem tudo que foi gravado aqui
+        pendentes = self.local.conexao().execute("SELECT tabela, chave FROM replica_pendentes").fetchall()
+        while True:
+            entradas = remoto.execute("SELECT seq, tabela, chave FROM log_replicacao WHERE seq > ? ORDER BY seq LIMIT ?",
+                                      (seq_local, LOTE_LOG)).fetchall()
+            if not entradas and not pendentes:
+                return
+            alteradas = {}
+            for tabela, chave in pendentes + [(t, c) for _, t, c in entradas]:
+                if tabela in TABELAS_REPLICADAS:
+                    alteradas.setdefault(tabela, set()).add(chave)
+            if entradas:
+                seq_local = entradas[-1][0]
+            self._aplicar(remoto, alteradas, seq_local, reconciliar=bool(pendentes))
+            pendentes = []
+            if len(entradas) < LOTE_LOG:
+                return
+
+    def _aplicar(self, remoto, alteradas, seq, reconciliar=False):
+        """Copia do servidor o estado atual das chaves alteradas (ausente = apagada)"""
+        with self.local.transacao("replica_sincronizar") as cursor:
+            for tabela, chaves in alteradas.items():
+                coluna_chave = TABELAS_REPLICADAS[tabela]
+                colunas = self._colunas_comuns(remoto, tabela)
+                lista = ", ".join(colunas)
+                chaves = list(chaves)
+                for i in range(0, len(chaves), LOTE_CHAVES):
+                    parte = chaves[i:i + LOTE_CHAVES]
+                    marcas = ", ".join("?" * len(parte))
+                    linhas = remoto.execute(f"SELECT {lista} FROM {tabela} WHERE {coluna_chave} IN ({marcas})", parte).fetchall()
+                    cursor.execute(f"DELETE FROM {tabela} WHERE {coluna_chave} IN ({marcas})", parte)
+                    cursor.executemany(f"INSERT INTO {tabela} ({lista}) VALUES ({', '.join('?' * len(colunas))})", linhas)
+            if reconciliar:
+                cursor.execute("DELETE FROM historico_enderecos WHERE id < 0")
+                cursor.execute("DELETE FROM lembretes WHERE id < 0")
+                cursor.execute("DELETE FROM replica_pendentes")
+            cursor.execute("INSERT OR REPLACE INTO replica_meta (chave, valor) VALUES ('seq', ?)", (seq,))
+
+    def _podar(self, remoto):
+        if time.monotonic() - self._ultima_poda < self.INTERVALO_PODA:
+            return
+        self._ultima_poda = time.monotonic()
+        try:
+            podar_log_replicacao(remoto)
+            remoto.commit()
+        except sqlite3.OperationalError as e:
+            # Banco ocupado: fica para a próxima
+            remoto.rollback()
+            print(f"[REPLICA] Poda do log adiada: {e}")
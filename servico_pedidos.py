@@ -0,0 +1,478 @@
+"""Regras do PDV sem interface: clientes, pedidos, lembretes e relatórios.
+
+O App só lê os campos da tela, monta os dicionários abaixo e chama o
+ServicoPedidos numa thread de banco (via no_banco). O mesmo código roda sem
+display em importações em massa e testes de carga:
+
+    servico = ServicoPedidos(GerenciadorConexoes("teste.db"))
+    pedido = montar_pedido(cliente, "Entregador A", 2590, 500, {"partes": [("Pix", "", None)]})
+    servico.gravar_pedidos([pedido])
+
+Dados trocados (dicionários simples, os mesmos da fila de gravação):
+- cliente: telefone, nome, rua, numero, bairro, referencia;
+- pagamento: {"partes": [(forma, parcelas, valor em reais)], "recebido": reais
+  entregues em dinheiro}; uma parte = pagamento único (valor ignorado), duas = misto;
+- lembrete: {"medicamento", "data_aviso" ('aaaa-mm-dd')}.
+"""
+import csv
+import gzip
+import os
+import textwrap
+import uuid
+from datetime import datetime, timedelta
+
+from banco import (agora_utc, buscar_cliente_por_telefone, buscar_clientes, contar_lembretes_pendentes,
+                   contar_lembretes_vencidos, cursor_entregas_do_periodo, data_do_dia, dia_de, enderecos_do_cliente,
+                   entregas_do_periodo, formatar_centavos, gravar_cliente, gravar_da_fila, gravar_pedido, interrompivel,
+                   lembretes_pendentes, lembretes_vencidos, pagina_entregas_do_periodo, painel_do_dia, resumo_do_periodo)
+
+DDD_PADRAO = "83"
+LARGURA_PAPEL = 42
+LOTE_TRANSACAO = 500      # Registros por transação nas gravações em massa
+LOTE_EXPORTACAO = 2000    # Linhas lidas do cursor por vez na exportação do período
+DIAS_ANTECEDENCIA = 3     # O lembrete avisa N dias antes do remédio acabar
+CAMPOS_CLIENTE = ("telefone", "nome", "rua", "numero", "bairro", "referencia")
+CABECALHO_RELATORIO = ["ID", "Data", "Cliente", "Telefone", "Entregador", "Valor (R$)", "Pagamento"]
+
+
+class DadosInvalidos(Exception):
+    """Dados incompletos ou inválidos; a mensagem é mostrada ao atendente"""
+
+
+# ================== TELEFONES E VALORES ==================
+def limpar_telefone(tel):
+    """Só os dígitos; número de 8 ou 9 dígitos ganha o DDD padrão"""
+    numeros = "".join(filter(str.isdigit, tel))
+    tam = len(numeros)
+    if tam == 8 or tam == 9:
+        return f"{DDD_PADRAO}{numeros}"
+    return numeros
+
+
+def formatar_telefone(tel):
+    numeros = "".join(filter(str.isdigit, tel))
+    if len(numeros) == 11:
+        return f"({numeros[:2]}) {numeros[2:7]}-{numeros[7:]}"
+    elif len(numeros) == 10:
+        return f"({numeros[:2]}) {numeros[2:6]}-{numeros[6:]}"
+    return tel
+
+
+def texto_para_reais(valor_str):
+    try:
+        return float(valor_str.replace(",", ".").strip())
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+# ================== MONTAGEM DE CLIENTES E PEDIDOS ==================
+def cliente_de(telefone, nome, rua="", numero="", bairro="", referencia=""):
+    """Dicionário de cliente com telefone limpo e campos sem espaços nas pontas"""
+    return {"telefone": limpar_telefone(telefone), "nome": nome.strip(), "rua": rua.strip(),
+            "numero": numero.strip(), "bairro": bairro.strip(), "referencia": referencia.strip()}
+
+
+def validar_cliente(cliente):
+    if not cliente["telefone"] or not cliente["nome"]:
+        raise DadosInvalidos("Para cadastrar, preencha pelo menos Telefone e Nome.")
+    tel = cliente["telefone"]
+    if len(tel) < 10 or len(tel) > 11:
+        raise DadosInvalidos(f"Telefone inválido: {tel} ({len(tel)} dígitos)\nEsperado: 10 ou 11 dígitos.")
+
+
+def lembrete_de(medicamento, dias, hoje=None):
+    """Lembrete para quando o remédio estiver acabando; None se os dados não servem"""
+    medicamento = medicamento.strip()
+    dias = str(dias).strip()
+    if not medicamento or not dias.isdigit():
+        return None
+    data_aviso = (hoje or datetime.now()) + timedelta(days=int(dias) - DIAS_ANTECEDENCIA)
+    return {"medicamento": medicamento, "data_aviso": data_aviso.strftime("%Y-%m-%d")}
+
+
+def resumir_pagamento(total, pagamento):
+    """(texto do cupom, resumo gravado em metodo_pagamento) para `total` em reais"""
+    partes = pagamento["partes"]
+    recebido = pagamento.get("recebido") or 0.0
+    forma1, parc1, val1 = partes[0]
+    if len(partes) == 1:
+        if forma1 == "Cartão":
+            pag_desc = f"PAGAMENTO: Cartão ({parc1})"
+            pag_resumo_bd = f"Cartão ({parc1})"
+        else:
+            pag_desc = f"PAGAMENTO: {forma1.upper()}"
+            pag_resumo_bd = forma1
+
+        if forma1 == "Dinheiro":
+            troco = recebido - total
+            if troco > 0:
+                pag_desc += f"\nDinheiro: R$ {recebido:.2f} | Troco: R$ {troco:.2f}"
+            else:
+                pag_desc += "\nSem Troco"
+        return pag_desc, pag_resumo_bd
+
+    forma2, parc2, val2 = partes[1]
+    desc1 = f"{forma1} {parc1 if forma1 == 'Cartão' else ''}"
+    desc2 = f"{forma2} {parc2 if forma2 == 'Cartão' else ''}"
+    pag_desc = "PAGAMENTO MISTO:"
+    pag_desc += f"\n1) {desc1}: R$ {val1:.2f}"
+    pag_desc += f"\n2) {desc2}: R$ {val2:.2f}"
+    pag_resumo_bd = f"Misto: {desc1}/{desc2}"
+
+    if "Dinheiro" in (forma1, forma2):
+        soma_din = 0
+        if forma1 == "Dinheiro":
+            soma_din += val1
+        if forma2 == "Dinheiro":
+            soma_din += val2
+        if recebido > soma_din:
+            pag_desc += f"\nTroco: R$ {recebido - soma_din:.2f}"
+    return pag_desc, pag_resumo_bd
+
+
+def montar_pedido(cliente, entregador, produtos_centavos, taxa_centavos, pagamento, lembrete=None, quando=None):
+    """Pedido pronto para a fila / gravar_pedido; DadosInvalidos se faltar algo"""
+    if not cliente["telefone"] or not cliente["nome"]:
+        raise DadosInvalidos("Preencha Telefone e Nome.")
+    total_centavos = produtos_centavos + taxa_centavos
+    if total_centavos <= 0:
+        raise DadosInvalidos("Valor total zerado.")
+    pag_desc, pag_resumo_bd = resumir_pagamento(total_centavos / 100, pagamento)
+    return {
+        "uuid": uuid.uuid4().hex,
+        "registrado_em": agora_utc(),
+        **{campo: cliente[campo] for campo in CAMPOS_CLIENTE},
+        "data": (quando or datetime.now()).strftime("%Y-%m-%d"),
+        "entregador": entregador,
+        "produtos_centavos": produtos_centavos,
+        "taxa_centavos": taxa_centavos,
+        "valor_centavos": total_centavos,
+        "metodo_pagamento": pag_resumo_bd,
+        "detalhes_pagamento": pag_desc,
+        "lembrete": lembrete,
+    }
+
+
+# ================== TEXTOS IMPRESSOS ==================
+def texto_cupom(pedido, quando=None):
+    sep = "-" * 32
+    rua_wrap = textwrap.fill(f"{pedido['rua']}, {pedido['numero']}", width=LARGURA_PAPEL)
+    bairro_wrap = textwrap.fill(f"Bairro: {pedido['bairro']}", width=LARGURA_PAPEL)
+    ref_wrap = textwrap.fill(f"Obs: {pedido['referencia']}", width=LARGURA_PAPEL)
+    dt_hora = (quando or datetime.now()).strftime('%d/%m/%Y %H:%M')
+
+    return f"""
+     FARMACIA TOTALPHARMA
+{dt_hora}
+{sep}
+CLIENTE: {pedido['nome']}
+TEL: {formatar_telefone(pedido['telefone'])}
+{sep}
+ENTREGA:
+{rua_wrap}
+{bairro_wrap}
+
+{ref_wrap}
+{sep}
+MOTOBOY: {pedido['entregador']}
+{sep}
+VALORES:
+Prod:  R$ {formatar_centavos(pedido['produtos_centavos'])}
+Taxa:  R$ {formatar_centavos(pedido['taxa_centavos'])}
+TOTAL: R$ {formatar_centavos(pedido['valor_centavos'])}
+{sep}
+{pedido['detalhes_pagamento']}
+{sep}
+
+   Obrigado pela preferencia!
+"""
+
+
+def campos_cupom(pedido, quando=None):
+    """Os textos do cupom já formatados, para os layouts em imagem (cupom_raster.py)"""
+    return {
+        "data_hora": (quando or datetime.now()).strftime('%d/%m/%Y %H:%M'),
+        "nome": pedido["nome"],
+        "telefone": formatar_telefone(pedido["telefone"]),
+        "endereco": f"{pedido['rua']}, {pedido['numero']}",
+        "bairro": pedido["bairro"],
+        "referencia": pedido["referencia"],
+        "entregador": pedido["entregador"],
+        "produtos": formatar_centavos(pedido["produtos_centavos"]),
+        "taxa": formatar_centavos(pedido["taxa_centavos"]),
+        "total": formatar_centavos(pedido["valor_centavos"]),
+        "pagamento": pedido["detalhes_pagamento"],
+    }
+
+
+def campos_etiqueta(cliente, entregador):
+    return {
+        "nome": cliente["nome"],
+        "telefone": formatar_telefone(cliente["telefone"]),
+        "endereco": f"{cliente['rua']}, {cliente['numero']}",
+        "bairro": cliente["bairro"],
+        "referencia": cliente["referencia"],
+        "entregador": entregador,
+    }
+
+
+def texto_etiqueta(cliente, entregador):
+    """Só o endereço de entrega, sem valores"""
+    rua_wrap = textwrap.fill(f"{cliente['rua']}, {cliente['numero']}", width=LARGURA_PAPEL)
+    bairro_wrap = textwrap.fill(f"Bairro: {cliente['bairro']}", width=LARGURA_PAPEL)
+    ref_wrap = textwrap.fill(f"Obs: {cliente['referencia']}", width=LARGURA_PAPEL)
+
+    texto = "-" * 32 + "\n       ENTREGA RAPIDA\n" + "-" * 32 + "\n"
+    texto += f"CLI: {cliente['nome']}\nTEL: {formatar_telefone(cliente['telefone'])}\n" + "-" * 32 + "\n"
+    texto += f"{rua_wrap}\n{bairro_wrap}\n\n"
+    if cliente["referencia"]:
+        texto += f"{ref_wrap}\n"
+    texto += "-" * 32 + "\n" + f"MOTO: {entregador}\n" + "-" * 32 + "\n"
+    return texto
+
+
+# ================== SERVIÇO ==================
+def _em_lotes(itens, tamanho):
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+class ServicoPedidos:
+    """Operações do PDV sobre o banco (chamar de uma thread de banco).
+
+    `fila` (FilaGravacao) e `replica` (ReplicaLocal) são opcionais: sem elas
+    tudo é gravado direto no banco, que é o caso das cargas sem interface.
+    """
+
+    def __init__(self, banco, fila=None, replica=None):
+        self.banco = banco
+        self.fila = fila
+        self.replica = replica
+
+    def leitura(self):
+        """Onde ler clientes, endereços e lembretes: réplica (carregada ou servidor fora) ou banco principal"""
+        if self.replica is not None and (self.replica.pronta or self.replica.ultimo_erro):
+            return self.replica
+        return self.banco
+
+    def sincronizar_replica(self):
+        """Depois de gravar direto no servidor, traz a alteração para a réplica"""
+        if self.replica:
+            self.replica.sincronizar()
+
+    # ---------- Clientes ----------
+    def cliente_na_fila(self, telefone):
+        """Dados do cliente de um pedido ainda na fila (nome, rua, numero, bairro, referencia)"""
+        if self.fila is None:
+            return None
+        for pedido in reversed(self.fila.pendentes()):
+            if pedido.get("telefone") != telefone or pedido.get("tipo") not in (None, "cliente", "excluir_cliente"):
+                continue
+            if pedido.get("tipo") == "excluir_cliente":
+                return None
+            return (pedido["nome"], pedido["rua"], pedido["numero"], pedido["bairro"], pedido["referencia"])
+        return None
+
+    def buscar_cliente(self, telefone):
+        """(nome, rua, numero, bairro, referencia) do banco ou da fila; None se não existe"""
+        return buscar_cliente_por_telefone(self.leitura().conexao(), telefone) or self.cliente_na_fila(telefone)
+
+    def buscar_clientes(self, termo, apos=None, cancelar=None):
+        """Uma página (LIMITE_BUSCA) da busca em ordem de nome, depois do cliente `apos` (nome, telefone).
+
+        Setar o Event `cancelar` interrompe a consulta em andamento (busca obsoleta).
+        """
+        conn = self.leitura().conexao()
+        with interrompivel(conn, cancelar):
+            return buscar_clientes(conn, termo.strip(), apos=apos)
+
+    def enderecos(self, telefone):
+        return enderecos_do_cliente(self.leitura().conexao(), telefone)
+
+    def salvar_cliente(self, cliente):
+        """Cadastra ou atualiza; retorna True se o cliente já existia"""
+        validar_cliente(cliente)
+        existente = self.buscar_cliente(cliente["telefone"]) is not None
+        self.gravar_cadastro(cliente)
+        return existente
+
+    def gravar_cadastro(self, cliente):
+        """Com banco em rede, o cadastro vai pela fila (funciona sem rede) e já aparece na réplica"""
+        cliente = dict(cliente, atualizado_em=agora_utc())
+        if self.replica is None or self.fila is None:
+            with self.banco.transacao("gravar_cliente") as cursor:
+                gravar_cliente(cursor, cliente)
+            return
+        self.fila.enfileirar(uuid.uuid4().hex, dict(cliente, tipo="cliente"))
+        self.replica.aplicar_cliente(cliente)
+
+    def gravar_alteracao(self, operacao, dados):
+        """Endereço, lembrete ou exclusão (banco.gravar_da_fila): como o cadastro, pela fila com banco em rede"""
+        if self.replica is None or self.fila is None:
+            with self.banco.transacao(operacao) as cursor:
+                gravar_da_fila(cursor, dados)
+            return
+        self.fila.enfileirar(uuid.uuid4().hex, dados)
+        self.replica.aplicar_alteracao(dados)
+
+    def salvar_clientes(self, clientes, lote=LOTE_TRANSACAO):
+        """Grava muitos clientes direto no banco, uma transação a cada `lote`; retorna quantos gravou"""
+        gravados = 0
+        for parte in _em_lotes(clientes, lote):
+            with self.banco.transacao("salvar_clientes") as cursor:
+                for cliente in parte:
+                    gravados += gravar_cliente(cursor, cliente)
+        self.sincronizar_replica()
+        return gravados
+
+    def excluir_cliente(self, telefone):
+        """Apaga o cliente com pedidos, lembretes e endereços"""
+        self.gravar_alteracao("excluir_cliente", {"tipo": "excluir_cliente", "telefone": telefone})
+
+    def adicionar_endereco(self, telefone, rua, numero, bairro, referencia):
+        if not rua or not bairro:
+            raise DadosInvalidos("Rua e Bairro são obrigatórios.")
+        self.gravar_alteracao("adicionar_endereco", {
+            "tipo": "endereco", "telefone": telefone, "rua": rua, "numero": numero, "bairro": bairro,
+            "referencia": referencia, "ultimo_uso": datetime.now().strftime("%Y-%m-%d"),
+        })
+
+    # ---------- Pedidos ----------
+    def enfileirar_pedido(self, pedido):
+        """Grava no diário local (com fsync); False se não há fila ou o diário falhou"""
+        if self.fila is None:
+            return False
+        try:
+            self.fila.enfileirar(pedido["uuid"], pedido)
+            return True
+        except Exception as e:
+            print(f"[FILA] Diário local indisponível ({e}), gravando direto no banco")
+            return False
+
+    def aplicar_na_replica(self, pedido):
+        if self.replica:
+            self.replica.aplicar_pedido(pedido)
+
+    def finalizar_pedido(self, pedido, na_fila):
+        """Segunda parte do registro de um pedido, depois de enfileirar_pedido (que roda antes
+        de imprimir o cupom): sem fila, grava direto no banco; e já aplica na réplica."""
+        if not na_fila:
+            self.gravar_pedidos([pedido])
+        self.aplicar_na_replica(pedido)
+
+    def gravar_pedidos(self, pedidos, lote=LOTE_TRANSACAO):
+        """Grava direto no banco, uma transação a cada `lote`; retorna quantos eram novos (uuid)"""
+        gravados = 0
+        for parte in _em_lotes(pedidos, lote):
+            with self.banco.transacao("gravar_pedidos") as cursor:
+                for pedido in parte:
+                    gravados += gravar_pedido(cursor, pedido)
+        return gravados
+
+    # ---------- Lembretes ----------
+    def agendar_lembrete(self, telefone, lembrete):
+        self.gravar_alteracao("agendar_lembrete", {"tipo": "lembrete", "telefone": telefone,
+                                                   "medicamento": lembrete["medicamento"],
+                                                   "data_aviso": lembrete["data_aviso"]})
+
+    def concluir_lembrete(self, id_lembrete):
+        self.gravar_alteracao("concluir_lembrete", {"tipo": "baixa_lembrete", "id": id_lembrete})
+
+    def apagar_lembrete(self, id_lembrete):
+        self.gravar_alteracao("apagar_lembrete", {"tipo": "apagar_lembrete", "id": id_lembrete})
+
+    def contar_lembretes_vencidos(self, data=None):
+        return contar_lembretes_vencidos(self.leitura().conexao(), data or datetime.now().strftime("%Y-%m-%d"))
+
+    def lembretes_vencidos(self, data=None, inicio=0, quantidade=-1):
+        return lembretes_vencidos(self.leitura().conexao(), data or datetime.now().strftime("%Y-%m-%d"),
+                                  quantidade, inicio)
+
+    def contar_lembretes_pendentes(self):
+        return contar_lembretes_pendentes(self.leitura().conexao())
+
+    def lembretes_pendentes(self, inicio=0, quantidade=-1):
+        return lembretes_pendentes(self.leitura().conexao(), quantidade, inicio)
+
+    # ---------- Relatórios ----------
+    def painel_do_dia(self, dia=None):
+        """(entregas, faturamento em centavos, [(entregador, qtd)])"""
+        return painel_do_dia(self.banco.conexao(), dia if dia is not None else dia_de(datetime.now()))
+
+    def relatorio_periodo(self, dia_ini, dia_fim, entregador=None, quantidade=None):
+        """Totais geral e por entregador do período, com os pedidos (só os `quantidade` primeiros, se dado)"""
+        conn = self.banco.conexao()
+        if quantidade is None:
+            pedidos, por_entregador = entregas_do_periodo(conn, dia_ini, dia_fim, entregador)
+        else:
+            pedidos = pagina_entregas_do_periodo(conn, dia_ini, dia_fim, entregador, 0, quantidade)
+            por_entregador = resumo_do_periodo(conn, dia_ini, dia_fim, entregador)
+        return {
+            "pedidos": pedidos,
+            "por_entregador": por_entregador,
+            "entregas": sum(e[1] for e in por_entregador),
+            "valor_centavos": sum(e[2] or 0 for e in por_entregador),
+        }
+
+    def pagina_periodo(self, dia_ini, dia_fim, entregador=None, inicio=0, quantidade=100):
+        """Pedidos [inicio, inicio + quantidade) na ordem de relatorio_periodo"""
+        return pagina_entregas_do_periodo(self.banco.conexao(), dia_ini, dia_fim, entregador, inicio, quantidade)
+
+    def exportar_periodo_csv(self, caminho, dia_ini, dia_fim, entregador=None, progresso=None, cancelar=None,
+                             lote=LOTE_EXPORTACAO):
+        """Grava os pedidos do período em CSV direto do cursor, LOTE_EXPORTACAO linhas por vez.
+
+        Memória constante para qualquer período; caminho terminado em .gz sai
+        comprimido. `progresso(feitos, total)` é chamado a cada lote e
+        `cancelar` (threading.Event) é conferido entre lotes: cancelado, o
+        arquivo parcial é apagado e retorna None. Senão, retorna quantos exportou.
+        """
+        conn = self.banco.conexao()
+        total = sum(e[1] for e in resumo_do_periodo(conn, dia_ini, dia_fim, entregador))
+        exportados = 0
+        parcial = caminho + ".parcial"
+        if caminho.lower().endswith(".gz"):
+            arquivo = gzip.open(parcial, "wt", newline="", encoding="utf-8-sig", compresslevel=6)
+        else:
+            arquivo = open(parcial, "w", newline="", encoding="utf-8-sig")
+        cancelado = False
+        try:
+            with arquivo:
+                writer = csv.writer(arquivo, delimiter=";")
+                writer.writerow(CABECALHO_RELATORIO)
+                cursor = cursor_entregas_do_periodo(conn, dia_ini, dia_fim, entregador)
+                while True:
+                    if cancelar is not None and cancelar.is_set():
+                        cancelado = True
+                        break
+                    linhas = cursor.fetchmany(lote)
+                    if not linhas:
+                        break
+                    writer.writerows([linha_relatorio_csv(linha) for linha in linhas])
+                    exportados += len(linhas)
+                    if progresso:
+                        progresso(exportados, max(total, exportados))
+                cursor.close()
+        except BaseException:
+            os.remove(parcial)
+            raise
+        if cancelado:
+            os.remove(parcial)
+            print(f"[EXPORTACAO] Cancelada após {exportados} pedidos")
+            return None
+        os.replace(parcial, caminho)
+        return exportados
+
+
+def linha_relatorio_csv(pedido):
+    """Uma linha de entregas_do_periodo no formato aberto pelo Excel (data dd/mm/aaaa, vírgula decimal)"""
+    pid, dia, cliente, telefone, entregador, centavos, metodo = pedido
+    data_fmt = data_do_dia(dia).strftime("%d/%m/%Y")
+    valor_fmt = formatar_centavos(centavos).replace(".", ",")
+    return [pid, data_fmt, cliente or "N/A", telefone or "N/A", entregador, valor_fmt, metodo or "N/A"]
@@ -0,0 +1,846 @@
+"""Servidor do banco para a loja com vários terminais (no lugar do .db compartilhado).
+
+Com o arquivo num compartilhamento SMB, cada terminal abre o SQLite direto
+na rede: toda leitura de página é uma ida e volta ao servidor de arquivos, o
+lock é o do SMB e a memória compartilhada do WAL (-shm) não é confiável entre
+máquinas. Aqui um único processo, na máquina onde o arquivo está, abre o
+banco em disco local e os terminais falam com ele por TCP.
+
+Protocolo: um objeto JSON por linha, em UTF-8.
+    pedido   {"id": 1, "op": "executar", "sql": "...", "parametros": [...]}
+    resposta {"id": 1, "linhas": [...], "cursor": 7, "rowcount": -1, ...}
+    erro     {"id": 1, "erro": "IntegrityError", "mensagem": "..."}
+Uma linha com uma lista de pedidos é um lote: as respostas voltam numa lista,
+na mesma ordem; depois do primeiro erro os demais pedidos do lote não rodam
+(menos um rollback, que sempre roda).
+Bytes viajam como {"$b": "<base64>"}.
+
+Cada terminal tem uma sessão com a sua conexão SQLite no servidor, com o
+mesmo comportamento de transação do módulo sqlite3 (BEGIN implícito antes
+de gravar, commit/rollback explícitos). No terminal, ConexoesServidor
+substitui o GerenciadorConexoes e o resto do programa não muda; dentro de
+transacao() as gravações não esperam resposta: vão juntas, num lote, com a
+próxima leitura ou com o commit.
+
+O servidor também faz a manutenção (checkpoint, incremental_vacuum,
+quick_check) e o backup do fechamento, que no modo arquivo cada terminal
+fazia por conta própria.
+
+    python servidor_banco.py dados_farmacia.db --porta 5917 --senha segredo
+    (nos terminais, config_rede.txt:  tcp://segredo@192.168.0.10:5917)
+
+Segurança: só para a rede interna da loja. A senha e os dados viajam sem
+criptografia; sem --senha o servidor se recusa a atender fora de
+127.0.0.1. As sessões não podem usar ATTACH/DETACH nem executescript.
+"""
+import argparse
+import base64
+import hmac
+import ipaddress
+import itertools
+import json
+import os
+import secrets
+import select
+import signal
+import socket
+import socketserver
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from urllib.parse import unquote, urlsplit
+
+import instrumentacao
+from backup import ErroBackup, backup_agendado, backup_do_dia_existe
+from banco import PERFIS_PRAGMA, GerenciadorConexoes, migrar
+from desempenho import AMOSTRAS_RTT, Latencias, acertos_cache, estado_wal
+from manutencao import Manutencao
+
+VERSAO_PROTOCOLO = 1
+PORTA_PADRAO = 5917
+LINHAS_POR_RESPOSTA = 500       # Linhas na resposta de um SELECT; o resto vem com "buscar"
+LINHAS_FETCHALL = 5000          # Linhas por "buscar" no fetchall
+LOTE_VARIOS = 1000              # Linhas de parâmetros por pedido "varios" (executemany)
+MAX_CURSORES = 16               # Cursores com linhas pendentes guardados por sessão
+IDADE_MAX_CURSOR = 60           # Segundos sem "buscar" antes de fechar o cursor (libera o WAL)
+TIMEOUT_CONEXAO = 5             # Segundos para conectar ao servidor
+TIMEOUT_RESPOSTA = 120          # Segundos esperando uma resposta
+INTERVALO_PROGRESSO = 0.05      # Segundos entre consultas ao cancelamento enquanto espera
+INTERVALO_ROTINA = 60           # Segundos entre rodadas de manutenção/backup no servidor
+ORCAMENTO_MANUTENCAO = 1.0      # Segundos de manutenção por rodada
+HORARIO_BACKUP = "22:00"        # Backup do fechamento feito pelo servidor
+LIMITE_CONSULTA_LENTA_MS = 200
+MAX_CONEXOES_PENDENTES = 64     # Fila do listen: terminais ligando juntos na abertura da loja
+
+
+# ================== PROTOCOLO ==================
+def _para_json(valor):
+    """Tipos que o json não conhece (parâmetros e linhas)"""
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return {"$b": base64.b64encode(bytes(valor)).decode("ascii")}
+    # Mesma conversão dos adaptadores padrão do sqlite3
+    if isinstance(valor, datetime):
+        return valor.isoformat(" ")
+    if isinstance(valor, date):
+        return valor.isoformat()
+    raise TypeError(f"tipo não suportado: {type(valor).__name__}")
+
+
+def _de_json(objeto):
+    if len(objeto) == 1 and "$b" in objeto:
+        return base64.b64decode(objeto["$b"])
+    return objeto
+
+
+def _linha(mensagem):
+    return json.dumps(mensagem, default=_para_json, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def _ler_linha(linha):
+    return json.loads(linha, object_hook=_de_json)
+
+
+def _resposta_erro(id_pedido, erro):
+    return {"id": id_pedido, "erro": type(erro).__name__, "mensagem": str(erro)}
+
+
+def _excecao(resposta):
+    """Exceção sqlite3 equivalente à que o servidor recebeu"""
+    classe = getattr(sqlite3, resposta.get("erro", ""), None)
+    if not (isinstance(classe, type) and issubclass(classe, sqlite3.Error)):
+        classe = sqlite3.DatabaseError
+    return classe(resposta.get("mensagem", ""))
+
+
+def eh_loopback(host):
+    """O endereço só é alcançável desta máquina?"""
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def _autorizar(acao, arg1, arg2, banco, gatilho):
+    if acao in (sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH):
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
+def eh_endereco_servidor(texto):
+    """config_rede.txt aponta para um servidor_banco (tcp://...) em vez de uma pasta?"""
+    return bool(texto) and texto.strip().lower().startswith("tcp://")
+
+
+def endereco_do_servidor(url):
+    """'tcp://senha@host:porta' -> ((host, porta), senha ou None)"""
+    partes = urlsplit(url.strip())
+    senha = unquote(partes.username) if partes.username else None
+    return (partes.hostname or "127.0.0.1", partes.port or PORTA_PADRAO), senha
+
+
+# ================== SERVIDOR ==================
+class _Sessao(socketserver.StreamRequestHandler):
+    """Um terminal conectado: uma conexão SQLite e os cursores ainda não lidos até o fim"""
+
+    def setup(self):
+        super().setup()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.numero = None
+        self.chave = None
+        self.conn = None
+        self.cursores = {}   # id -> [cursor sqlite3, último uso]
+        self._proximo_cursor = itertools.count(1)
+        self.autenticada = not self.server.senha
+
+    def handle(self):
+        try:
+            for linha in self.rfile:
+                try:
+                    mensagem = _ler_linha(linha)
+                except ValueError as e:
+                    resposta = _resposta_erro(None, sqlite3.ProgrammingError(f"linha inválida: {e}"))
+                else:
+                    if isinstance(mensagem, list):
+                        resposta = self._atender_lote(mensagem)
+                    else:
+                        resposta = self._atender(mensagem)
+                self.wfile.write(_linha(resposta))
+        except OSError:
+            pass   # Terminal caiu ou foi fechado: a transação aberta é desfeita abaixo
+
+    def finish(self):
+        try:
+            super().finish()
+        except OSError:
+            pass
+        self.server.encerrar_sessao(self)
+
+    # ---------- Pedidos ----------
+    def _atender_lote(self, pedidos):
+        respostas = []
+        falhou = False
+        for pedido in pedidos:
+            rollback = isinstance(pedido, dict) and pedido.get("op") == "rollback"
+            if falhou and not rollback:
+                respostas.append(_resposta_erro(pedido.get("id") if isinstance(pedido, dict) else None,
+                                                sqlite3.OperationalError("não executado: erro anterior no lote")))
+                continue
+            respostas.append(self._atender(pedido))
+            falhou = falhou or "erro" in respostas[-1]
+        return respostas
+
+    def _atender(self, pedido):
+        inicio = time.perf_counter()
+        op = None
+        try:
+            op = pedido["op"]
+            if not self.autenticada and op != "ola":
+                raise sqlite3.ProgrammingError("sessão não autenticada")
+            metodo = getattr(self, f"_op_{op}", None)
+            if metodo is None:
+                raise sqlite3.ProgrammingError(f"operação desconhecida: {op}")
+            self._fechar_cursores_velhos()
+            resposta = metodo(pedido)
+            resposta["id"] = pedido.get("id")
+        except sqlite3.Error as e:
+            resposta = _resposta_erro(pedido.get("id"), e)
+        except (KeyError, TypeError, ValueError, OverflowError, AttributeError) as e:
+            # Pedido malformado (ou parâmetro que o sqlite3 recusa): o mesmo erro do sqlite3
+            resposta = _resposta_erro(pedido.get("id") if isinstance(pedido, dict) else None,
+                                      sqlite3.ProgrammingError(f"{type(e).__name__}: {e}"))
+        # Estado da transação depois do pedido: ConexaoServidor.in_transaction
+        resposta["transacao"] = self.conn is not None and self.conn.in_transaction
+        self.server.registrar(op, time.perf_counter() - inicio)
+        return resposta
+
+    def _conexao(self):
+        if self.conn is None:
+            self.conn = self.server.abrir_conexao()
+        return self.conn
+
+    def _resultado(self, cursor, quantidade):
+        resposta = {"rowcount": cursor.rowcount, "lastrowid": cursor.lastrowid}
+        if cursor.description is None:
+            return resposta
+        resposta["colunas"] = [coluna[0] for coluna in cursor.description]
+        resposta["linhas"] = cursor.fetchmany(quantidade)
+        if len(resposta["linhas"]) == quantidade:
+            # Pode haver mais: o cursor fica guardado para os próximos "buscar"
+            numero = next(self._proximo_cursor)
+            self.cursores[numero] = [cursor, time.monotonic()]
+            while len(self.cursores) > MAX_CURSORES:
+                self.cursores.pop(next(iter(self.cursores)))[0].close()
+            resposta["cursor"] = numero
+        return resposta
+
+    def _fechar_cursores_velhos(self):
+        """Cursor abandonado pelo terminal prende uma versão antiga do WAL"""
+        limite = time.monotonic() - IDADE_MAX_CURSOR
+        for numero in [n for n, (_, uso) in self.cursores.items() if uso < limite]:
+            self.cursores.pop(numero)[0].close()
+
+    # ---------- Operações ----------
+    def _op_ola(self, pedido):
+        if pedido.get("versao") != VERSAO_PROTOCOLO:
+            raise sqlite3.InterfaceError(f"protocolo {pedido.get('versao')} (servidor usa {VERSAO_PROTOCOLO})")
+        if self.server.senha and not hmac.compare_digest(str(pedido.get("senha") or ""), self.server.senha):
+            raise sqlite3.ProgrammingError("senha do servidor incorreta")
+        self.autenticada = True
+        if self.numero is None:
+            self.numero, self.chave = self.server.registrar_sessao(self)
+        return {"versao": VERSAO_PROTOCOLO, "sessao": self.numero, "chave": self.chave}
+
+    def _op_ping(self, pedido):
+        return {}
+
+    def _op_executar(self, pedido):
+        cursor = self._conexao().execute(pedido["sql"], pedido.get("parametros") or ())
+        return self._resultado(cursor, pedido.get("quantidade") or LINHAS_POR_RESPOSTA)
+
+    def _op_varios(self, pedido):
+        cursor = self._conexao().executemany(pedido["sql"], pedido["lista"])
+        return {"rowcount": cursor.rowcount, "lastrowid": cursor.lastrowid}
+
+    def _op_buscar(self, pedido):
+        guardado = self.cursores.get(pedido["cursor"])
+        if guardado is None:
+            raise sqlite3.ProgrammingError("cursor fechado no servidor")
+        quantidade = pedido.get("quantidade") or LINHAS_POR_RESPOSTA
+        linhas = guardado[0].fetchmany(quantidade)
+        if len(linhas) < quantidade:
+            self.cursores.pop(pedido["cursor"])[0].close()
+            return {"linhas": linhas}
+        guardado[1] = time.monotonic()
+        return {"linhas": linhas, "cursor": pedido["cursor"]}
+
+    def _op_fechar(self, pedido):
+        guardado = self.cursores.pop(pedido["cursor"], None)
+        if guardado is not None:
+            guardado[0].close()
+        return {}
+
+    def _op_commit(self, pedido):
+        self._conexao().commit()
+        return {}
+
+    def _op_rollback(self, pedido):
+        self._conexao().rollback()
+        return {}
+
+    def _op_estado(self, pedido):
+        return self.server.estado(self._conexao())
+
+    def _op_interromper(self, pedido):
+        return {"interrompida": self.server.interromper(pedido["sessao"], pedido["chave"])}
+
+    def _op_backup(self, pedido):
+        return self.server.fazer_backup()
+
+
+class ServidorBanco(socketserver.ThreadingTCPServer):
+    """Atende os terminais (uma thread por sessão) e cuida de manutenção e backup"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = MAX_CONEXOES_PENDENTES
+
+    def __init__(self, db_path, endereco=("127.0.0.1", PORTA_PADRAO), senha=None, pasta_backups=None,
+                 horario_backup=HORARIO_BACKUP):
+        if not senha and not eh_loopback(endereco[0]):
+            raise ValueError(f"sem senha, o servidor só atende nesta máquina (endereço {endereco[0]}); "
+                             "use --senha para atender os terminais da rede")
+        self.db_path = db_path
+        self.senha = senha or None
+        self.pasta_backups = pasta_backups
+        self.horario_backup = horario_backup
+        self.banco = GerenciadorConexoes(db_path, modo="local")
+        self.manutencao = Manutencao(self.banco, db_path)
+        self.latencias = Latencias()
+        self.pedidos = 0
+        self.iniciado_em = datetime.now()
+        self._sessoes = {}
+        self._numeros = itertools.count(1)
+        self._lock = threading.Lock()
+        self._lock_backup = threading.Lock()
+        self._parar = threading.Event()
+
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            print(f"[SERVIDOR] Schema na versão {migrar(conn)}")
+        finally:
+            conn.close()
+        super().__init__(endereco, _Sessao)
+
+    # ---------- Sessões ----------
+    def abrir_conexao(self):
+        conn = self.banco._abrir()
+        # Nada de ATTACH/DETACH (nem VACUUM INTO, que anexa por dentro): um terminal
+        # não pode criar nem ler outros arquivos nesta máquina
+        conn.set_authorizer(_autorizar)
+        return conn
+
+    def registrar_sessao(self, sessao):
+        with self._lock:
+            numero = next(self._numeros)
+            self._sessoes[numero] = sessao
+        print(f"[SERVIDOR] Sessão {numero} aberta ({sessao.client_address[0]})")
+        return numero, secrets.token_hex(8)
+
+    def encerrar_sessao(self, sessao):
+        with self._lock:
+            self._sessoes.pop(sessao.numero, None)
+        for cursor, _ in sessao.cursores.values():
+            cursor.close()
+        sessao.cursores.clear()
+        if sessao.conn is not None:
+            # close() desfaz a transação que o terminal deixou aberta
+            self.banco._descartar(sessao.conn)
+            sessao.conn = None
+        if sessao.numero is not None:
+            print(f"[SERVIDOR] Sessão {sessao.numero} encerrada")
+
+    def interromper(self, numero, chave):
+        """Aborta o comando em andamento da sessão `numero` (busca cancelada no terminal)"""
+        with self._lock:
+            sessao = self._sessoes.get(numero)
+        if sessao is None or sessao.conn is None or not hmac.compare_digest(str(chave), sessao.chave):
+            return False
+        sessao.conn.interrupt()
+        return True
+
+    def registrar(self, op, segundos):
+        self.latencias.registrar(op or "?", segundos)
+        with self._lock:
+            self.pedidos += 1
+
+    def estado(self, conn):
+        """Números do diagnóstico, medidos aqui, onde o arquivo está"""
+        wal_bytes, paginas_log, atraso = estado_wal(conn, self.db_path)
+        cache = self.banco.com_conexoes(lambda conexoes: acertos_cache(conexoes, self.db_path))
+        with self._lock:
+            sessoes, pedidos = len(self._sessoes), self.pedidos
+        return {
+            "caminho": os.path.abspath(self.db_path),
+            "tamanho": os.path.getsize(self.db_path),
+            "wal": [wal_bytes, paginas_log, atraso],
+            "cache": list(cache) if cache else None,
+            "sessoes": sessoes,
+            "pedidos": pedidos,
+            "iniciado_em": self.iniciado_em.isoformat(timespec="seconds"),
+            "latencias": [list(linha) for linha in self.latencias.resumo()],
+        }
+
+    # ---------- Manutenção e backup ----------
+    def fazer_backup(self):
+        """Backup na pasta do servidor, com rotação (um por vez)"""
+        if not self.pasta_backups:
+            raise sqlite3.OperationalError("servidor sem pasta de backups (--backups)")
+        with self._lock_backup:
+            try:
+                resultado = backup_agendado(self.db_path, self.pasta_backups)
+            except (ErroBackup, OSError) as e:
+                raise sqlite3.OperationalError(f"backup falhou: {e}") from e
+        print(f"[BACKUP] {resultado['arquivo']} ({resultado['duracao']:.1f}s)")
+        return resultado
+
+    def iniciar_rotina(self):
+        threading.Thread(target=self._rotina, daemon=True, name="rotina").start()
+
+    def _rotina(self):
+        backup_tentado = None
+        while not self._parar.wait(INTERVALO_ROTINA):
+            agora = datetime.now()
+            fechamento = bool(self.horario_backup) and agora.strftime("%H:%M") >= self.horario_backup
+            try:
+                executadas = self.manutencao.executar_pendentes(ORCAMENTO_MANUTENCAO, fechamento)
+                if executadas:
+                    print(f"[MANUTENCAO] Executado: {', '.join(executadas)}")
+            except sqlite3.Error as e:
+                print(f"[MANUTENCAO] Falhou: {e}")
+            if not fechamento or not self.pasta_backups or backup_tentado == agora.date():
+                continue
+            backup_tentado = agora.date()
+            if backup_do_dia_existe(self.pasta_backups, agora.date()):
+                continue
+            try:
+                self.fazer_backup()
+            except sqlite3.Error as e:
+                print(f"[BACKUP] Backup automático falhou: {e}")
+
+    def encerrar(self):
+        self._parar.set()
+        self.shutdown()
+        self.server_close()
+        try:
+            self.manutencao.ao_encerrar()
+        except sqlite3.Error as e:
+            print(f"[MANUTENCAO] optimize não executado: {e}")
+        self.banco.fechar_todas()
+
+
+# ================== TERMINAL ==================
+def _indisponivel(endereco, erro):
+    # "servidor indisponível" está em ERROS_RECONEXAO: o GerenciadorConexoes reabre a conexão
+    return sqlite3.OperationalError(f"servidor indisponível {endereco[0]}:{endereco[1]} ({erro})")
+
+
+def _parametros(parametros):
+    if isinstance(parametros, dict):
+        return parametros
+    return list(parametros)
+
+
+class _Pedido:
+    __slots__ = ("dados", "resposta")
+
+    def __init__(self, dados):
+        self.dados = dados
+        self.resposta = None
+
+
+class CursorServidor:
+    """Cursor de ConexaoServidor (a parte da interface de sqlite3.Cursor que o programa usa).
+
+    Com adiar=True (cursores de transacao()) o execute não espera o servidor:
+    o pedido segue no próximo lote e a resposta é lida quando o programa
+    pede linhas, rowcount ou lastrowid. Um erro aparece nesse momento ou no commit.
+    """
+
+    def __init__(self, conn, adiar=True):
+        self.connection = conn
+        self.adiar = adiar
+        self.arraysize = 1
+        self._limpar()
+
+    def _limpar(self):
+        self._pedidos = []
+        self._linhas = deque()
+        self._cursor = None       # Id do cursor no servidor, enquanto houver linhas lá
+        self._lido = False
+        self.description = None
+
+    def _enviar(self, dados, sql, parametros):
+        pedido = _Pedido(dados)
+        self._pedidos.append(pedido)
+        if self.adiar:
+            self.connection._adiar(pedido)
+            return
+        inicio = time.perf_counter()
+        try:
+            self.connection._trocar_com_lote(pedido)
+        finally:
+            instrumentacao.registrar_sql(sql, parametros, time.perf_counter() - inicio)
+
+    def _respostas(self):
+        """Garante as respostas dos pedidos deste cursor (descarrega o lote se preciso)"""
+        if self._lido:
+            return
+        if any(pedido.resposta is None for pedido in self._pedidos):
+            self.connection._descarregar()
+        for pedido in self._pedidos:
+            if "erro" in pedido.resposta:
+                raise _excecao(pedido.resposta)
+        self._lido = True
+        if self._pedidos and "colunas" in self._pedidos[0].resposta:
+            resposta = self._pedidos[0].resposta
+            self._linhas.extend(tuple(linha) for linha in resposta["linhas"])
+            self._cursor = resposta.get("cursor")
+            self.description = tuple((nome, None, None, None, None, None, None) for nome in resposta["colunas"])
+
+    def _buscar(self, quantidade):
+        resposta = self.connection._pedir({"op": "buscar", "cursor": self._cursor, "quantidade": quantidade})
+        self._linhas.extend(tuple(linha) for linha in resposta["linhas"])
+        self._cursor = resposta.get("cursor")
+
+    # ---------- Execução ----------
+    def execute(self, sql, parametros=()):
+        self.close()
+        self._enviar({"op": "executar", "sql": sql, "parametros": _parametros(parametros)}, sql, parametros)
+        return self
+
+    def executemany(self, sql, sequencia):
+        # sequencia pode ser um iterador (ex.: cursor de outro banco): vai em pedidos de LOTE_VARIOS linhas
+        self.close()
+        linhas = iter(sequencia)
+        while True:
+            parte = [_parametros(parametros) for parametros in itertools.islice(linhas, LOTE_VARIOS)]
+            if parte or not self._pedidos:
+                self._enviar({"op": "varios", "sql": sql, "lista": parte}, sql, parte[0] if parte else None)
+            if len(parte) < LOTE_VARIOS:
+                return self
+
+    def executescript(self, script):
+        # Scripts (várias instruções de uma vez) só rodam no próprio servidor
+        raise sqlite3.NotSupportedError("executescript não é aceito pelo servidor_banco")
+
+    @property
+    def rowcount(self):
+        self._respostas()
+        contagens = [pedido.resposta.get("rowcount", -1) for pedido in self._pedidos]
+        if not contagens or -1 in contagens:
+            return -1
+        return sum(contagens)
+
+    @property
+    def lastrowid(self):
+        self._respostas()
+        return self._pedidos[-1].resposta.get("lastrowid") if self._pedidos else None
+
+    # ---------- Leitura ----------
+    def fetchone(self):
+        self._respostas()
+        if not self._linhas and self._cursor is not None:
+            self._buscar(LINHAS_POR_RESPOSTA)
+        return self._linhas.popleft() if self._linhas else None
+
+    def fetchmany(self, tamanho=None):
+        tamanho = tamanho or self.arraysize
+        self._respostas()
+        while len(self._linhas) < tamanho and self._cursor is not None:
+            self._buscar(max(tamanho - len(self._linhas), LINHAS_POR_RESPOSTA))
+        return [self._linhas.popleft() for _ in range(min(tamanho, len(self._linhas)))]
+
+    def fetchall(self):
+        self._respostas()
+        while self._cursor is not None:
+            self._buscar(LINHAS_FETCHALL)
+        linhas, self._linhas = list(self._linhas), deque()
+        return linhas
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        linha = self.fetchone()
+        if linha is None:
+            raise StopIteration
+        return linha
+
+    def close(self):
+        """Libera o cursor no servidor (o pedido segue no próximo lote)"""
+        if self._cursor is not None:
+            self.connection._adiar(_Pedido({"op": "fechar", "cursor": self._cursor}))
+        self._limpar()
+
+
+class ConexaoServidor:
+    """Sessão com o servidor_banco, com a interface de sqlite3.Connection usada pelo programa.
+
+    Erros do servidor chegam como as mesmas exceções sqlite3 (IntegrityError,
+    OperationalError...); servidor fora do ar vira OperationalError
+    "servidor indisponível", tratado como conexão caída pelo GerenciadorConexoes.
+    """
+
+    def __init__(self, endereco, senha=None, timeout=TIMEOUT_RESPOSTA):
+        self.endereco = endereco
+        self.timeout = timeout
+        self._senha = senha
+        self._lote = []          # Pedidos adiados, enviados junto com o próximo pedido
+        self._ids = itertools.count(1)
+        self._progresso = None
+        self._em_transacao = False   # Como o servidor informou na última resposta
+        try:
+            self._sock = socket.create_connection(endereco, timeout=TIMEOUT_CONEXAO)
+        except OSError as e:
+            raise _indisponivel(endereco, e) from e
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock.settimeout(timeout)
+        self._leitor = self._sock.makefile("rb")
+        try:
+            resposta = self._pedir({"op": "ola", "versao": VERSAO_PROTOCOLO, "senha": senha})
+        except sqlite3.Error:
+            self.close()
+            raise
+        self.sessao = resposta["sessao"]
+        self._chave = resposta["chave"]
+
+    # ---------- Troca de mensagens ----------
+    def _adiar(self, pedido):
+        self._lote.append(pedido)
+
+    def _pedir(self, dados):
+        pedido = _Pedido(dados)
+        self._trocar_com_lote(pedido)
+        return pedido.resposta
+
+    def _trocar_com_lote(self, pedido):
+        pedidos, self._lote = self._lote + [pedido], []
+        self._trocar(pedidos)
+
+    def _descarregar(self):
+        if self._lote:
+            pedidos, self._lote = self._lote, []
+            self._trocar(pedidos)
+
+    def _trocar(self, pedidos):
+        """Envia os pedidos numa linha (lista, se mais de um), lê as respostas e levanta o primeiro erro"""
+        if self._sock is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        for pedido in pedidos:
+            pedido.dados["id"] = next(self._ids)
+        try:
+            mensagem = _linha(pedidos[0].dados if len(pedidos) == 1 else [pedido.dados for pedido in pedidos])
+        except TypeError as e:
+            raise sqlite3.ProgrammingError(f"parâmetro não suportado: {e}") from e
+        try:
+            self._sock.sendall(mensagem)
+            resposta = self._ler()
+            respostas = resposta if isinstance(resposta, list) else [resposta]
+            if len(respostas) != len(pedidos):
+                raise ValueError("resposta não corresponde ao pedido")
+        except (OSError, ValueError) as e:
+            self._fechar_socket()
+            raise _indisponivel(self.endereco, e) from e
+        self._em_transacao = bool(respostas[-1].get("transacao"))
+        erro = None
+        for pedido, resposta in zip(pedidos, respostas):
+            pedido.resposta = resposta
+            if erro is None and "erro" in resposta:
+                erro = _excecao(resposta)
+        if erro is not None:
+            raise erro
+
+    def _ler(self):
+        if self._progresso is not None:
+            # Enquanto espera, consulta o cancelamento (interrompivel em banco.py)
+            limite = time.monotonic() + (self.timeout or float("inf"))
+            interrompida = False
+            while not select.select([self._sock], [], [], INTERVALO_PROGRESSO)[0]:
+                if time.monotonic() > limite:
+                    raise TimeoutError("sem resposta do servidor")
+                if not interrompida and self._progresso():
+                    interrompida = True
+                    self._interromper()
+        linha = self._leitor.readline()
+        if not linha:
+            raise ConnectionError("o servidor fechou a conexão")
+        return _ler_linha(linha)
+
+    def _interromper(self):
+        """Pede, por outra conexão, que o servidor aborte o comando desta sessão"""
+        try:
+            with socket.create_connection(self.endereco, timeout=TIMEOUT_CONEXAO) as sock:
+                sock.sendall(_linha([{"id": 1, "op": "ola", "versao": VERSAO_PROTOCOLO, "senha": self._senha},
+                                     {"id": 2, "op": "interromper", "sessao": self.sessao, "chave": self._chave}]))
+                sock.makefile("rb").readline()
+        except OSError as e:
+            print(f"[SERVIDOR] Não foi possível interromper a consulta: {e}")
+
+    def _fechar_socket(self):
+        if self._sock is None:
+            return
+        try:
+            self._leitor.close()
+            self._sock.close()
+        except OSError:
+            pass
+        self._sock = None
+
+    # ---------- Interface de sqlite3.Connection ----------
+    @property
+    def in_transaction(self):
+        """Como sqlite3.Connection.in_transaction (envia antes o lote adiado, que pode abrir uma)"""
+        if self._sock is None:
+            return False
+        self._descarregar()
+        return self._em_transacao
+
+    def cursor(self):
+        return CursorServidor(self)
+
+    def execute(self, sql, parametros=()):
+        return CursorServidor(self, adiar=False).execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return CursorServidor(self, adiar=False).executemany(sql, sequencia)
+
+    def executescript(self, script):
+        raise sqlite3.NotSupportedError("executescript não é aceito pelo servidor_banco")
+
+    def commit(self):
+        self._pedir({"op": "commit"})
+
+    def rollback(self):
+        if self._sock is None:
+            self._lote = []
+            return
+        # O lote adiado vai junto (ex.: o PRAGMA que transacao() restaura); o rollback roda mesmo se ele falhar
+        pedido = _Pedido({"op": "rollback"})
+        try:
+            self._trocar_com_lote(pedido)
+        except sqlite3.Error:
+            if pedido.resposta is None or "erro" in pedido.resposta:
+                raise
+
+    def set_progress_handler(self, funcao, n):
+        self._progresso = funcao
+
+    def close(self):
+        self._lote = []
+        self._fechar_socket()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, rastro):
+        if tipo is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    # ---------- Próprias do servidor ----------
+    def ping(self):
+        self._pedir({"op": "ping"})
+
+    def estado(self):
+        return self._pedir({"op": "estado"})
+
+
+class ConexoesServidor(GerenciadorConexoes):
+    """GerenciadorConexoes dos terminais com config_rede.txt 'tcp://[senha@]host:porta'.
+
+    Uma sessão no servidor por thread, como as conexões ao arquivo; verificação
+    de saúde e reconexão são as mesmas do GerenciadorConexoes.
+    """
+
+    def __init__(self, url):
+        super().__init__(url, modo="servidor")
+        self.endereco, self.senha = endereco_do_servidor(url)
+
+    def _prazo_lock(self):
+        # As conexões do servidor usam o perfil local
+        return PERFIS_PRAGMA["local"]["busy_timeout"] / 1000
+
+    def _abrir(self):
+        conn = ConexaoServidor(self.endereco, self.senha)
+        with self._lock:
+            self._todas.append(conn)
+        return conn
+
+    def estado(self):
+        """estado() do servidor, mais "rtt": (mínimo, mediana) da ida e volta até ele, em segundos"""
+        conn = self.conexao()
+        tempos = []
+        for _ in range(AMOSTRAS_RTT):
+            inicio = time.perf_counter()
+            conn.ping()
+            tempos.append(time.perf_counter() - inicio)
+        estado = conn.estado()
+        estado["rtt"] = (min(tempos), statistics.median(tempos))
+        return estado
+
+    def fazer_backup(self, progresso=None):
+        """Backup na pasta de backups do servidor (conexão própria: pode levar minutos).
+
+        Mesmo retorno de backup.fazer_backup; o caminho em "arquivo" é o do servidor.
+        """
+        if progresso:
+            progresso("servidor", 0, 0)
+        conn = ConexaoServidor(self.endereco, self.senha, timeout=None)
+        try:
+            return conn._pedir({"op": "backup"})
+        finally:
+            conn.close()
+
+
+# ================== LINHA DE COMANDO ==================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor do banco do PDV para os terminais da loja")
+    parser.add_argument("banco", help="arquivo .db (em disco desta máquina)")
+    parser.add_argument("--endereco", default="0.0.0.0",
+                        help="interface de rede (padrão: todas; sem --senha, só 127.0.0.1)")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--senha", help="senha exigida dos terminais (tcp://senha@host:porta)")
+    parser.add_argument("--backups", help="pasta do backup diário (padrão: backups/ ao lado do banco)")
+    parser.add_argument("--horario-backup", default=HORARIO_BACKUP, help="HH:MM do backup do fechamento")
+    parser.add_argument("--sem-rotina", action="store_true", help="não roda manutenção nem backup automático")
+    args = parser.parse_args()
+    if not os.path.exists(args.banco):
+        print(f"[SERVIDOR] {args.banco} não existe")
+        sys.exit(1)
+
+    pasta = os.path.dirname(os.path.abspath(args.banco))
+    instrumentacao.configurar(os.path.join(pasta, "logs"), LIMITE_CONSULTA_LENTA_MS)
+    try:
+        servidor = ServidorBanco(args.banco, (args.endereco, args.porta), args.senha,
+                                 args.backups or os.path.join(pasta, "backups"), args.horario_backup)
+    except ValueError as e:
+        print(f"[SERVIDOR] {e}")
+        sys.exit(1)
+    if not args.sem_rotina:
+        servidor.iniciar_rotina()
+    print(f"[SERVIDOR] Atendendo em {args.endereco}:{args.porta} (banco {os.path.abspath(args.banco)})")
+    # Parado como serviço (SIGTERM) encerra igual ao Ctrl+C: fecha as sessões e roda o optimize
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.encerrar()
+        instrumentacao.encerrar()